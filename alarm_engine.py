@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from operator import sub
+from bms_frame import FLAG_NAMES
+from frame_stats import frame_stats
+
+# Flag bits that are an alarm, and the character that raises it: System Safe going to
+# '0', any of the fault bits going to '1'
+FLAG_ALARMS = {0: '0', 1: '1', 2: '1', 3: '1', 4: '1', 5: '1', 6: '1', 7: '1', 8: '1', 9: '1', 10: '1',
+               11: '1', 14: '1'}
+
+# Rules as in an alarms.json file. limit is a maximum unless "below" is set; the alarm is
+# raised after `debounce` consecutive frames past the limit and cleared after `debounce`
+# consecutive frames back inside it by at least `hysteresis`.
+DEFAULT_RULES = [
+    {'name': "Cell over voltage", 'measure': 'cell_max', 'limit': 4.25, 'hysteresis': 0.02, 'debounce': 3},
+    {'name': "Cell under voltage", 'measure': 'cell_min', 'limit': 3.0, 'below': True, 'hysteresis': 0.05,
+     'debounce': 3},
+    {'name': "Cell over temperature", 'measure': 'temp_max', 'limit': 60.0, 'hysteresis': 2.0, 'debounce': 3},
+    {'name': "Temperature rising fast", 'measure': 'temp_rate', 'limit': 2.0, 'hysteresis': 0.5, 'debounce': 3},
+    {'name': "Cell spread", 'measure': 'cell_spread', 'limit': 0.1, 'hysteresis': 0.01, 'debounce': 5},
+    {'name': "Missing thermistors", 'measure': 'nan_thermistors', 'limit': 2, 'debounce': 5},
+] + [{'name': f"Flag: {FLAG_NAMES[bit]}" + (" off" if state == '0' else ""), 'measure': 'flag', 'bit': bit,
+      'state': state} for bit, state in FLAG_ALARMS.items()]
+
+# Unit and value format of each measure
+MEASURES = {
+    'cell_max': ("V", "%.4f"), 'cell_min': ("V", "%.4f"), 'cell_spread': ("V", "%.4f"),
+    'temp_max': ("°C", "%.1f"), 'temp_rate': ("°C/min", "%.2f"), 'nan_thermistors': ("", "%d"), 'flag': ("", "%d"),
+}
+
+AlarmEvent = namedtuple('AlarmEvent', ['name', 'measure', 'raised', 'value', 'limit', 'where', 'timestamp', 'seq',
+                                       'latency'])
+
+
+def load_rules(path):
+    # The rules of an alarms.json file, the defaults when there is none
+    try:
+        with open(path, encoding='utf-8') as rules_file:
+            rules = json.load(rules_file)
+        for config in rules:
+            Rule(**config)  # Raises on an unknown measure or option
+        return rules
+    except FileNotFoundError:
+        return DEFAULT_RULES
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error loading alarm rules from {path}: {e}, using the defaults")
+        return DEFAULT_RULES
+
+
+def format_event(event):
+    unit, value_format = MEASURES[event.measure]
+    text = f"ALARM {event.name}" if event.raised else f"Cleared {event.name}"
+    if event.measure != 'flag':
+        text += f": {value_format % event.value} {unit}".rstrip()
+        if event.raised:
+            text += f" (limit {value_format % event.limit} {unit})".replace(" )", ")")
+    if event.where:
+        text += f" at {event.where}"
+    return text + f", {1000 * event.latency:.1f} ms after the frame"
+
+
+class Rule:
+    __slots__ = ('name', 'measure', 'limit', 'below', 'hysteresis', 'debounce', 'bit', 'state',
+                 'active', 'count')
+
+    def __init__(self, name, measure, limit=0.5, below=False, hysteresis=0.0, debounce=1, bit=0, state='1'):
+        if measure not in MEASURES:
+            raise ValueError(f"unknown alarm measure {measure!r} in rule {name!r}")
+        self.name = name
+        self.measure = measure
+        self.limit = float(limit)
+        self.below = below
+        self.hysteresis = float(hysteresis)
+        self.debounce = max(1, int(debounce))
+        self.bit = bit  # Flag rules: the character of the flags string and the state that is an alarm
+        self.state = state
+        self.active = False
+        self.count = 0  # Consecutive frames towards the next change of `active`
+
+    def update(self, value):
+        # True when the alarm was raised or cleared by this value
+        if self.active:
+            changing = value < self.limit - self.hysteresis if not self.below else value > self.limit + self.hysteresis
+        else:
+            changing = value > self.limit if not self.below else value < self.limit
+        self.count = self.count + 1 if changing else 0
+        if self.count < self.debounce:
+            return False
+        self.active = not self.active
+        self.count = 0
+        return True
+
+
+class AlarmEngine:
+    # Evaluates the alarm rules on every frame, called from the frame callback on the
+    # serial read thread right after parsing. All rules read the statistics the
+    # acquisition thread already computed for the frame (one pass over the arrays,
+    # see frame_stats), so a rule is a comparison, and the per thermistor rise rate is
+    # one map over the arrays. Events go to `callback` on the read thread; the GUI
+    # reads active() from its own tick. latency is measured from the frame's last
+    # byte (frame.received_at) to the end of the evaluation.
+
+    def __init__(self, rules=DEFAULT_RULES, callback=None, rate_window=60.0):
+        self.rules = [Rule(**config) for config in rules]
+        self.uses_rate = any(rule.measure == 'temp_rate' for rule in self.rules)
+        self.callback = callback
+        self.rate_window = rate_window  # Seconds over which the temperature rise rate is measured
+        self.temperature_window = deque()  # (timestamp, temperatures) of the last rate_window seconds
+        self.lock = threading.Lock()
+        self.active_events = {}  # Rule name -> the event that raised it
+        self.events = deque(maxlen=200)  # Recent events, newest last
+        self.version = 0  # Incremented with every event
+        self.frames = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def measure(self, rule, frame, stats, rate):
+        # (value, location) of the rule's measure in this frame, value None when there is no reading
+        voltages, temperatures = stats.voltages, stats.temperatures
+        measure = rule.measure
+        if measure == 'cell_max':
+            return (voltages.maximum, "S%d #%d" % voltages.location(voltages.argmax)) if voltages.count else (None, "")
+        if measure == 'cell_min':
+            return (voltages.minimum, "S%d #%d" % voltages.location(voltages.argmin)) if voltages.count else (None, "")
+        if measure == 'cell_spread':
+            return (voltages.maximum - voltages.minimum, "") if voltages.count else (None, "")
+        if measure == 'temp_max':
+            return ((temperatures.maximum, "S%d #%d" % temperatures.location(temperatures.argmax))
+                    if temperatures.count else (None, ""))
+        if measure == 'temp_rate':
+            return rate
+        if measure == 'nan_thermistors':
+            return frame.nan_thermistor_count(), ""  # Only slaves that sent a temperature row
+        flags = frame.bms_flags
+        if not flags or len(flags) <= rule.bit:
+            return None, ""
+        return (1.0 if flags[rule.bit] == rule.state else 0.0), ""
+
+    def temperature_rate(self, frame, stats):
+        # Fastest rise of a single thermistor in °C per minute over the rate window
+        window = self.temperature_window
+        temperatures = frame.temperatures.tolist()
+        if window and (not 0 <= frame.timestamp - window[-1][0] <= self.rate_window
+                       or len(window[-1][1]) != len(temperatures)):
+            window.clear()  # Gap in the data (reconnect), clock or layout change: start the window again
+        window.append((frame.timestamp, temperatures))
+        while len(window) > 2 and frame.timestamp - window[1][0] >= self.rate_window:
+            window.popleft()
+        oldest_time, oldest = window[0]
+        elapsed = frame.timestamp - oldest_time
+        if elapsed < self.rate_window / 2:
+            return None, ""
+        rises = list(map(sub, temperatures, oldest))  # NaN where either reading is missing
+        valid = [rise for rise in rises if rise == rise]
+        if not valid:
+            return None, ""
+        rise = max(valid)
+        where = "S%d #%d" % stats.temperatures.location(rises.index(rise))
+        return rise * 60 / elapsed, where
+
+    def process(self, frame):
+        if frame.timestamp is None:
+            return []
+        stats = frame_stats(frame)
+        rate = self.temperature_rate(frame, stats) if self.uses_rate else None
+        changed = []
+        for rule in self.rules:
+            value, where = self.measure(rule, frame, stats, rate)
+            if value is None or value != value:
+                continue  # No reading, the rule keeps its state
+            if rule.update(value):
+                changed.append((rule, value, where))
+
+        latency = time.perf_counter() - frame.received_at if frame.received_at is not None else 0.0
+        events = [AlarmEvent(rule.name, rule.measure, rule.active, value, rule.limit, where, frame.timestamp,
+                             frame.seq, latency) for rule, value, where in changed]
+        with self.lock:
+            self.frames += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            for event in events:
+                if event.raised:
+                    self.active_events[event.name] = event
+                else:
+                    self.active_events.pop(event.name, None)
+                self.events.append(event)
+                self.version += 1
+        if self.callback:
+            for event in events:
+                self.callback(event)
+        return events
+
+    def active(self):
+        # (version, events of the alarms that are currently raised, oldest first)
+        with self.lock:
+            return self.version, list(self.active_events.values())
+
+    def latency_summary(self):
+        with self.lock:
+            mean = self.total_latency / self.frames if self.frames else 0.0
+            return (f"{self.frames} frames checked, latency mean {1000 * mean:.2f} ms, "
+                    f"max {1000 * self.max_latency:.2f} ms")
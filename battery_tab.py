@@ -1,20 +1,33 @@
 import tkinter as tk
-from tkinter import ttk, filedialog
-import serial.tools.list_ports
-import serial
-import threading
-import datetime
-import csv
-from logger import main as log_main
-from open_details_window import open_details_window
-from open_temperature_details_window import open_temperature_details_window
-from serial_interface import SerialInterface
+from tkinter import ttk
+from alarm_engine import AlarmEngine, format_event, load_rules
+from bms_frame import BmsFrame, DEFAULT_LAYOUT
+from energy_integrator import EnergyIntegrator, average_power
+from frame_handoff import FrameHandoff
+from frame_stats import frame_stats
+from history_store import HistoryStore
+from render_scheduler import RenderScheduler
+from message_console import MessageConsole
+from port_watcher import PortWatcher, is_teensy
+from serial_interface import SerialInterface, CONNECTED, DISCONNECTED
+from session_recorder import SessionRecorder
+from trend_chart import TrendChart
 
 
 class BatteryTab:
 
-    def __init__(self, master):
+    def __init__(self, master, scheduler=None, console_max_frames=2000, layout=DEFAULT_LAYOUT,
+                 auto_select_teensy=True, name=None, port_watcher=None, telemetry_server=None):
         self.master = master
+        self.telemetry_server = telemetry_server  # Republishes every frame to other viewers when set
+        self.name = name  # Distinguishes the log files when several tabs record at once
+        self.visible = True  # Hidden tabs only buffer frames, see set_visible
+        self.auto_select_teensy = auto_select_teensy  # Select a plugged in Teensy (by USB vendor ID) automatically
+        self.layout = layout  # Pack layout the frames are parsed into
+        self.console_max_frames = console_max_frames  # Frames kept in the received messages ring buffer
+        # All periodic GUI work runs on one shared tick, see RenderScheduler
+        self.scheduler = scheduler if scheduler is not None else RenderScheduler(master)
+        self.history = HistoryStore()  # Pack values of the whole session for the trend chart
         self.frame = ttk.Frame(self.master)
         self.setup_widgets()
         self.build_device_selector()
@@ -22,11 +35,21 @@ class BatteryTab:
         self.ts_on_status = False
         self.is_battery_connected = False
         self.battery_online_status = False
-        self.message_buffer = []
-        self.buffer_lock = threading.Lock()
-        self.update_interval = 1000  # Milliseconds to wait before updating the GUI
-        self.last_update_time = 0
-        self.update_gui()
+        # Frames arrive on the serial thread and are rendered from the Tk main loop in update_gui
+        self.frame_handoff = FrameHandoff()
+        # Every frame is written to logs/ as it arrives, see SessionRecorder
+        self.recorder = SessionRecorder(name=name)
+        # Energy and charge of every frame, the totals are kept in logs/ and survive a restart
+        self.energy = EnergyIntegrator()
+        energy_file = f"energy_{name}.json" if name else "energy.json"
+        self.energy.load(self.recorder.state_path(energy_file))
+        self.recorder.add_state(energy_file, self.energy.snapshot)
+        self.recorder.start()
+        self.latest_parsed_data = BmsFrame(layout)
+        # Limits checked on every frame as soon as it is parsed, see alarms.json
+        self.alarms = AlarmEngine(load_rules("alarms.json"), callback=lambda event: print(format_event(event)))
+        self.shown_alarm_version = 0
+        self.shown_alarm_seq = 0  # Newest frame that raised a shown alarm, a newer one rings the bell
         self.clear_requested = False
         self.details_window_open = False
         self.temperature_details_window_open = False
@@ -34,42 +57,57 @@ class BatteryTab:
         self.serial_interface = SerialInterface(
             port="COM4",
             baudrate=115200,
-            update_callback=self.update_values,
+            update_callback=None,
             clear_messages_callback=self.clear_messages,
-            display_message_callback=self.display_message
+            frame_callback=self.on_frame,
+            layout=layout
         )
-        self.latest_parsed_data = {}
+        self.scheduler.register(self.update_gui)
+        self.scheduler.register(self.refresh_indicators, period=1.0)
+        self.scheduler.register(self.update_alarms)
         self.info_window_open = False
         self.details_window_instance = None
         self.temperature_details_window_instance = None
         self.bms_display_window_instance = None
+        self.pack_map_window_instance = None
         self.info_window_instance = None
-
-    def handle_new_data(self, data):
-        # Handle new data received from SerialInterface
-        with self.buffer_lock:
-            self.message_buffer.append(data)
-        self.display_message(data)
+        self.on_startup_complete = None  # Called with the first port list (startup profiling)
+        # Serial ports are enumerated on a background thread, the list is picked up on the render tick.
+        # Several tabs share one watcher
+        self.port_watcher = port_watcher if port_watcher is not None else PortWatcher()
+        self.port_list_version = 0
+        self.scheduler.register(self.update_port_list, period=0.5)
+        # Work the first paint does not need waits until the window is on screen
+        self.master.after_idle(self.master.after, 0, self.deferred_startup)
+
+    def deferred_startup(self):
+        self.port_watcher.start()
+
+    def on_frame(self, frame):
+        # Runs on the serial read thread for every received frame, must not touch any widget
+        self.alarms.process(frame)  # First, an alarm should not wait for the logging
+        self.recorder.record(frame)
+        self.energy.process(frame)
+        self.history.record(frame)
+        self.frame_handoff.publish(frame)
+        # Last, the network fan-out must not hold back the local display
+        if self.telemetry_server is not None:
+            self.telemetry_server.publish(frame)
 
     def clear_messages(self):
         # Clear messages logic
-        self.messages_text.config(state='normal')
-        self.messages_text.delete('1.0', tk.END)
-        self.messages_text.config(state='disabled')
-        # Reset buffer
-        with self.buffer_lock:
-            self.message_buffer.clear()
+        self.console.clear()
 
     def update_values(self, parsed_data):
-        # Update the values from the parsed data
+        # Update the values from the parsed data. Stored first, so the views read this frame even if one fails
+        self.latest_parsed_data = parsed_data
         self.update_charge_values(parsed_data)
         self.update_energy_values(parsed_data)
         self.update_cell_voltages(parsed_data)
         self.update_cell_temperatures(parsed_data)
         self.update_ivt_values(parsed_data)
         self.update_indicators(parsed_data)
-        self.is_battery_connected = parsed_data.get('battery_voltage', 0) > 0
-        self.latest_parsed_data = parsed_data
+        self.is_battery_connected = (parsed_data.get('battery_voltage') or 0) > 0
 
     def update_charge_values(self, parsed_data):
         soc = parsed_data.get('soc', 0) or 0
@@ -89,7 +127,7 @@ class BatteryTab:
     def update_energy_values(self, parsed_data):
         # Update the Labels with actual values if the battery is connected, otherwise show "-"
         voltage = parsed_data.get('battery_voltage', 0) or 0
-        current = abs(parsed_data.get('battery_current', 0))  # This line is causing the error
+        current = abs(parsed_data.get('battery_current', 0) or 0)
         rate = voltage * current / 1000
         bad_thermistor = parsed_data.get('bad_thermistor', 0) or 0
         bad_cell = parsed_data.get('bad_cell', 0) or 0
@@ -97,40 +135,34 @@ class BatteryTab:
         self.bad_thermistor_value.config(text=f"{bad_thermistor}" if self.is_battery_connected else "-")
         self.bad_cell_value.config(text=f"{bad_cell}" if self.is_battery_connected else "-")
 
+        # Totals of every frame since the last reset, not only of the frames shown
+        totals = self.energy.snapshot()
+        self.energy_in_value.config(text=f"{totals['energy_in_wh'] / 1000:.3f} kWh, {totals['charge_in_ah']:.2f} Ah")
+        self.energy_out_value.config(text=f"{totals['energy_out_wh'] / 1000:.3f} kWh, {totals['charge_out_ah']:.2f} Ah")
+        power = average_power(totals)
+        self.average_power_value.config(text="-" if power is None else f"{power / 1000:.2f} kW")
+
+    def reset_energy(self):
+        self.energy.reset()
+        self.update_energy_values(self.latest_parsed_data)
+
     def update_cell_voltages(self, parsed_data):
-        # Update the Labels with actual values if the battery is connected, otherwise show "-"
-        highest = parsed_data.get('max_voltage', 0) or 0
-        lowest = parsed_data.get('min_voltage', 0) or 0
-        voltages = parsed_data.get('voltages', {})
-
-        all_voltages = []
-        for slave_id, voltage_list in voltages.items():
-            all_voltages.extend(voltage_list)
-
-        # Check if there are any voltage readings
-        if all_voltages:
-            total_voltage = sum(all_voltages)
-            count = len(all_voltages)
-            average = total_voltage / count if count > 0 else '-'
-        else:
-            average = '-'
+        # Statistics are computed once per frame in the acquisition thread (frame_stats)
+        stats = frame_stats(parsed_data).voltages
+        show = stats.count > 0
 
         # Update the GUI components
-        self.highest_voltage_value.config(text=f"{highest} V" if highest != '-' else "-")
-        self.average_voltage_value.config(text=f"{average:.2f} V" if average != '-' else "-")
-        self.lowest_voltage_value.config(text=f"{lowest} V" if lowest != '-' else "-")
+        self.highest_voltage_value.config(text=f"{stats.maximum:.4f} V" if show else "-")
+        self.average_voltage_value.config(text=f"{stats.mean:.2f} V" if show else "-")
+        self.lowest_voltage_value.config(text=f"{stats.minimum:.4f} V" if show else "-")
 
     def update_cell_temperatures(self, parsed_data):
-        # Calculate the highest, lowest, and average temperatures
-        temperatures = parsed_data.get('temperatures', {})
-        all_temps = [t for sublist in temperatures.values() for t in sublist if t is not None]
-        highest_temp = max(all_temps, default='-')
-        lowest_temp = min(all_temps, default='-')
-        average_temp = sum(all_temps, 0.0) / len(all_temps) if parsed_data['temperatures'] else '-'
+        stats = frame_stats(parsed_data).temperatures
+        show = self.is_battery_connected and stats.count > 0
         # Update the Labels with actual values if the battery is connected, otherwise show "-"
-        self.highest_temp_value.config(text=f"{highest_temp} °C" if self.is_battery_connected else "-")
-        self.average_temp_value.config(text=f"{average_temp:.2f} °C" if self.is_battery_connected else "-")
-        self.lowest_temp_value.config(text=f"{lowest_temp} °C" if self.is_battery_connected else "-")
+        self.highest_temp_value.config(text=f"{stats.maximum:.2f} °C" if show else "-")
+        self.average_temp_value.config(text=f"{stats.mean:.2f} °C" if show else "-")
+        self.lowest_temp_value.config(text=f"{stats.minimum:.2f} °C" if show else "-")
 
     def update_ivt_values(self, parsed_data):
         # Update the IVT values from the parsed data
@@ -153,9 +185,9 @@ class BatteryTab:
     def update_indicators(self, parsed_data):
         charging_status = parsed_data.get('charging_status', 0)
         # print("charging_status:", charging_status)
-        battery_voltage = parsed_data.get('battery_voltage', 0)
-        serial_connection_established = (self.serial_interface.serial_connection is not None and
-                                         self.serial_interface.serial_connection.is_open)
+        battery_voltage = parsed_data.get('battery_voltage') or 0  # The key is always there, None without a reading
+        connection_state = self.serial_interface.state
+        serial_connection_established = connection_state == CONNECTED
 
         # Logic to determine the color of the battery charging indicator
         if not serial_connection_established:
@@ -174,51 +206,106 @@ class BatteryTab:
         # Logic to determine the color of the battery online indicator
         battery_online_color = 'red' if not serial_connection_established else ('#06b025' if battery_voltage > 0 else 'grey')
 
-        # Logic to determine the color of the TS on indicator
-        ts_on_color = '#06b025' if serial_connection_established else 'red'
+        # Logic to determine the color of the TS on indicator, orange while reconnecting or detecting the baud rate
+        ts_on_color = '#06b025' if serial_connection_established else ('red' if connection_state == DISCONNECTED
+                                                                        else 'orange')
 
         # Apply the determined colors to the canvas items
         self.bcharge_canvas.itemconfig(self.bcharge_indicator, fill=bcharge_color)
         self.battery_online_canvas.itemconfig(self.battery_online_indicator, fill=battery_online_color)
         self.ts_on_canvas.itemconfig(self.ts_on_indicator, fill=ts_on_color)
 
-        # Schedule the next update, ensuring parsed_data is updated if needed
-        self.master.after(1000, lambda: self.update_indicators(self.latest_parsed_data))
-
     def refresh_serial_ports(self):
-        # Refresh the list of serial ports
-        ports = serial.tools.list_ports.comports()
-        self.device_combobox['values'] = [port.device for port in ports if 'USB' in port.description]
+        # The watcher rescans by itself every few seconds, this only asks for a scan right away
+        self.port_watcher.request_scan()
+
+    def update_port_list(self):
+        # Runs on the render tick, applies the newest list posted by the port watcher
+        version, ports = self.port_watcher.latest()
+        if ports is None or version == self.port_list_version:
+            return
+        self.port_list_version = version
+        devices = [port.device for port in ports]
+        self.device_combobox['values'] = devices
+        selected = self.device_combobox.get()
+        # A typed URL (socket://, bms://) is never replaced
+        if self.auto_select_teensy and selected not in devices and "://" not in selected:
+            # Nothing selected or the selected adapter was unplugged: take the first Teensy no other tab has open
+            teensies = [port.device for port in ports if is_teensy(port) and port.device not in self.port_watcher.claimed]
+            if teensies:
+                self.device_combobox.set(teensies[0])
+        if self.on_startup_complete:
+            callback, self.on_startup_complete = self.on_startup_complete, None
+            callback()
 
     def open_port(self):
         selected_port = self.device_combobox.get()
+        old_port = self.serial_interface.port
         self.serial_interface.open_serial_port(selected_port)
+        # A port that failed to open leaves the running connection (and its claim) as it was
+        if self.serial_interface.port != old_port or not self.serial_interface.running:
+            self.port_watcher.claimed.discard(old_port)
+        if self.serial_interface.running:
+            self.port_watcher.claimed.add(self.serial_interface.port)
 
     def close_port(self):
         if self.serial_interface:
+            self.port_watcher.claimed.discard(self.serial_interface.port)
             self.serial_interface.close_serial_port()
 
     def update_gui(self):
-        now = datetime.datetime.now().timestamp() * 1000
-        if now - self.last_update_time >= self.update_interval:
-            with self.buffer_lock:
-                if self.message_buffer:
-                    messages_to_display = "\n".join(self.message_buffer)
-                    self.message_buffer.clear()
-                    self.display_message(messages_to_display)
-                    self.last_update_time = now
-        # Reschedule the update
-        self.master.after(500, self.update_gui)
+        # Render whatever the serial thread published since the last tick. A burst of frames is
+        # coalesced: every frame goes to the console, but the widgets only show the newest one
+        frames = self.frame_handoff.drain()
+        if not frames:
+            return
+        if self.visible:
+            self.console.append([frame.text for frame in frames])
+            self.update_values(frames[-1])
+        else:
+            # Another tab is shown: keep the messages and the newest frame, render nothing
+            self.console.store([frame.text for frame in frames])
+            self.latest_parsed_data = frames[-1]
+
+    def refresh_indicators(self):
+        # The connection indicators also change without new frames (e.g. port closed)
+        if self.visible:
+            self.update_indicators(self.latest_parsed_data)
+
+    def update_alarms(self):
+        # Every tick, also for a hidden tab: the engine already decided, only the label is updated
+        version, active = self.alarms.active()
+        if version == self.shown_alarm_version:
+            return
+        raised = any(event.seq > self.shown_alarm_seq for event in active)
+        self.shown_alarm_version = version
+        self.shown_alarm_seq = max((event.seq for event in active), default=self.shown_alarm_seq)
+        if active:
+            self.alarm_value.config(text=", ".join(event.name for event in active), foreground='red')
+        else:
+            self.alarm_value.config(text="None", foreground='')
+        if raised:
+            self.master.bell()
+
+    def set_visible(self, visible):
+        # Called by the notebook when the tab is selected or left
+        was_visible, self.visible = self.visible, visible
+        self.trend_chart.set_visible(visible)
+        if visible and not was_visible:
+            self.console.catch_up()
+            self.update_values(self.latest_parsed_data)
 
     def extract_log(self):
+        from tkinter import filedialog
+        import csv
         # Open file dialog to select save location
         filename = filedialog.asksaveasfilename(defaultextension=".log",
                                                 filetypes=[("Log files", "*.log"), ("All files", "*.*")])
         if not filename:
             return  # The user cancelled the operation
 
-        # Get all the text from the Text widget
-        log_contents = self.messages_text.get('1.0', tk.END)
+        # Get all the buffered messages, not only the ones currently shown
+        log_contents = self.console.get_all_text()
 
         # Write the stored messages to the CSV file
         with open(filename, 'w', newline='') as csvfile:
@@ -238,16 +325,15 @@ class BatteryTab:
             self.details_window_open = False
             self.details_window_instance = None  # Clear the reference when the window is closed
 
-        if use_default_values:
-            voltages = {key: 0.0 for key in self.latest_parsed_data.get('voltages', {})}
-        else:
-            voltages = self.latest_parsed_data.get('voltages', {})
+        frame = BmsFrame(self.latest_parsed_data.layout) if use_default_values else self.latest_parsed_data
 
+        # The window modules are only imported when a window is opened for the first time
+        from open_details_window import open_details_window
         # Store the window instance when opening the window
-        self.details_window_instance = open_details_window(self.master, voltages,
-                                                           update_callback=lambda: self.latest_parsed_data.get(
-                                                               'voltages', {}),
-                                                           on_close_callback=on_close)
+        self.details_window_instance = open_details_window(self.master, frame,
+                                                           update_callback=lambda: self.latest_parsed_data,
+                                                           on_close_callback=on_close,
+                                                           scheduler=self.scheduler)
 
     def open_temperature_details_window(self, use_default_values=False):
         if self.temperature_details_window_instance is not None and self.temperature_details_window_instance.winfo_exists():
@@ -261,17 +347,29 @@ class BatteryTab:
             self.temperature_details_window_open = False
             self.temperature_details_window_instance = None  # Clear the reference when the window is closed
 
-        if use_default_values:
-            temperatures = {key: 0.0 for key in self.latest_parsed_data.get('temperatures', {})}
-        else:
-            temperatures = self.latest_parsed_data.get('temperatures', {})
-        print(temperatures)
+        frame = BmsFrame(self.latest_parsed_data.layout) if use_default_values else self.latest_parsed_data
 
+        from open_temperature_details_window import open_temperature_details_window
         # Store the window instance when opening the window
-        self.temperature_details_window_instance = open_temperature_details_window(self.master, temperatures,
-                                                                                   update_callback=lambda: self.latest_parsed_data.get(
-                                                                                       'temperatures', {}),
-                                                                                   on_close_callback=on_close)
+        self.temperature_details_window_instance = open_temperature_details_window(self.master, frame,
+                                                                                   update_callback=lambda: self.latest_parsed_data,
+                                                                                   on_close_callback=on_close,
+                                                                                   scheduler=self.scheduler)
+
+    def open_pack_map_window(self):
+        if self.pack_map_window_instance is not None and self.pack_map_window_instance.winfo_exists():
+            # If the window exists, bring it to the front
+            self.pack_map_window_instance.lift()
+            return
+
+        def on_close():
+            self.pack_map_window_instance = None  # Clear the reference when the window is closed
+
+        from pack_map_window import open_pack_map_window
+        self.pack_map_window_instance = open_pack_map_window(self.master, self.latest_parsed_data,
+                                                             update_callback=lambda: self.latest_parsed_data,
+                                                             on_close_callback=on_close,
+                                                             scheduler=self.scheduler)
 
     def open_bms_display(self):
         if self.bms_display_window_instance is not None and self.bms_display_window_instance.winfo_exists():
@@ -286,27 +384,25 @@ class BatteryTab:
             self.bms_display_window_instance = None  # Clear the reference when the window is closed
 
         def get_latest_bms_flags():
-            return self.latest_parsed_data.get('bms_flags', '')
+            return self.latest_parsed_data.get('bms_flags', '') or ''
 
         # Import the BMS display module dynamically
         import bms_display
         # Open the BMS display window with the callback function and store the reference
         self.bms_display_window_instance = bms_display.open_bms_window(self.master,
                                                                        update_callback=lambda: get_latest_bms_flags(),
-                                                                       on_close_callback=on_close)
+                                                                       on_close_callback=on_close,
+                                                                       scheduler=self.scheduler)
 
     def apply_baudrate(self):
         # Get the selected baud rate from the Combobox
         selected_baudrate = self.baudrate_combobox.get()
-        # Change the baud rate of the serial interface
-        self.serial_interface.change_baudrate(int(selected_baudrate))
+        # Change the baud rate of the serial interface, "Auto" probes the rates for valid frames
+        self.serial_interface.change_baudrate(None if selected_baudrate == "Auto" else int(selected_baudrate))
 
     def display_message(self, message):
         # Logic to display a message in the GUI
-        self.messages_text.config(state='normal')
-        self.messages_text.insert('1.0', message + '\n')  # Insert new message at the top
-        self.messages_text.config(state='disabled')
-        self.messages_text.see('1.0')
+        self.console.append([message])
 
     def open_info_window(self):
         if self.info_window_instance is not None and self.info_window_instance.winfo_exists():
@@ -354,10 +450,12 @@ class BatteryTab:
 
     def close_application(self):
         print("inside close")
-        # Retrieve contents of messages_text
-        log_contents = self.messages_text.get('1.0', 'end-1c')  # Gets all text from the widget
-        # Call the logger's main function with the retrieved contents
-        log_main(log_contents)
+        self.port_watcher.stop()
+        self.close_port()
+        if self.telemetry_server is not None:
+            self.telemetry_server.stop()
+        # The frames are already on disk, only the last batch needs to be written
+        self.recorder.close()
         # Proceed to quit the application
         self.master.quit()
 
@@ -386,8 +484,7 @@ class BatteryTab:
         extract_log_button = ttk.Button(device_frame, text="Extract Log", command=self.extract_log)
         extract_log_button.grid(row=0, column=4, padx=5, pady=5)
 
-        # Initially refresh the serial ports list
-        self.refresh_serial_ports()
+        # The serial ports list is filled in by the port watcher once the window is shown, see deferred_startup
 
     def setup_widgets(self):
         # ... (create frames for each section)
@@ -412,6 +509,10 @@ class BatteryTab:
                                                       command=lambda: self.open_temperature_details_window())
         self.temperature_details_button.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
 
+        # All cells and thermistors on one colour coded map
+        self.pack_map_button = ttk.Button(self.console_frame, text="Pack Map", command=self.open_pack_map_window)
+        self.pack_map_button.grid(row=0, column=4, columnspan=2, padx=5, pady=5, sticky='ew')
+
         # Setup for Battery Online indicator
         battery_online_label = ttk.Label(self.console_frame, text="Battery online:")
         battery_online_label.grid(row=2, column=2, padx=5, pady=5)
@@ -436,6 +537,11 @@ class BatteryTab:
         self.bcharge_canvas.grid(row=2, column=5, padx=5, pady=5)
         self.bcharge_indicator = self.bcharge_canvas.create_oval(5, 5, 15, 15, fill='grey')
 
+        # Alarms raised by the rule engine
+        ttk.Label(self.console_frame, text="Alarms:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        self.alarm_value = ttk.Label(self.console_frame, text="None", wraplength=420)
+        self.alarm_value.grid(row=3, column=1, columnspan=5, padx=5, pady=5, sticky='w')
+
         # Charge section
         # (create charge_frame and add widgets similarly)
         charge_frame = ttk.LabelFrame(self.frame, text='Charge')
@@ -482,6 +588,19 @@ class BatteryTab:
         self.bad_thermistor_value = ttk.Label(energy_frame, text="-")  # Changed to Label to display text
         self.bad_thermistor_value.grid(row=2, column=1, sticky='ew')
 
+        ttk.Label(energy_frame, text="Charged:").grid(row=3, column=0, sticky='w')
+        self.energy_in_value = ttk.Label(energy_frame, text="-")
+        self.energy_in_value.grid(row=3, column=1, sticky='ew')
+
+        ttk.Label(energy_frame, text="Discharged:").grid(row=4, column=0, sticky='w')
+        self.energy_out_value = ttk.Label(energy_frame, text="-")
+        self.energy_out_value.grid(row=4, column=1, sticky='ew')
+
+        ttk.Label(energy_frame, text="Avg Power:").grid(row=5, column=0, sticky='w')
+        self.average_power_value = ttk.Label(energy_frame, text="-")
+        self.average_power_value.grid(row=5, column=1, sticky='ew')
+        ttk.Button(energy_frame, text="Reset", width=6, command=self.reset_energy).grid(row=5, column=2, padx=5)
+
         # Cell Voltages section
         cell_voltages_frame = ttk.LabelFrame(self.frame, text='Cell Voltages')
         cell_voltages_frame.grid(row=0, column=4, sticky='ew', padx=5, pady=5)
@@ -533,6 +652,10 @@ class BatteryTab:
         self.ivt_current_counter_value = ttk.Label(ivt_data_frame, text="-")
         self.ivt_current_counter_value.grid(row=2, column=1, sticky='ew')
 
+        # Pack values over time, drawn from the history store
+        self.trend_chart = TrendChart(self.frame, self.history, self.scheduler)
+        self.trend_chart.frame.grid(row=1, column=0, columnspan=7, sticky='ew', padx=5, pady=5)
+
         # Frame for received messages
         messages_frame = tk.LabelFrame(self.frame, text='Received messages')
         messages_frame.grid(row=2, column=0, columnspan=7, sticky='nsew', padx=5, pady=5)
@@ -540,7 +663,7 @@ class BatteryTab:
         self.frame.grid_columnconfigure(0, weight=1)
 
         # Text widget for displaying received messages
-        self.messages_text = tk.Text(messages_frame, width=107, height=38, wrap='none')
+        self.messages_text = tk.Text(messages_frame, width=107, height=22, wrap='none')
         self.messages_text.grid(row=0, column=0, sticky='nsew')
         messages_frame.grid_rowconfigure(0, weight=1)
         messages_frame.grid_columnconfigure(0, weight=1)
@@ -549,18 +672,10 @@ class BatteryTab:
         clear_button = ttk.Button(messages_frame, text="Clear", command=self.clear_messages)
         clear_button.grid(row=1, column=0, columnspan=2, sticky='ew', padx=5, pady=5)
 
-        # Frame for target device selection
-        device_frame = tk.LabelFrame(self.frame, text='Target device')
-        device_frame.grid(row=3, column=0, columnspan=1, sticky='ew', padx=5, pady=5)
-
         # Scrollbar for the Text widget
-        scrollbar = tk.Scrollbar(messages_frame, orient='vertical', command=self.messages_text.yview)
+        scrollbar = tk.Scrollbar(messages_frame, orient='vertical')
         scrollbar.grid(row=0, column=1, sticky='ns')
-        self.messages_text.config(yscrollcommand=scrollbar.set)
-
-        self.device_combobox = ttk.Combobox(device_frame, values=["/dev/ttyUSB0",
-                                                                  "/dev/ttyUSB1"], state="readonly")
-        self.device_combobox.grid(row=0, column=0, padx=5, pady=5)
+        self.console = MessageConsole(self.messages_text, scrollbar, max_frames=self.console_max_frames)
 
         # Pack the main frame to fill the tab space
         self.frame.pack(fill='both', expand=True)
@@ -575,7 +690,7 @@ class BatteryTab:
 
         # Create a Combobox for baud rate selection
         self.baudrate_combobox = ttk.Combobox(baudrate_frame,
-                                              values=["9600", "19200", "38400", "57600", "115200", "230400"],
+                                              values=["Auto", "9600", "19200", "38400", "57600", "115200", "230400"],
                                               state="readonly")
         self.baudrate_combobox.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
         self.baudrate_combobox.set("115200")  # Set the default baud rate
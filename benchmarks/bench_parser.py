@@ -0,0 +1,122 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bms_parser import BmsParser
+
+
+def make_frame(slaves=12, cells=12, thermistors=5):
+    # A full pack dump in the format sent by the Teensy
+    lines = ["2024-01-01 12:00:00 -----------------------------", "Printing voltages:"]
+    for ic in range(1, slaves + 1):
+        lines.append(f"IC {ic} " + " ".join(f"{3.6 + 0.001 * (ic + c):.3f}-" for c in range(cells)))
+    lines.append("Printing temperatures:")
+    for ic in range(1, slaves + 1):
+        lines.append(f"IC {ic} " + " ".join("NaN" if (ic + t) % 17 == 0 else f"{24.0 + 0.1 * t:.1f}"
+                                            for t in range(thermistors)))
+    lines += [
+        "Max Voltage: 3.623V",
+        "Min Voltage: 3.602V",
+        "Battery Voltage: 524.30V",
+        "Battery Current: -12.50A",
+        "IVT Voltage: 524.10V",
+        "IVT Current: -12.40A",
+        "IVT Current Counter: 10.5Ah Charging Status: 1",
+        "SOC: 85%",
+        "BMS_Flags: 1000000000000001",
+        "Bad_Cell: 0",
+        "Bad_Thermistor: 1",
+    ]
+    return "\n".join(lines)
+
+
+def legacy_parse_data(data):
+    # The if/elif substring parser SerialInterface.parse_data used before BmsParser,
+    # kept here only as the baseline for this benchmark
+    parsed_data = {'voltages': {}, 'temperatures': {}}
+
+    def parse_float(value):
+        try:
+            return float(value.strip('VA'))
+        except ValueError:
+            return None
+
+    reading_voltages = False
+    reading_temperatures = False
+    for line in data.split('\n'):
+        if 'Printing voltages:' in line:
+            reading_voltages, reading_temperatures = True, False
+            continue
+        if 'Printing temperatures:' in line:
+            reading_voltages, reading_temperatures = False, True
+            continue
+        if reading_voltages and line.startswith('IC'):
+            parts = line.split()
+            cell_voltages = []
+            for v in parts[2:]:
+                try:
+                    cell_voltages.append(float(v.strip('-')))
+                except ValueError:
+                    pass
+            parsed_data['voltages'][f"Slave {parts[1]}"] = cell_voltages
+        if reading_temperatures and line.startswith('IC'):
+            parts = line.split()
+            cell_temperatures = []
+            for t in parts[2:]:
+                if t == 'NaN':
+                    cell_temperatures.append(None)
+                else:
+                    try:
+                        cell_temperatures.append(float(t))
+                    except ValueError:
+                        pass
+            parsed_data['temperatures'][f"Slave {parts[1]}"] = cell_temperatures
+        elif 'Max Voltage:' in line:
+            reading_voltages = reading_temperatures = False
+            parsed_data['max_voltage'] = parse_float(line.split(':')[1])
+        elif 'Min Voltage:' in line:
+            parsed_data['min_voltage'] = parse_float(line.split(':')[1])
+        elif 'Battery Voltage:' in line:
+            parsed_data['battery_voltage'] = parse_float(line.split(':')[1])
+        elif 'Battery Current:' in line:
+            parsed_data['battery_current'] = parse_float(line.split(':')[1])
+        elif 'IVT Voltage:' in line:
+            parsed_data['ivt_voltage'] = parse_float(line.split(':')[1])
+        elif 'IVT Current:' in line:
+            parsed_data['ivt_current'] = parse_float(line.split(':')[1])
+        elif 'IVT Current Counter:' in line:
+            parsed_data['ivt_current_counter'] = parse_float(line.split('Ah')[0].split(':')[1])
+            parsed_data['charging_status'] = int(line.split('Status:')[1].split()[0])
+        elif 'SOC:' in line:
+            parsed_data['soc'] = int(line.split(':')[1].strip().split('%')[0])
+        elif 'BMS_Flags:' in line:
+            parsed_data['bms_flags'] = line.split(':')[1].strip()
+        elif 'Bad_Cell:' in line:
+            parsed_data['bad_cell'] = int(line.split(':')[1].strip())
+        elif 'Bad_Thermistor:' in line:
+            parsed_data['bad_thermistor'] = int(line.split(':')[1].strip())
+    return parsed_data
+
+
+def frames_per_second(parsers, frame, number=20, rounds=300):
+    # Best of many short runs, the minimum is the least disturbed by other processes. The
+    # parsers take turns, so a change in machine speed during the run affects them alike
+    best = [float('inf')] * len(parsers)
+    for _ in range(rounds):
+        for index, parse in enumerate(parsers):
+            best[index] = min(best[index], timeit.timeit(lambda: parse(frame), number=number))
+    return [number / seconds for seconds in best]
+
+
+def main():
+    frame = make_frame()
+    parser = BmsParser()
+    before, after = frames_per_second([legacy_parse_data, parser.parse], frame)
+    print(f"legacy parse_data: {before:10.0f} frames/s")
+    print(f"BmsParser.parse:   {after:10.0f} frames/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from contextlib import redirect_stdout
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import logger
+from bms_frame import DEFAULT_LAYOUT
+from alarm_engine import AlarmEngine
+from bms_parser import BmsParser
+from frame_stats import StatsEngine
+from history_store import HistoryStore
+from simulator import TelemetrySimulator
+from telemetry_server import TelemetryServer
+
+
+def make_frames(count, layout=DEFAULT_LAYOUT, seed=1):
+    # Frames as SerialInterface hands them on, with the console separator in front of the text
+    simulator = TelemetrySimulator(layout, nan_thermistors=0.01, seed=seed)
+    stats_engine = StatsEngine()
+    frames = []
+    start = time.time() - count
+    for i in range(count):
+        frame = simulator.next_frame(start + i)
+        stamp = datetime.fromtimestamp(frame.timestamp)
+        text = simulator.render(frame).decode('ascii').replace('\r', '').rstrip('\n')
+        frame.text = f"{stamp:%Y-%m-%d %H:%M:%S}.{stamp.microsecond // 1000:03d} -----------------------------\n{text}"
+        stats_engine.process(frame)  # Done by the acquisition thread, not part of the render cost
+        frames.append(frame)
+    return frames
+
+
+def best_time(function, number, repeat=5):
+    # Best of several runs, the minimum is the least disturbed by other processes
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def bench_parser(results):
+    frame_text = make_frames(1)[0].text
+    parser = BmsParser()
+    seconds = best_time(lambda: parser.parse(frame_text), number=500)
+    results['parse_data'] = {'frames_per_second': 1 / seconds, 'us_per_frame': seconds * 1e6}
+    frame = parser.parse(frame_text)
+    engine = StatsEngine()
+    seconds = best_time(lambda: engine.process(frame), number=500)
+    results['frame_stats'] = {'us_per_frame': seconds * 1e6}
+
+
+def bench_logger(results, sizes, pool_size=1000, chunk_size=10000):
+    # Both logger steps handle one message at a time. A log of up to chunk_size frames is
+    # timed as one input (logger_<size>); a longer one in chunks of chunk_size frames with
+    # the times added up (logger_chunked_<size>), as the whole log would not fit in memory.
+    # The frames repeat from a small pool: generating 100k distinct frames took minutes.
+    # save_to_csv names its file after the current second, so every chunk writes into its
+    # own directory and no file overwrites another.
+    texts = [frame.text for frame in make_frames(min(max(sizes), pool_size))]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            for size in sizes:
+                parse_seconds = save_seconds = 0.0
+                for first in range(0, size, chunk_size):
+                    count = min(chunk_size, size - first)
+                    # The console shows the newest frame first
+                    log_contents = "\n".join(texts[i % len(texts)] for i in range(first + count - 1, first - 1, -1))
+                    start = time.perf_counter()
+                    data = logger.parse_log_contents(log_contents)
+                    parse_seconds += time.perf_counter() - start
+                    del log_contents
+                    chunk_directory = os.path.join(directory, f"{size}_{first}")
+                    os.mkdir(chunk_directory)
+                    os.chdir(chunk_directory)  # save_to_csv always writes to ./logs
+                    start = time.perf_counter()
+                    with redirect_stdout(open(os.devnull, 'w')):
+                        logger.save_to_csv(data)
+                    save_seconds += time.perf_counter() - start
+                    os.chdir(cwd)
+                    del data
+                chunked = size > chunk_size
+                results[f"logger_chunked_{size}" if chunked else f"logger_{size}"] = {
+                    'frames': size,
+                    'chunk_frames': min(size, chunk_size),
+                    'parse_log_contents_s': parse_seconds,
+                    'save_to_csv_s': save_seconds,
+                    'frames_per_second': size / (parse_seconds + save_seconds),
+                }
+                print(f"  logger {size} frames" + (f" in chunks of {chunk_size}" if chunked else "") +
+                      f": parse {parse_seconds:.2f} s, save {save_seconds:.2f} s")
+        finally:
+            os.chdir(cwd)
+
+
+def bench_history(results, hours=12, rate=5, points=800):
+    # Record cost per frame, then query cost over a full 12 h history per plot window
+    frames = make_frames(200)
+    store = HistoryStore()
+    begin = time.perf_counter()
+    for frame in frames:
+        store.record(frame)  # Once only, a store ignores frames older than its newest
+    seconds = (time.perf_counter() - begin) / len(frames)
+    results['history_record'] = {'us_per_frame': seconds * 1e6}
+
+    store = HistoryStore()
+    start = time.time() - hours * 3600
+    count = hours * 3600 * rate
+    for i in range(count):
+        store.add(start + i / rate, (500.0 + i * 1e-4, -50.0, 50.0, 3.5, 3.6, 30.0))
+    end = start + (count - 1) / rate
+    for span in (60, 600, 3600, hours * 3600):
+        seconds = best_time(lambda: store.query('max_cell', end - span, end, points), number=20)
+        results[f'history_query_{span}s'] = {'us_per_query': seconds * 1e6}
+
+
+def bench_alarms(results, count=2000):
+    # Rule evaluation per frame, and the alarm latency from the frame's last byte through the
+    # serial reader (parse, statistics, rules), the path a real frame takes
+    frames = make_frames(count)
+    engine = AlarmEngine()
+    start = time.perf_counter()
+    for frame in frames:
+        engine.process(frame)  # Once only, the temperature rate window must see increasing timestamps
+    results['alarm_rules'] = {'us_per_frame': (time.perf_counter() - start) / count * 1e6}
+
+    try:
+        from serial_interface import SerialInterface
+    except ImportError as e:
+        results['alarm_latency'] = {'skipped': f"missing dependency ({e})"}
+        return
+    simulator = TelemetrySimulator(DEFAULT_LAYOUT, seed=2)
+    engine = AlarmEngine()
+    interface = SerialInterface("loop://", 115200, None, None, frame_callback=engine.process)
+    start_time = time.time() - count
+    for i in range(count):
+        frame = simulator.next_frame(start_time + i)
+        if i % 10 == 0:
+            frame.voltages[5] = 4.4  # Past the over voltage limit now and then
+        interface.handle_chunk(simulator.render(frame))
+    results['alarm_latency'] = {'mean_ms': engine.total_latency / engine.frames * 1000,
+                                'max_ms': engine.max_latency * 1000}
+
+
+def bench_gui(results, renders=200):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        results['gui'] = {'skipped': f"no Tk display ({e}), run under xvfb-run"}
+        return
+    try:
+        from battery_tab import BatteryTab
+        from open_details_window import open_details_window
+        from open_temperature_details_window import open_temperature_details_window
+        from pack_map_window import open_pack_map_window
+        from render_scheduler import RenderScheduler
+    except ImportError as e:
+        root.destroy()
+        results['gui'] = {'skipped': f"missing dependency ({e})"}
+        return
+
+    frames = make_frames(renders)
+    root.withdraw()
+    with redirect_stdout(open(os.devnull, 'w')):
+        tab = BatteryTab(root, scheduler=RenderScheduler(root))
+        tab.recorder.close()
+
+    def render_all(update):
+        start = time.perf_counter()
+        for frame in frames:
+            update(frame)
+            root.update_idletasks()  # Include the redraw Tk does for the changed widgets
+        return (time.perf_counter() - start) / len(frames)
+
+    seconds = render_all(tab.update_values)
+    results['update_values'] = {'ms_per_frame': seconds * 1000}
+
+    # Trend chart over a full 12 h history at 2 frames/s: a complete redraw and the per tick append
+    chart = tab.trend_chart
+    chart.window_combobox.set("12 h")
+    end = time.time()
+    for i in range(12 * 3600 * 2):
+        tab.history.add(end - 12 * 3600 + i / 2, (500.0 + i * 1e-3, -50.0, 50.0, 3.5, 3.6 + i * 1e-7, 30.0))
+    root.update_idletasks()
+    start = time.perf_counter()
+    chart.reset()
+    root.update_idletasks()
+    redraw_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(renders):
+        end += 0.5
+        tab.history.add(end, (520.0, -50.0, 50.0, 3.5, 3.6, 30.0))
+        chart.update()
+        root.update_idletasks()
+    results['trend_chart'] = {'redraw_ms': redraw_seconds * 1000,
+                              'ms_per_update': (time.perf_counter() - start) / renders * 1000}
+
+    # The windows pull the frame through their callback on every scheduler tick
+    current = [frames[0]]
+    window_scheduler = RenderScheduler(root, refresh_rate=1)
+    for name, open_window in (('voltage_details', open_details_window),
+                              ('temperature_details', open_temperature_details_window),
+                              ('pack_map', open_pack_map_window)):
+        start = time.perf_counter()
+        window = open_window(root, frames[0], update_callback=lambda: current[0], scheduler=window_scheduler)
+        root.update_idletasks()
+        open_seconds = time.perf_counter() - start
+
+        def update(frame):
+            current[0] = frame
+            window_scheduler.tick()
+
+        seconds = render_all(update)
+        results[name] = {'open_ms': open_seconds * 1000, 'ms_per_update': seconds * 1000}
+        window_scheduler.stop()
+        window.destroy()
+    root.destroy()
+
+
+def bench_fanout(results, viewer_counts=(0, 1, 8, 32), count=500):
+    # Cost of TelemetryServer.publish on the acquisition thread per number of connected
+    # viewers, one of which never reads (a stalled viewer must not slow down the others)
+    frames = make_frames(count)
+
+    def drain(client):
+        try:
+            while client.recv(1 << 16):
+                pass
+        except OSError:
+            pass
+
+    for viewers in viewer_counts:
+        with redirect_stdout(open(os.devnull, 'w')):  # The server's connect messages
+            server = TelemetryServer(port=0)
+            server.start()
+            clients = [socket.create_connection(("127.0.0.1", server.port)) for _ in range(viewers)]
+            deadline = time.monotonic() + 5
+            while len(server.subscribers) < viewers and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for client in clients[1:]:
+                threading.Thread(target=drain, args=(client,), daemon=True).start()
+
+            start = time.perf_counter()
+            for frame in frames:
+                server.publish(frame)
+            seconds = (time.perf_counter() - start) / count
+            dropped = sum(subscriber.dropped for subscriber in server.subscribers)
+            server.stop()
+            for client in clients:
+                client.close()
+        results[f'fanout_{viewers}'] = {'us_per_publish': seconds * 1e6, 'dropped': dropped}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    print(f"\nCompared with {baseline_path}:")
+    for name, values in results.items():
+        for key, value in values.items():
+            old = baseline.get(name, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {name}.{key}: {old:.4g} -> {value:.4g} ({value / old:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser, logger and render paths")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="log sizes in frames for the logger benchmark")
+    parser.add_argument("--skip", default="", help="comma separated: parser, logger, history, alarms, gui, fanout")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="JSON", help="print the change against an earlier results file")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(',')))
+
+    results = {}
+    if 'parser' not in skip:
+        print("parser")
+        bench_parser(results)
+    if 'logger' not in skip:
+        print("logger")
+        bench_logger(results, [int(size) for size in args.sizes.split(',')])
+    if 'history' not in skip:
+        print("history")
+        bench_history(results)
+    if 'alarms' not in skip:
+        print("alarms")
+        bench_alarms(results)
+    if 'gui' not in skip:
+        print("gui")
+        bench_gui(results)
+    if 'fanout' not in skip:
+        print("fanout")
+        bench_fanout(results)
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,14 @@
 import tkinter as tk
 from tkinter import ttk
+from bms_frame import FLAG_NAMES
 
 
-def open_bms_window(master, update_callback, on_close_callback=None):
+def open_bms_window(master, update_callback, on_close_callback=None, scheduler=None):
     details_window = tk.Toplevel(master)
     details_window.title("BMS Flags")
     #details_window.iconbitmap("formula.ico")
 
-    flags_description = [
-        "System Safe", "Over Voltage", "Under Voltage", "Over Temp Cells", "Under Temp Cells",
-        "Abnormality Error", "Voltage Abnormality", "Temp Abnormality", "Voltage Sampling Abnormality",
-        "Temperature Sampling Abnormality", "Over Current", "Under Current", "IVT Not Present",
-        "Shutdown Status", "BMS Shutdown", "Is Precharged"
-    ]
+    flags_description = FLAG_NAMES
 
     # Display the BMS flag on top
     bms_flag_label = ttk.Label(details_window, text="BMS Flag: ", font=("Arial", 10))
@@ -32,20 +28,24 @@ def open_bms_window(master, update_callback, on_close_callback=None):
         separator = ttk.Separator(details_window, orient='horizontal')
         separator.grid(row=row + 1, column=0, columnspan=2, sticky='ew', pady=2)
 
+    shown_flags = [None]  # Flags string on screen, nothing is redrawn while it stays the same
+
     def update_indicators():
         new_bms_flags = update_callback()  # Fetch latest BMS flags using the callback
+        if new_bms_flags == shown_flags[0]:
+            return
+        shown_flags[0] = new_bms_flags
         bms_flag_label.config(text="BMS Flag: " + new_bms_flags)  # Update the BMS flag label
         for i, desc in enumerate(flags_description):
             color = 'grey' if len(new_bms_flags) < i + 1 else ('#06b025' if new_bms_flags[i] == '1' else 'red')
             indicators[desc].itemconfig(indicator, fill=color)
 
-    def schedule_update():
-        update_indicators()
-        details_window.after(1000, schedule_update)  # Schedule the next update
-
-    schedule_update()  # Initial call to start the update loop
+    update_indicators()  # Initial update, later ones run on the shared render tick
+    update_token = scheduler.register(update_indicators, period=1.0) if scheduler else None
 
     def on_close():
+        if update_token is not None:
+            scheduler.unregister(update_token)
         if on_close_callback:
             on_close_callback()  # Call the on_close_callback to reset the open window flag
         details_window.destroy()
@@ -0,0 +1,125 @@
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping
+
+# Number of slaves (LTC ICs) in the pack and cells / thermistors read by each of them
+PackLayout = namedtuple('PackLayout', ['slaves', 'cells_per_slave', 'thermistors_per_slave'])
+
+DEFAULT_LAYOUT = PackLayout(12, 12, 5)
+
+NAN = float('nan')
+
+SCALAR_FIELDS = (
+    'max_voltage', 'min_voltage', 'battery_voltage', 'battery_current', 'ivt_voltage', 'ivt_current',
+    'ivt_current_counter', 'charging_status', 'soc', 'bms_flags', 'bad_cell', 'bad_thermistor'
+)
+
+# Meaning of each character of the BMS_Flags bit string, '1' when set
+FLAG_NAMES = (
+    "System Safe", "Over Voltage", "Under Voltage", "Over Temp Cells", "Under Temp Cells",
+    "Abnormality Error", "Voltage Abnormality", "Temp Abnormality", "Voltage Sampling Abnormality",
+    "Temperature Sampling Abnormality", "Over Current", "Under Current", "IVT Not Present",
+    "Shutdown Status", "BMS Shutdown", "Is Precharged"
+)
+
+# Keys of the dict the parser used to return, still served by BmsFrame's mapping interface
+FRAME_KEYS = ('voltages', 'temperatures') + SCALAR_FIELDS
+
+_empty_buffers = {}
+
+
+def empty_buffers(layout):
+    # NaN filled templates per layout, copied (a plain memcpy) for every new frame
+    buffers = _empty_buffers.get(layout)
+    if buffers is None:
+        cells = layout.slaves * layout.cells_per_slave
+        thermistors = layout.slaves * layout.thermistors_per_slave
+        buffers = (array('f', [NAN]) * cells, array('f', [NAN]) * thermistors,
+                   bytes(thermistors), bytes(layout.slaves))
+        _empty_buffers[layout] = buffers
+    return buffers
+
+
+class BmsFrame(Mapping):
+    # One parsed message block. Cell voltages and temperatures live in flat
+    # float32 arrays indexed slave * per_slave + index, missing values are NaN.
+    # temperature_valid marks thermistors that reported a number,
+    # voltage_slaves / temperature_slaves the slaves that sent a row at all.
+    # stats holds the FrameStats computed once per frame (see frame_stats).
+    # Reading it like the old nested dict (frame['voltages']['Slave 3'],
+    # frame.get('soc')) still works for existing callers.
+
+    __slots__ = ('layout', 'seq', 'timestamp', 'received_at', 'text', 'parse_errors',
+                 'voltages', 'temperatures', 'temperature_valid', 'voltage_slaves', 'temperature_slaves', 'stats') \
+        + SCALAR_FIELDS
+
+    def __init__(self, layout=DEFAULT_LAYOUT):
+        voltages, temperatures, temperature_valid, slaves = empty_buffers(layout)
+        self.layout = layout
+        self.seq = 0  # Sequence number assigned by the acquisition thread
+        self.timestamp = None  # Wall clock time the frame was completed (time.time())
+        self.received_at = None  # time.perf_counter() when the last byte of the frame was read
+        self.text = ''  # Raw text of the block as shown in the console
+        self.parse_errors = 0
+        self.voltages = voltages[:]
+        self.temperatures = temperatures[:]
+        self.temperature_valid = bytearray(temperature_valid)
+        self.voltage_slaves = bytearray(slaves)
+        self.temperature_slaves = bytearray(slaves)
+        self.stats = None
+        # SCALAR_FIELDS, spelled out: a setattr loop costs a third of a frame's construction
+        self.max_voltage = self.min_voltage = self.battery_voltage = self.battery_current = None
+        self.ivt_voltage = self.ivt_current = self.ivt_current_counter = self.charging_status = None
+        self.soc = self.bms_flags = self.bad_cell = self.bad_thermistor = None
+
+    def slave_voltages(self, slave):
+        # Cell voltages of one slave (0 based) as a slice of the flat array
+        start = slave * self.layout.cells_per_slave
+        return self.voltages[start:start + self.layout.cells_per_slave]
+
+    def slave_temperatures(self, slave):
+        start = slave * self.layout.thermistors_per_slave
+        return self.temperatures[start:start + self.layout.thermistors_per_slave]
+
+    def valid_voltages(self):
+        return [v for v in self.voltages if v == v]
+
+    def valid_temperatures(self):
+        return [t for t, valid in zip(self.temperatures, self.temperature_valid) if valid]
+
+    def nan_thermistor_count(self):
+        # Thermistors on slaves that reported a temperature row but gave no number
+        per_slave = self.layout.thermistors_per_slave
+        reported = sum(self.temperature_slaves) * per_slave
+        return reported - sum(self.temperature_valid)
+
+    # Mapping interface, builds the legacy nested dict values on demand
+
+    def __getitem__(self, key):
+        if key == 'voltages':
+            return self.as_slave_dict(self.voltages, self.voltage_slaves, self.layout.cells_per_slave)
+        if key == 'temperatures':
+            return self.as_slave_dict(self.temperatures, self.temperature_slaves, self.layout.thermistors_per_slave)
+        if key in SCALAR_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FRAME_KEYS)
+
+    def __len__(self):
+        return len(FRAME_KEYS)
+
+    def as_slave_dict(self, values, slaves_seen, per_slave):
+        # {'Slave n': [values]} for the slaves present in this frame, None for missing values.
+        # Rounding hides the float32 representation error (e.g. 25.1 -> 25.100000381)
+        result = {}
+        for slave, seen in enumerate(slaves_seen):
+            if seen:
+                start = slave * per_slave
+                result[f"Slave {slave + 1}"] = [round(v, 4) if v == v else None
+                                                for v in values[start:start + per_slave]]
+        return result
+
+    def __repr__(self):
+        return f"BmsFrame(seq={self.seq}, soc={self.soc}, battery_voltage={self.battery_voltage})"
@@ -0,0 +1,264 @@
+import struct
+from array import array
+from operator import eq
+from bms_frame import BmsFrame, DEFAULT_LAYOUT, NAN
+
+
+class BmsParser:
+    # Single pass parser for the Teensy text protocol. Every line is looked at
+    # once: the text in front of the first ':' (or the 'IC' prefix of a cell
+    # row) selects a handler from a dispatch table. Malformed tokens are counted
+    # and kept in self.errors instead of raising. Results are BmsFrame objects.
+
+    max_errors_kept = 100  # Only the most recent error messages are kept
+
+    def __init__(self, layout=DEFAULT_LAYOUT):
+        self.handlers = {
+            'Printing voltages': self.start_voltages,
+            'Printing temperatures': self.start_temperatures,
+            'Max Voltage': self.parse_max_voltage,
+            'Min Voltage': self.parse_min_voltage,
+            'Battery Voltage': self.parse_battery_voltage,
+            'Battery Current': self.parse_battery_current,
+            'IVT Voltage': self.parse_ivt_voltage,
+            'IVT Current': self.parse_ivt_current,
+            'IVT Current Counter': self.parse_ivt_current_counter,
+            'SOC': self.parse_soc,
+            'BMS_Flags': self.parse_bms_flags,
+            'Bad_Cell': self.parse_bad_cell,
+            'Bad_Thermistor': self.parse_bad_thermistor,
+        }
+        self.layout = layout
+        self.slave_index = {}  # IC number as printed -> 0 based slave index
+        self.errors = []
+        self.error_count = 0
+        # Rows are staged in plain lists, a slice assignment per row, and packed into the
+        # frame's preallocated float32 arrays once per frame in finish_frame(). The lists
+        # and packers are made once, per block only the frame and its temperature_valid
+        # are allocated. This is not measurably faster than building them per frame, the
+        # float() calls of the rows dominate (see benchmarks/bench_parser.py).
+        cells = layout.slaves * layout.cells_per_slave
+        thermistors = layout.slaves * layout.thermistors_per_slave
+        self.voltage_rows = [NAN] * cells
+        self.temperature_rows = [NAN] * thermistors
+        self.empty_voltage_rows = self.voltage_rows[:]
+        self.empty_temperature_rows = self.temperature_rows[:]
+        self.voltage_struct = struct.Struct(f'{cells}f')
+        self.temperature_struct = struct.Struct(f'{thermistors}f')
+        self.frame = None  # Created by the first line of a block
+        # While reading IC rows: (staged rows, values per slave, the frame's reported slaves,
+        # True for the dash separated voltages), set once per section
+        self.section = None
+
+    def reset(self):
+        # Drops a partly parsed block
+        self.frame = None
+        self.section = None
+
+    def start_frame(self):
+        self.frame = BmsFrame(self.layout)
+        self.section = None
+        self.voltage_rows[:] = self.empty_voltage_rows
+        self.temperature_rows[:] = self.empty_temperature_rows
+
+    def finish_frame(self):
+        frame = self.frame
+        if frame is None:
+            return BmsFrame(self.layout)
+        if 1 in frame.voltage_slaves:
+            self.fill(frame.voltages, self.voltage_struct, self.voltage_rows)
+        if 1 in frame.temperature_slaves:
+            rows = self.temperature_rows
+            self.fill(frame.temperatures, self.temperature_struct, rows)
+            # 'NaN' marks a disconnected thermistor, float() accepts it and it stays invalid,
+            # as do the NaN placeholders of the slaves that sent no row
+            frame.temperature_valid = bytearray(map(eq, rows, rows))
+        self.reset()
+        return frame
+
+    def fill(self, target, packer, rows):
+        # Writes the staged rows into the frame's array in place
+        try:
+            packer.pack_into(target, 0, *rows)
+        except OverflowError:
+            target[:] = array('f', rows)  # A value beyond float32, array() stores it as inf
+
+    def parse(self, data):
+        # Parse one complete message block and return its data, even if the end marker is missing
+        self.reset()
+        feed_line = self.feed_line
+        for line in data.split('\n'):
+            frame = feed_line(line)
+            if frame is not None:
+                return frame
+        return self.finish_frame()
+
+    def feed_line(self, line):
+        # Streaming interface: returns the finished frame once its 'Bad_Thermistor:' line is seen
+        line = line.strip()
+
+        # Cell rows are by far the most common lines, so they are handled inline
+        if line[:2] == 'IC':
+            section = self.section
+            if section is None:
+                return None
+            parts = line.split(None, 2)
+            if len(parts) < 3:
+                self.report_error(f"Malformed IC row '{line}'")
+                return None
+            slave = self.slave_index.get(parts[1])
+            if slave is None:
+                slave = self.lookup_slave(parts[1])
+                if slave is None:
+                    return None
+            rows, per_slave, reported, dashed = section
+            reported[slave] = 1
+            if dashed:
+                # Cell voltages are printed with dashes as separators
+                tokens = parts[2].replace('-', ' ').split()
+            else:
+                tokens = parts[2].split()
+            try:
+                values = list(map(float, tokens))
+            except ValueError:
+                values = self.parse_tokens(tokens)
+            if len(values) > per_slave:
+                self.report_error(f"Too many values in '{line}'")
+                del values[per_slave:]
+            start = slave * per_slave
+            rows[start:start + len(values)] = values
+            return None
+
+        key, separator, value = line.partition(':')
+        if not separator:
+            return None
+        handler = self.handlers.get(key)
+        if handler is None:
+            return None
+        if self.frame is None:
+            self.start_frame()
+        try:
+            handler(value)
+        except (ValueError, IndexError):
+            self.report_error(f"Unable to parse line '{line}'")
+
+        if key == 'Bad_Thermistor':
+            return self.finish_frame()
+        return None
+
+    def report_error(self, message):
+        self.error_count += 1
+        self.frame.parse_errors += 1
+        self.errors.append(message)
+        if len(self.errors) > self.max_errors_kept:
+            del self.errors[0]
+
+    def lookup_slave(self, ic):
+        try:
+            slave = int(ic) - 1
+        except ValueError:
+            slave = -1
+        if not 0 <= slave < self.layout.slaves:
+            self.report_error(f"IC number '{ic}' is outside the pack layout")
+            return None
+        self.slave_index[ic] = slave
+        return slave
+
+    def start_voltages(self, value):
+        # A new block always starts with the voltages, drop anything left from a cut-off block
+        if self.section is not None or 1 in self.frame.voltage_slaves:
+            self.start_frame()
+        self.section = (self.voltage_rows, self.layout.cells_per_slave, self.frame.voltage_slaves, True)
+
+    def start_temperatures(self, value):
+        self.section = (self.temperature_rows, self.layout.thermistors_per_slave, self.frame.temperature_slaves,
+                        False)
+
+    def parse_tokens(self, tokens):
+        # Slow path, only taken when a row contains a malformed token; it is stored as NaN
+        values = []
+        for token in tokens:
+            try:
+                values.append(float(token))
+            except ValueError:
+                self.report_error(f"Unable to convert value '{token}' to float")
+                values.append(NAN)
+        return values
+
+    def parse_max_voltage(self, value):
+        self.section = None
+        self.frame.max_voltage = self.parse_float(value)
+
+    def parse_min_voltage(self, value):
+        self.frame.min_voltage = self.parse_float(value)
+
+    def parse_battery_voltage(self, value):
+        self.frame.battery_voltage = self.parse_float(value)
+
+    def parse_battery_current(self, value):
+        self.frame.battery_current = self.parse_float(value)
+
+    def parse_ivt_voltage(self, value):
+        self.frame.ivt_voltage = self.parse_float(value)
+
+    def parse_ivt_current(self, value):
+        self.frame.ivt_current = self.parse_float(value)
+
+    def parse_ivt_current_counter(self, value):
+        # e.g. "IVT Current Counter: 10.5Ah Charging Status: 1"
+        counter, _, rest = value.partition('Ah')
+        self.frame.ivt_current_counter = self.parse_float(counter)
+        self.frame.charging_status = int(rest.split('Status:')[1].split()[0])
+
+    def parse_soc(self, value):
+        self.frame.soc = int(value.strip().split('%')[0])
+
+    def parse_bms_flags(self, value):
+        self.frame.bms_flags = value.strip()
+
+    def parse_bad_cell(self, value):
+        self.frame.bad_cell = int(value)
+
+    def parse_bad_thermistor(self, value):
+        self.frame.bad_thermistor = int(value)
+
+    def parse_float(self, value):
+        try:
+            # Remove any trailing units like 'V' or 'A' before converting to float
+            return float(value.strip().strip('VA'))
+        except ValueError:
+            self.report_error(f"Unable to convert value '{value}' to float")
+            return None
+
+
+def format_frame(frame):
+    # Render a frame in the Teensy's text protocol (used by replay and the simulator)
+    layout = frame.layout
+    lines = ["Printing voltages:"]
+    for slave in range(layout.slaves):
+        if frame.voltage_slaves[slave]:
+            lines.append(f"IC {slave + 1} " + " ".join(f"{v:.4f}-" if v == v else "NaN-"
+                                                       for v in frame.slave_voltages(slave)))
+    lines.append("Printing temperatures:")
+    for slave in range(layout.slaves):
+        if frame.temperature_slaves[slave]:
+            lines.append(f"IC {slave + 1} " + " ".join(f"{t:.2f}" if t == t else "NaN"
+                                                       for t in frame.slave_temperatures(slave)))
+    for label, value, digits, unit in (("Max Voltage", frame.max_voltage, 4, "V"),
+                                       ("Min Voltage", frame.min_voltage, 4, "V"),
+                                       ("Battery Voltage", frame.battery_voltage, 2, "V"),
+                                       ("Battery Current", frame.battery_current, 2, "A"),
+                                       ("IVT Voltage", frame.ivt_voltage, 2, "V"),
+                                       ("IVT Current", frame.ivt_current, 2, "A")):
+        if value is not None:
+            lines.append(f"{label}: {value:.{digits}f}{unit}")
+    if frame.ivt_current_counter is not None:
+        lines.append(f"IVT Current Counter: {frame.ivt_current_counter:.2f}Ah Charging Status: {frame.charging_status or 0}")
+    if frame.soc is not None:
+        lines.append(f"SOC: {frame.soc}%")
+    if frame.bms_flags is not None:
+        lines.append(f"BMS_Flags: {frame.bms_flags}")
+    if frame.bad_cell is not None:
+        lines.append(f"Bad_Cell: {frame.bad_cell}")
+    lines.append(f"Bad_Thermistor: {frame.bad_thermistor or 0}")
+    return "\n".join(lines)
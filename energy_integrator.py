@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+# State file version, bumped when the saved fields change
+STATE_VERSION = 1
+
+
+class EnergyIntegrator:
+    # Integrates pack power and current over every parsed frame (trapezoidal rule on
+    # the frames' own timestamps): energy and charge into the pack (positive current,
+    # charging) and out of it are kept apart. An interval longer than max_gap (port
+    # closed, reconnect, GUI restart) or a clock that went back is not integrated,
+    # only counted as a gap, so the totals never include a guessed value.
+    # process() runs on the serial read thread, snapshot() on any other thread.
+
+    def __init__(self, max_gap=5.0):
+        self.max_gap = max_gap
+        self.lock = threading.Lock()
+        self.clear()
+
+    def reset(self):
+        # Start a new session (Reset button)
+        with self.lock:
+            self.clear()
+
+    def clear(self):
+        self.started = time.time()  # Start of the session the totals belong to
+        self.energy_in = 0.0  # Wh
+        self.energy_out = 0.0
+        self.charge_in = 0.0  # Ah
+        self.charge_out = 0.0
+        self.integrated_time = 0.0  # Seconds covered by consecutive frames
+        self.gap_time = 0.0  # Seconds lost to gaps
+        self.gaps = 0
+        self.frames = 0
+        self.last_time = None
+        self.last_voltage = None
+        self.last_current = None
+
+    def process(self, frame):
+        voltage, current, timestamp = frame.battery_voltage, frame.battery_current, frame.timestamp
+        if voltage is None or current is None or timestamp is None:
+            return
+        with self.lock:
+            self.frames += 1
+            last_time = self.last_time
+            if last_time is not None:
+                elapsed = timestamp - last_time
+                if 0 < elapsed <= self.max_gap:
+                    hours = elapsed / 3600
+                    power = (voltage * current + self.last_voltage * self.last_current) / 2
+                    charge = (current + self.last_current) / 2
+                    if power >= 0:
+                        self.energy_in += power * hours
+                    else:
+                        self.energy_out -= power * hours
+                    if charge >= 0:
+                        self.charge_in += charge * hours
+                    else:
+                        self.charge_out -= charge * hours
+                    self.integrated_time += elapsed
+                elif elapsed > 0:
+                    self.gaps += 1
+                    self.gap_time += elapsed
+                elif elapsed < 0:
+                    self.gaps += 1  # Clock stepped back, start again from this frame
+            self.last_time = timestamp
+            self.last_voltage = voltage
+            self.last_current = current
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'version': STATE_VERSION,
+                'started': self.started,
+                'energy_in_wh': self.energy_in,
+                'energy_out_wh': self.energy_out,
+                'charge_in_ah': self.charge_in,
+                'charge_out_ah': self.charge_out,
+                'integrated_time': self.integrated_time,
+                'gap_time': self.gap_time,
+                'gaps': self.gaps,
+                'frames': self.frames,
+                'last_time': self.last_time,
+                'last_voltage': self.last_voltage,
+                'last_current': self.last_current,
+            }
+
+    def restore(self, state):
+        if state.get('version') != STATE_VERSION:
+            return
+        with self.lock:
+            self.started = state['started']
+            self.energy_in = state['energy_in_wh']
+            self.energy_out = state['energy_out_wh']
+            self.charge_in = state['charge_in_ah']
+            self.charge_out = state['charge_out_ah']
+            self.integrated_time = state['integrated_time']
+            self.gap_time = state['gap_time']
+            self.gaps = state['gaps']
+            self.frames = state['frames']
+            self.last_time = state['last_time']
+            self.last_voltage = state['last_voltage']
+            self.last_current = state['last_current']
+
+    def load(self, path):
+        # Continue the totals saved by an earlier run, see SessionRecorder.add_state
+        try:
+            with open(path, encoding='utf-8') as state_file:
+                self.restore(json.load(state_file))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading energy totals from {path}: {e}")
+
+
+def average_power(state):
+    # Mean power in W over the integrated time (charging positive), None before the first interval
+    if not state['integrated_time']:
+        return None
+    return (state['energy_in_wh'] - state['energy_out_wh']) * 3600 / state['integrated_time']
+
@@ -0,0 +1,34 @@
+import threading
+from collections import deque
+
+
+class FrameHandoff:
+    # Passes frames from the serial read thread to the Tk main loop. The reader
+    # only appends to a bounded deque and never touches a widget; the GUI drains
+    # it on its own after() tick. If the GUI falls behind the oldest frames are
+    # dropped, so the newest frame is always available and memory stays bounded.
+
+    def __init__(self, max_pending=20):
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_pending)
+        self.latest = None  # Newest frame published, also readable between drains
+        self.published = 0
+        self.dropped = 0  # Frames pushed out of the deque before the GUI drained them
+
+    def publish(self, frame):
+        # Called from the read thread for every frame
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(frame)
+            self.latest = frame
+            self.published += 1
+
+    def drain(self):
+        # Called from the Tk thread, returns the frames received since the last call, oldest first
+        with self.lock:
+            if not self.pending:
+                return []
+            frames = list(self.pending)
+            self.pending.clear()
+        return frames
@@ -0,0 +1,84 @@
+FRAME_START = b'Printing voltages:'
+FRAME_END = b'Bad_Thermistor:'
+
+
+class FrameSplitter:
+    # Incrementally splits the raw serial byte stream into complete
+    # "Printing voltages:" ... "Bad_Thermistor: n" blocks. Boundaries are found
+    # directly in one reusable bytearray and each frame is decoded only once.
+
+    def __init__(self, max_frame_bytes=65536):
+        self.buffer = bytearray()
+        self.max_frame_bytes = max_frame_bytes  # A longer "frame" means we lost sync
+        self.in_frame = False  # True when the buffer starts with FRAME_START
+        self.search_from = 0  # Where to resume looking for FRAME_END
+        self.frames_split = 0
+        self.bytes_discarded = 0
+
+    def reset(self):
+        self.buffer.clear()
+        self.in_frame = False
+        self.search_from = 0
+
+    def feed(self, data):
+        # Append a chunk of received bytes and return the text of every frame it completed
+        self.buffer += data
+        frames = []
+
+        while True:
+            if not self.in_frame:
+                if not self.sync_to_start():
+                    break
+
+            end = self.buffer.find(FRAME_END, self.search_from)
+            if end < 0:
+                if len(self.buffer) > self.max_frame_bytes:
+                    # Never saw the end marker, drop this start and look for the next one
+                    self.discard(len(FRAME_START))
+                    self.in_frame = False
+                    continue
+                self.search_from = max(len(FRAME_START), len(self.buffer) - len(FRAME_END) + 1)
+                break
+
+            # A new start before the end marker means the previous frame was cut short
+            restart = self.buffer.find(FRAME_START, len(FRAME_START), end)
+            if restart >= 0:
+                self.discard(restart)
+                self.search_from = len(FRAME_START)
+                continue
+
+            newline = self.buffer.find(b'\n', end)
+            if newline < 0:
+                # The end marker line is not complete yet
+                self.search_from = end
+                break
+
+            frames.append(self.decode(newline + 1))
+            del self.buffer[:newline + 1]
+            self.in_frame = False
+            self.search_from = 0
+            self.frames_split += 1
+
+        return frames
+
+    def sync_to_start(self):
+        start = self.buffer.find(FRAME_START)
+        if start < 0:
+            # Keep only what could be the beginning of a split start marker
+            self.discard(max(0, len(self.buffer) - len(FRAME_START) + 1))
+            return False
+        # Anything in front of the marker (line noise, a half frame) is dropped
+        self.discard(start)
+        self.in_frame = True
+        self.search_from = len(FRAME_START)
+        return True
+
+    def discard(self, count):
+        if count:
+            del self.buffer[:count]
+            self.bytes_discarded += count
+
+    def decode(self, length):
+        # Bad bytes become U+FFFD instead of raising, the parser will flag the affected token
+        text = self.buffer[:length].decode('utf-8', errors='replace')
+        return text.replace('\r', '').rstrip('\n')
@@ -0,0 +1,120 @@
+from math import sqrt
+from operator import mul, sub
+
+NAN = float('nan')
+
+
+class SeriesStats:
+    # Statistics of one flat list of values (cell voltages or temperatures) of a frame.
+    # argmin / argmax are flat indices into the array (slave * per_slave + index),
+    # -1 when there is no reading at all. slave_spread holds max - min per slave
+    # (NaN for a slave without readings). The *_delta fields are the change since
+    # the previous frame, NaN for the first frame.
+
+    __slots__ = ('per_slave', 'count', 'minimum', 'maximum', 'mean', 'std', 'argmin', 'argmax',
+                 'slave_spread', 'min_delta', 'max_delta', 'mean_delta', 'max_change')
+
+    def __init__(self, values, slaves, per_slave):
+        self.per_slave = per_slave
+        total = sum(values)
+        complete = total == total
+        if complete:
+            # No NaN in the array (the usual case), the builtins run over it directly
+            valid = values
+            self.count = len(values)
+        else:
+            valid = [v for v in values if v == v]
+            self.count = len(valid)
+            total = sum(valid)
+
+        if self.count:
+            self.minimum = min(valid)
+            self.maximum = max(valid)
+            self.argmin = values.index(self.minimum)
+            self.argmax = values.index(self.maximum)
+            self.mean = total / self.count
+            variance = sum(map(mul, valid, valid)) / self.count - self.mean * self.mean
+            self.std = sqrt(variance) if variance > 0 else 0.0
+        else:
+            self.minimum = self.maximum = self.mean = self.std = NAN
+            self.argmin = self.argmax = -1
+
+        spread = []
+        for start in range(0, slaves * per_slave, per_slave):
+            row = values[start:start + per_slave]
+            if not complete:
+                row = [v for v in row if v == v]
+            spread.append(max(row) - min(row) if row else NAN)
+        self.slave_spread = spread
+        self.min_delta = self.max_delta = self.mean_delta = self.max_change = NAN
+
+    def compare(self, values, previous_values, previous):
+        # Changes against the same series of the previous frame
+        self.min_delta = self.minimum - previous.minimum
+        self.max_delta = self.maximum - previous.maximum
+        self.mean_delta = self.mean - previous.mean
+        # Largest change of a single cell / thermistor, NaN readings on either side are skipped
+        if self.count == len(values) and previous.count == len(previous_values):
+            changes = list(map(sub, values, previous_values))
+            self.max_change = max(max(changes), -min(changes)) if changes else NAN
+        else:
+            changes = [abs(a - b) for a, b in zip(values, previous_values) if a == a and b == b]
+            self.max_change = max(changes) if changes else NAN
+
+    def location(self, index):
+        # (slave, index within the slave), both 1 based as shown in the GUI, for a flat index
+        if index < 0:
+            return None
+        return index // self.per_slave + 1, index % self.per_slave + 1
+
+    @property
+    def spread(self):
+        return self.maximum - self.minimum
+
+    def __repr__(self):
+        return (f"SeriesStats(min={self.minimum:.4f} at {self.location(self.argmin)}, "
+                f"max={self.maximum:.4f} at {self.location(self.argmax)}, mean={self.mean:.4f}, std={self.std:.4f})")
+
+
+class FrameStats:
+    __slots__ = ('voltages', 'temperatures')
+
+    def __init__(self, voltages, temperatures, layout):
+        self.voltages = SeriesStats(voltages, layout.slaves, layout.cells_per_slave)
+        self.temperatures = SeriesStats(temperatures, layout.slaves, layout.thermistors_per_slave)
+
+
+def values_of(frame):
+    # Python floats are created once per frame, the builtins are faster on a list than on the float32 arrays
+    return frame.voltages.tolist(), frame.temperatures.tolist()
+
+
+class StatsEngine:
+    # Computes the statistics of every frame once, in the acquisition thread, and
+    # attaches them as frame.stats so the GUI panels and windows only read them
+
+    def __init__(self):
+        self.previous = None  # (layout, voltages, temperatures, stats) of the last frame
+
+    def process(self, frame):
+        voltages, temperatures = values_of(frame)
+        stats = FrameStats(voltages, temperatures, frame.layout)
+        previous = self.previous
+        if previous is not None and previous[0] == frame.layout:
+            stats.voltages.compare(voltages, previous[1], previous[3].voltages)
+            stats.temperatures.compare(temperatures, previous[2], previous[3].temperatures)
+        frame.stats = stats
+        self.previous = (frame.layout, voltages, temperatures, stats)
+        return stats
+
+    def reset(self):
+        # A new connection, the first frame has nothing to be compared with
+        self.previous = None
+
+
+def frame_stats(frame):
+    # Statistics of a frame that did not go through a StatsEngine (loaded from a
+    # file, the empty startup frame) are computed on first use, without deltas
+    if frame.stats is None:
+        frame.stats = FrameStats(*values_of(frame), frame.layout)
+    return frame.stats
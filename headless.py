@@ -0,0 +1,120 @@
+import argparse
+import signal
+import threading
+import time
+from datetime import datetime
+from alarm_engine import AlarmEngine, format_event, load_rules
+from bms_frame import PackLayout
+from energy_integrator import EnergyIntegrator
+from frame_stats import frame_stats
+from serial_interface import SerialInterface
+from session_recorder import SessionRecorder
+from telemetry_server import TelemetryServer
+
+
+def summary_line(interface, frame, frames_per_second, energy=None):
+    # One line per interval: connection, rate and the key values of the newest frame
+    line = f"{datetime.now():%Y-%m-%d %H:%M:%S} {interface.state}, {interface.frames_received} frames " \
+           f"({frames_per_second:.1f}/s)"
+    if frame is None:
+        return line + ", no data yet"
+    stats = frame_stats(frame)
+    voltages, temperatures = stats.voltages, stats.temperatures
+    line += f", SOC {frame.soc}%" if frame.soc is not None else ""
+    if frame.battery_voltage is not None and frame.battery_current is not None:
+        line += f", {frame.battery_voltage:.1f} V {frame.battery_current:.1f} A"
+    if voltages.count:
+        line += (f", cells {voltages.minimum:.3f} V (S%d #%d)" % voltages.location(voltages.argmin)
+                 + f" - {voltages.maximum:.3f} V (S%d #%d)" % voltages.location(voltages.argmax))
+    if temperatures.count:
+        line += f", max temp {temperatures.maximum:.1f} °C (S%d #%d)" % temperatures.location(temperatures.argmax)
+    line += f", flags {frame.bms_flags or '-'}"
+    if energy is not None:
+        line += f", charged {energy['energy_in_wh'] / 1000:.3f} kWh {energy['charge_in_ah']:.2f} Ah"
+        if energy['energy_out_wh']:
+            line += f", discharged {energy['energy_out_wh'] / 1000:.3f} kWh {energy['charge_out_ah']:.2f} Ah"
+    if interface.parser.error_count:
+        line += f", parse errors {interface.parser.error_count}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log the BMS telemetry without the GUI (e.g. as a service)")
+    parser.add_argument("port", help="serial port or pyserial URL, e.g. /dev/ttyACM0, COM4, socket://host:port")
+    parser.add_argument("--baud", default="115200", help="baud rate, or 'auto' to detect it")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between summary lines")
+    parser.add_argument("--directory", default="logs", help="where the session files are written")
+    parser.add_argument("--name", help="added to the log file names")
+    parser.add_argument("--no-binary", action="store_true", help="do not write the .bms session file")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="also publish the frames on bms://HOST:PORT for GUI viewers")
+    parser.add_argument("--serve-host", default="127.0.0.1", help="address to publish on, 0.0.0.0 for all")
+    parser.add_argument("--alarms", default="alarms.json", help="alarm rules, the defaults when the file is missing")
+    parser.add_argument("--slaves", type=int, default=12)
+    parser.add_argument("--cells", type=int, default=12, help="cells per slave")
+    parser.add_argument("--thermistors", type=int, default=5, help="thermistors per slave")
+    args = parser.parse_args()
+
+    layout = PackLayout(args.slaves, args.cells, args.thermistors)
+    recorder = SessionRecorder(directory=args.directory, binary=not args.no_binary, name=args.name)
+    energy = EnergyIntegrator()
+    energy_file = f"energy_{args.name}.json" if args.name else "energy.json"
+    energy.load(recorder.state_path(energy_file))
+    recorder.add_state(energy_file, energy.snapshot)
+    recorder.start()
+    latest = [None]  # Only the newest frame is kept in memory, everything else goes straight to the recorder
+    telemetry_server = None
+    if args.serve:
+        telemetry_server = TelemetryServer(args.serve_host, args.serve)
+        telemetry_server.start()
+
+    # Alarm events are printed from the read thread the moment a frame crosses a limit
+    alarms = AlarmEngine(load_rules(args.alarms), callback=lambda event: print(format_event(event), flush=True))
+
+    def on_frame(frame):
+        alarms.process(frame)
+        recorder.record(frame)
+        energy.process(frame)
+        latest[0] = frame
+        if telemetry_server is not None:
+            telemetry_server.publish(frame)
+
+    auto_baud = args.baud.lower() == 'auto'
+    interface = SerialInterface(args.port, 115200 if auto_baud else int(args.baud), None, None,
+                                frame_callback=on_frame, layout=layout)
+    if auto_baud:
+        interface.change_baudrate(None)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    # A service may start before the adapter is plugged in, keep trying until the port opens
+    retry_delay = 1.0
+    interface.open_serial_port(args.port)
+    while not interface.running and not stop.wait(retry_delay):
+        retry_delay = min(retry_delay * 2, 30.0)
+        interface.open_serial_port(args.port)
+
+    last_frames = interface.frames_received
+    last_time = time.monotonic()
+    while not stop.wait(args.interval):
+        now = time.monotonic()
+        frames = interface.frames_received
+        line = summary_line(interface, latest[0], (frames - last_frames) / (now - last_time), energy.snapshot())
+        active = alarms.active()[1]
+        if active:
+            line += ", ALARMS: " + "; ".join(event.name for event in active)
+        print(line, flush=True)
+        last_frames, last_time = frames, now
+
+    if interface.running:
+        interface.close_serial_port()
+    if telemetry_server is not None:
+        telemetry_server.stop()
+    recorder.close()
+    print("Alarm rules: " + alarms.latency_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import threading
+from array import array
+from frame_stats import frame_stats
+
+NAN = float('nan')
+
+# Values kept per frame, in this order
+SERIES = ('pack_voltage', 'current', 'soc', 'min_cell', 'max_cell', 'max_temp')
+
+# Bucket width in seconds and number of buckets kept per level: 1 h at 1 s,
+# 12 h at 10 s and 48 h at 1 min. Together with the full resolution level
+# this is about 2 MB regardless of how long the session runs.
+DEFAULT_LEVELS = ((1.0, 3600), (10.0, 4320), (60.0, 2880))
+
+
+def frame_values(frame):
+    stats = frame_stats(frame)
+    voltages, temperatures = stats.voltages, stats.temperatures
+    return (
+        NAN if frame.battery_voltage is None else frame.battery_voltage,
+        NAN if frame.battery_current is None else frame.battery_current,
+        NAN if frame.soc is None else frame.soc,
+        voltages.minimum,
+        voltages.maximum,
+        temperatures.maximum,
+    )
+
+
+class Level:
+    # Fixed size ring of entries ordered by time. Every entry has a start time and a
+    # min, max and mean per series; the full resolution level stores one frame per
+    # entry (min == max == mean). Nothing is allocated after construction.
+
+    def __init__(self, width, capacity):
+        self.width = width  # Bucket width in seconds, 0 for the full resolution level
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.minimum = [array('f', bytes(4 * capacity)) for _ in SERIES]
+        self.maximum = [array('f', bytes(4 * capacity)) for _ in SERIES]
+        self.mean = [array('f', bytes(4 * capacity)) for _ in SERIES]
+        self.start = 0  # Slot of the oldest entry
+        self.length = 0
+        # Running sums of the open (newest) bucket, its mean is rewritten with every value
+        self.totals = [0.0] * len(SERIES)
+        self.counts = [0] * len(SERIES)
+
+    def slot(self, index):
+        return (self.start + index) % self.capacity
+
+    def time_at(self, index):
+        return self.times[(self.start + index) % self.capacity]
+
+    def oldest(self):
+        return self.times[self.start] if self.length else None
+
+    def newest(self):
+        return self.time_at(self.length - 1) if self.length else None
+
+    def append_entry(self, start_time):
+        if self.length == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.length += 1
+        slot = self.slot(self.length - 1)
+        self.times[slot] = start_time
+        return slot
+
+    def add(self, timestamp, values):
+        if not self.width:
+            slot = self.append_entry(timestamp)
+            for series, value in enumerate(values):
+                self.minimum[series][slot] = self.maximum[series][slot] = self.mean[series][slot] = value
+            return
+
+        bucket_start = timestamp - timestamp % self.width
+        if self.length and self.newest() == bucket_start:
+            slot = self.slot(self.length - 1)
+        else:
+            slot = self.append_entry(bucket_start)
+            self.totals = [0.0] * len(SERIES)
+            self.counts = [0] * len(SERIES)
+            for series in range(len(SERIES)):
+                self.minimum[series][slot] = self.maximum[series][slot] = self.mean[series][slot] = NAN
+
+        for series, value in enumerate(values):
+            if value != value:
+                continue  # NaN, no reading in this frame
+            count = self.counts[series]
+            if count:
+                if value < self.minimum[series][slot]:
+                    self.minimum[series][slot] = value
+                if value > self.maximum[series][slot]:
+                    self.maximum[series][slot] = value
+            else:
+                self.minimum[series][slot] = self.maximum[series][slot] = value
+            self.totals[series] += value
+            self.counts[series] = count + 1
+            self.mean[series][slot] = self.totals[series] / (count + 1)
+
+    def bisect(self, timestamp):
+        # Index of the first entry starting at or after timestamp
+        low, high = 0, self.length
+        while low < high:
+            middle = (low + high) // 2
+            if self.time_at(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def clear(self):
+        self.start = self.length = 0
+
+
+class HistoryStore:
+    # History of the key pack values (SERIES) of a session at several resolutions.
+    # Every frame goes into the full resolution ring (the most recent `raw_samples`
+    # frames) and into the open bucket of every coarser level, so memory is fixed by
+    # the capacities. record() runs on the serial read thread, query() on the Tk
+    # thread; a query reads at most a few entries per requested point, so its cost
+    # follows the width of the plot, not the length of the session.
+
+    def __init__(self, raw_samples=12000, levels=DEFAULT_LEVELS):
+        self.lock = threading.Lock()
+        self.levels = [Level(0, raw_samples)] + [Level(width, capacity) for width, capacity in levels]
+        self.version = 0  # Incremented with every frame, lets a view skip a redraw without new data
+
+    def record(self, frame):
+        if frame.timestamp is not None:
+            self.add(frame.timestamp, frame_values(frame))
+
+    def add(self, timestamp, values):
+        with self.lock:
+            newest = self.levels[0].newest()
+            if newest is not None and timestamp < newest:
+                return  # Clock stepped back, the rings must stay ordered
+            for level in self.levels:
+                level.add(timestamp, values)
+            self.version += 1
+
+    def clear(self):
+        with self.lock:
+            for level in self.levels:
+                level.clear()
+            self.version += 1
+
+    def time_range(self):
+        # (oldest, newest) timestamp held at any resolution, None when empty
+        with self.lock:
+            oldest = [level.oldest() for level in self.levels if level.length]
+            if not oldest:
+                return None
+            return min(oldest), self.levels[0].newest()
+
+    def choose_level(self, start, end, points):
+        # The finest level that still holds `start` and has at most a few entries per point
+        candidates = [level for level in self.levels if level.length]
+        if not candidates:
+            return None, 0, 0
+        for level in candidates:
+            # A ring that has not wrapped yet holds everything since the first frame
+            covers = level.oldest() <= start or level.length < level.capacity or level is candidates[-1]
+            first = level.bisect(start - level.width)  # The bucket that contains start
+            last = level.bisect(end + 1e-9)
+            if covers and last - first <= max(4 * points, 64):
+                return level, first, last
+        # Nothing fine enough: the coarsest level, limited to the newest entries of the range
+        level = candidates[-1]
+        first = level.bisect(start - level.width)
+        last = level.bisect(end + 1e-9)
+        return level, max(first, last - max(4 * points, 64)), last
+
+    def query(self, name, start, end, points):
+        # Up to `points` equally wide bins between start and end: a list of
+        # (bin start time, min, max, mean), bins without data are left out
+        series = SERIES.index(name)
+        width = (end - start) / max(points, 1)
+        if width <= 0:
+            return []
+        bins = []
+        with self.lock:
+            level, first, last = self.choose_level(start, end, points)
+            if level is None:
+                return bins
+            times, minimum, maximum, mean = level.times, level.minimum[series], level.maximum[series], level.mean[series]
+            current = -1
+            low = high = total = NAN
+            count = 0
+            for index in range(first, last):
+                slot = level.slot(index)
+                value = mean[slot]
+                if value != value:
+                    continue
+                number = int((times[slot] - start) / width)
+                if number < 0:
+                    number = 0  # A bucket that started before the range
+                elif number >= points:
+                    break
+                if number != current:
+                    if count:
+                        bins.append((start + current * width, low, high, total / count))
+                    current, low, high, total, count = number, minimum[slot], maximum[slot], value, 1
+                else:
+                    low = min(low, minimum[slot])
+                    high = max(high, maximum[slot])
+                    total += value
+                    count += 1
+            if count:
+                bins.append((start + current * width, low, high, total / count))
+        return bins
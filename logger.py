@@ -30,11 +30,15 @@ def parse_log_contents(log_contents):
     return all_combined_readings
 
 
+def csv_headers(cells=144, thermistors=60):
+    # Generate headers for cells and thermistors, including 'vtime' at the start
+    return ['vtime'] + [f"Cell #{i + 1}" for i in range(cells)] + [f"Therm #{i + 1}" for i in range(thermistors)]
+
+
 def save_to_csv(data):
     directory = "logs"
 
-    # Generate headers for cells and thermistors, including 'vtime' at the start
-    headers = ['vtime'] + [f"Cell #{i + 1}" for i in range(144)] + [f"Therm #{i + 1}" for i in range(60)]
+    headers = csv_headers()
 
     # Check if data is not empty and contains non-empty rows
     data_exists = any(data)  # This checks if there's at least one non-empty row in data
@@ -1,27 +1,117 @@
+import time
+
+# Reference point of the startup profile, taken before any of the heavier imports
+startup_marks = [("start", time.perf_counter())]
+
+
+def mark(name):
+    startup_marks.append((name, time.perf_counter()))
+
+
+def print_startup_report():
+    start = startup_marks[0][1]
+    previous = start
+    print("Startup profile:")
+    for name, at in startup_marks[1:]:
+        print(f"  {name:<24} {1000 * (at - previous):8.1f} ms   total {1000 * (at - start):8.1f} ms")
+        previous = at
+
+
+import argparse
 import tkinter as tk
 from tkinter import ttk
+mark("import tkinter")
 from battery_tab import BatteryTab
+from overview_tab import OverviewTab
+from port_watcher import PortWatcher
+from render_scheduler import RenderScheduler
+mark("import battery_tab")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UoP Racing CAN Interface")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup step took once the window is usable")
+    parser.add_argument("--tabs", type=int, default=1,
+                        help="number of battery tabs (one serial port each) to open at startup")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="publish the frames of the first tab on bms://HOST:PORT (PORT + n for tab n + 1)")
+    parser.add_argument("--serve-host", default="127.0.0.1",
+                        help="address to publish on, 0.0.0.0 for viewers on other machines")
+    args = parser.parse_args()
+
     # Create the main window
     root = tk.Tk()
     root.title("UoP Racing CAN Interface")
     root.geometry("1644x880")
     #root.iconbitmap("formula.ico")
+    mark("create root window")
 
     # Create the tab control
 
     tab_control = ttk.Notebook(root)
 
-    # Create a frame for the 'Battery' tab
-    battery_tab_frame = ttk.Frame(tab_control)
-    battery_tab = BatteryTab(battery_tab_frame)  # Create an instance of BatteryTab
-    battery_tab_frame.pack(fill="both", expand=True)  # Pack the frame to the window
+    # One render tick shared by all tabs and their windows, one port watcher for all device lists
+    scheduler = RenderScheduler(root, refresh_rate=4)
+    port_watcher = PortWatcher()
+    battery_tabs = []  # (tab frame, BatteryTab)
+
+    # Overview of all ports, always the last tab
+    overview_frame = ttk.Frame(tab_control)
+    overview = OverviewTab(overview_frame, scheduler, add_tab_callback=lambda: add_battery_tab())
+    tab_control.add(overview_frame, text='Overview')
 
-    tab_control.add(battery_tab_frame, text='Battery')
+    def add_battery_tab():
+        number = len(battery_tabs) + 1
+        name = "Battery" if number == 1 else f"Battery {number}"
+        # Create a frame for the 'Battery' tab
+        battery_tab_frame = ttk.Frame(tab_control)
+        telemetry_server = None
+        if args.serve:
+            from telemetry_server import TelemetryServer
+            telemetry_server = TelemetryServer(args.serve_host, args.serve + number - 1)
+            telemetry_server.start()
+        battery_tab = BatteryTab(battery_tab_frame, scheduler=scheduler, port_watcher=port_watcher,
+                                 name=None if number == 1 else f"battery{number}",
+                                 telemetry_server=telemetry_server)
+        battery_tab_frame.pack(fill="both", expand=True)  # Pack the frame to the window
+        tab_control.insert(overview_frame, battery_tab_frame, text=name)
+        battery_tabs.append((battery_tab_frame, battery_tab))
+        overview.add(name, battery_tab)
+        battery_tab.set_visible(False)
+        return battery_tab
+
+    for _ in range(max(1, args.tabs)):
+        add_battery_tab()
     tab_control.pack(expand=1, fill="both")
+    tab_control.select(battery_tabs[0][0])
+    battery_tabs[0][1].set_visible(True)
+    mark("build widgets")
+
+    def on_tab_changed(event):
+        # Only the tab on screen renders, the others keep buffering their frames
+        selected = tab_control.select()
+        for battery_tab_frame, battery_tab in battery_tabs:
+            battery_tab.set_visible(str(battery_tab_frame) == selected)
+        overview.set_visible(str(overview_frame) == selected)
+
+    tab_control.bind("<<NotebookTabChanged>>", on_tab_changed)
+
+    if args.profile_startup:
+        # Idle callbacks run in the order they were added, Tk's own redraws of the
+        # widgets created above come first
+        root.after_idle(mark, "first paint")
 
-    root.protocol("WM_DELETE_WINDOW", battery_tab.close_application)
+        def startup_complete():
+            mark("first port list")
+            print_startup_report()
+
+        battery_tabs[0][1].on_startup_complete = startup_complete
+
+    def close_application():
+        port_watcher.stop()
+        for battery_tab_frame, battery_tab in battery_tabs:
+            battery_tab.close_application()
+
+    root.protocol("WM_DELETE_WINDOW", close_application)
     # Start the GUI loop
     root.mainloop()
-
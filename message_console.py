@@ -0,0 +1,112 @@
+import tkinter as tk
+from collections import deque
+
+
+class MessageConsole:
+    # Received messages view backed by a ring buffer of frame texts. The Text
+    # widget only ever holds `visible_frames` frames (newest on top); the
+    # scrollbar moves that window through the ring buffer instead of scrolling
+    # an ever growing widget, so the cost of an append does not depend on how
+    # long the session has been running.
+
+    def __init__(self, text_widget, scrollbar, max_frames=2000, visible_frames=20):
+        self.text = text_widget
+        self.scrollbar = scrollbar
+        self.frames = deque(maxlen=max_frames)  # Oldest on the left, newest on the right
+        self.visible_frames = visible_frames
+        self.offset = 0  # Number of newest frames above the window, 0 while following live data
+        self.shown_lines = deque()  # Line count of every frame in the widget, top first
+        self.stale = False  # Frames were stored without updating the widget
+        self.scrollbar.config(command=self.on_scroll)
+        # The scrollbar reflects the position in the ring buffer, not in the widget
+        self.text.config(state='disabled', yscrollcommand='')
+
+    def append(self, messages):
+        # Add a batch of messages, oldest first
+        if not messages:
+            return
+        dropped = max(0, len(self.frames) + len(messages) - self.frames.maxlen)
+        self.frames.extend(messages)
+
+        if self.offset:
+            # Keep the window on the frames the user scrolled to, as long as they are still buffered
+            self.offset = min(self.offset + len(messages), max(0, len(self.frames) - self.visible_frames))
+            if dropped:
+                self.render()
+            self.update_scrollbar()
+            return
+
+        new = list(messages)[-self.visible_frames:]
+        new.reverse()
+        self.text.config(state='normal')
+        self.text.insert('1.0', "\n".join(new) + "\n")
+        for message in reversed(new):
+            self.shown_lines.appendleft(message.count("\n") + 1)
+        self.trim()
+        self.text.config(state='disabled')
+        self.text.see('1.0')
+        self.update_scrollbar()
+
+    def store(self, messages):
+        # Buffer messages without touching the widget (the console is not shown), catch_up() renders them
+        self.frames.extend(messages)
+        if self.offset:
+            self.offset = min(self.offset + len(messages), max(0, len(self.frames) - self.visible_frames))
+        self.stale = True
+
+    def catch_up(self):
+        if self.stale:
+            self.render()
+
+    def trim(self):
+        # Drop the oldest frames at the bottom of the widget beyond the visible window
+        excess = len(self.shown_lines) - self.visible_frames
+        if excess <= 0:
+            return
+        for _ in range(excess):
+            self.shown_lines.pop()
+        keep_lines = sum(self.shown_lines)
+        self.text.delete(f"{keep_lines + 1}.0", tk.END)
+
+    def render(self):
+        # Rebuild the widget from the ring buffer at the current offset
+        newest = len(self.frames) - self.offset
+        window = [self.frames[i] for i in range(newest - 1, max(newest - self.visible_frames, 0) - 1, -1)]
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        if window:
+            self.text.insert('1.0', "\n".join(window) + "\n")
+        self.text.config(state='disabled')
+        self.shown_lines = deque(message.count("\n") + 1 for message in window)
+        self.stale = False
+        self.text.yview_moveto(0)
+        self.update_scrollbar()
+
+    def on_scroll(self, action, amount, unit=None):
+        # Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')
+        last_offset = max(0, len(self.frames) - self.visible_frames)
+        if action == 'moveto':
+            offset = int(float(amount) * len(self.frames))
+        else:
+            step = self.visible_frames if unit == 'pages' else 1
+            offset = self.offset + int(amount) * step
+        offset = min(max(0, offset), last_offset)
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def update_scrollbar(self):
+        total = len(self.frames)
+        if total <= self.visible_frames:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_frames) / total)
+
+    def clear(self):
+        self.frames.clear()
+        self.offset = 0
+        self.render()
+
+    def get_all_text(self):
+        # Every buffered message, newest first like the widget
+        return "\n".join(reversed(self.frames))
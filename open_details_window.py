@@ -1,65 +1,78 @@
 import tkinter as tk
 from tkinter import ttk
+from frame_stats import frame_stats
 
 
-def open_details_window(master, initial_voltages, update_callback=None, on_close_callback=None):
+def open_details_window(master, initial_frame, update_callback=None, on_close_callback=None,
+                        scheduler=None):
     details_window = tk.Toplevel(master)
     details_window.title("Slave Detailed View")
     # details_window.iconbitmap("formula.ico")
 
-    # Store references to the voltage value labels
-    voltage_labels = {}
+    layout = initial_frame.layout
 
-    for i in range(1, 13):
+    # Store references to the voltage value labels, in the same order as the frame's voltage array
+    voltage_labels = []
+
+    for i in range(1, layout.slaves + 1):
         slave_frame = ttk.LabelFrame(details_window, text=f"Slave {i}", relief=tk.RIDGE, borderwidth=2)
         slave_frame.grid(row=(i - 1) // 4, column=(i - 1) % 4, padx=5, pady=5, sticky='nsew')
 
-        voltage_labels[f"Slave {i}"] = []
-
-        for cell in range(12):  # Assuming each slave has 12 cells
+        for cell in range(layout.cells_per_slave):
             ttk.Label(slave_frame, text=f"Cell {cell + 1}:").grid(row=cell, column=0, sticky='w')
 
             # Initialize the label for the cell voltage with default value
             volt_value_label = ttk.Label(slave_frame, text="0.00 V")
             volt_value_label.grid(row=cell, column=1, sticky='ew')
 
-            voltage_labels[f"Slave {i}"].append(volt_value_label)
+            voltage_labels.append(volt_value_label)
+
+    # Text and colour currently shown by every label, only labels whose values changed are reconfigured
+    shown = [("0.00 V", None)] * len(voltage_labels)
+    rendered_seq = [None]  # Sequence number of the frame on screen
 
     # Function to update voltage labels
     def update_voltages():
-        new_voltages = update_callback() if update_callback else initial_voltages
-        flat_voltages = [v for slave_voltages in new_voltages.values() for v in slave_voltages]
-        if flat_voltages:  # Check if flat_voltages is not empty
-            min_voltage = min(flat_voltages)
-            max_voltage = max(flat_voltages)
-
-            for slave_key, labels in voltage_labels.items():
-                slave_voltages = new_voltages.get(slave_key, [0.0] * 12)
-                for cell, label in enumerate(labels):
-                    cell_voltage = slave_voltages[cell]
-                    label.config(text=f"{cell_voltage:.2f} V")
-
-                    # Update label color based on voltage
-                    if cell_voltage == min_voltage:
-                        label.config(foreground='light green')
-                    elif cell_voltage == max_voltage:
-                        label.config(foreground='red')
+        frame = update_callback() if update_callback else initial_frame
+        if frame.seq == rendered_seq[0]:
+            return  # No new frame since the last pass
+        stats = frame_stats(frame).voltages
+        if stats.count and frame.layout == layout:
+            rendered_seq[0] = frame.seq
+            # The highest / lowest cell are the ones picked by the shared statistics
+            argmin, argmax = stats.argmin, stats.argmax
+            for index, cell_voltage in enumerate(frame.voltages):
+                if cell_voltage != cell_voltage:
+                    cell_voltage = 0.0  # No reading for this cell
+                text = f"{cell_voltage:.2f} V"
+
+                # Label color based on voltage
+                if index == argmin:
+                    color = 'light green'
+                elif index == argmax:
+                    color = 'red'
+                else:
+                    color = 'black'
+
+                old_text, old_color = shown[index]
+                if text != old_text or color != old_color:
+                    shown[index] = (text, color)
+                    if color == old_color:
+                        voltage_labels[index].config(text=text)
+                    elif text == old_text:
+                        voltage_labels[index].config(foreground=color)
                     else:
-                        label.config(foreground='black')
+                        voltage_labels[index].config(text=text, foreground=color)
 
     # Initial call to update voltages
     update_voltages()
-    if on_close_callback:
-        details_window.protocol("WM_DELETE_WINDOW", on_close_callback)
-    # Schedule periodic updates
-
-    def schedule_update():
-        update_voltages()
-        details_window.after(1000, schedule_update)  # Update every 1 second
 
-    schedule_update()
+    # Periodic updates run on the shared render tick
+    update_token = scheduler.register(update_voltages, period=1.0) if scheduler else None
 
     def on_close():
+        if update_token is not None:
+            scheduler.unregister(update_token)
         if on_close_callback:
             on_close_callback()  # Call the passed callback, e.g., to reset the flag
         details_window.destroy()  # Close the window
@@ -1,57 +1,74 @@
 import tkinter as tk
 from tkinter import ttk
+from frame_stats import frame_stats
 
 
-def open_temperature_details_window(master, initial_temperatures, update_callback=None, on_close_callback=None):
+def open_temperature_details_window(master, initial_frame, update_callback=None, on_close_callback=None,
+                                    scheduler=None):
     details_window = tk.Toplevel(master)
     details_window.title("Temperature Detailed View")
 #   details_window.iconbitmap("formula.ico")
 
-    temperature_labels = {}
+    layout = initial_frame.layout
 
-    for i in range(1, 13):
+    # Labels in the same order as the frame's temperature array
+    temperature_labels = []
+
+    for i in range(1, layout.slaves + 1):
         slave_frame = ttk.LabelFrame(details_window, text=f"Slave {i}", relief=tk.RIDGE, borderwidth=2)
         slave_frame.grid(row=(i - 1) // 3, column=(i - 1) % 3, padx=5, pady=5, sticky='nsew')
 
-        temperature_labels[f"Slave {i}"] = []
-
-        for temp_index in range(5):  # Assuming each slave has 5 temperature values
+        for temp_index in range(layout.thermistors_per_slave):
             ttk.Label(slave_frame, text=f"Temp {temp_index + 1}:").grid(row=temp_index, column=0, sticky='w')
 
             temp_value_label = ttk.Label(slave_frame, text="0.0 °C")
             temp_value_label.grid(row=temp_index, column=1, sticky='ew')
-            temperature_labels[f"Slave {i}"].append(temp_value_label)
+            temperature_labels.append(temp_value_label)
+
+    # Text and colour currently shown by every label, only labels whose values changed are reconfigured
+    shown = [("0.0 °C", None)] * len(temperature_labels)
+    rendered_seq = [None]  # Sequence number of the frame on screen
 
     def update_temperatures():
-        new_temperatures = update_callback() if update_callback else initial_temperatures
-        flat_temperatures = [t for slave_temps in new_temperatures.values() for t in slave_temps if t is not None]
-        if flat_temperatures:  # Check if flat_temperatures is not empty
-            min_temp = min(flat_temperatures)
-            max_temp = max(flat_temperatures)
-
-            for slave_key, labels in temperature_labels.items():
-                slave_temps = new_temperatures.get(slave_key, [None] * 5)
-                for temp_index, label in enumerate(labels):
-                    temp_value = slave_temps[temp_index]
-                    temp_value_display = f"{temp_value:.2f} °C" if temp_value is not None else "NaN"
-                    label.config(text=temp_value_display)
-
-                    # Update label color based on temperature
-                    if temp_value is not None:
-                        if temp_value == min_temp:
-                            label.config(foreground='light green')
-                        elif temp_value == max_temp:
-                            label.config(foreground='red')
-                        else:
-                            label.config(foreground='black')
-
-    def schedule_update():
-        update_temperatures()
-        details_window.after(1000, schedule_update)  # Update every 1 second
-
-    schedule_update()
+        frame = update_callback() if update_callback else initial_frame
+        if frame.seq == rendered_seq[0]:
+            return  # No new frame since the last pass
+        stats = frame_stats(frame).temperatures
+        if stats.count and frame.layout == layout:
+            rendered_seq[0] = frame.seq
+            argmin, argmax = stats.argmin, stats.argmax
+            for index, (temp_value, valid) in enumerate(zip(frame.temperatures, frame.temperature_valid)):
+                old_text, old_color = shown[index]
+                if valid:
+                    text = f"{temp_value:.2f} °C"
+                    # Label color based on temperature
+                    if index == argmin:
+                        color = 'light green'
+                    elif index == argmax:
+                        color = 'red'
+                    else:
+                        color = 'black'
+                else:
+                    text = "NaN"
+                    color = old_color  # A missing reading keeps its colour
+
+                if text != old_text or color != old_color:
+                    shown[index] = (text, color)
+                    if color == old_color:
+                        temperature_labels[index].config(text=text)
+                    elif text == old_text:
+                        temperature_labels[index].config(foreground=color)
+                    else:
+                        temperature_labels[index].config(text=text, foreground=color)
+
+    update_temperatures()
+
+    # Periodic updates run on the shared render tick
+    update_token = scheduler.register(update_temperatures, period=1.0) if scheduler else None
 
     def on_close():
+        if update_token is not None:
+            scheduler.unregister(update_token)
         if on_close_callback:
             on_close_callback()  # Reset the flag in the BatteryTab class
         details_window.destroy()  # Close the window
@@ -0,0 +1,100 @@
+import time
+from tkinter import ttk
+from frame_stats import frame_stats
+
+# Column key, heading, width
+COLUMNS = (
+    ('tab', "Tab", 90), ('port', "Port", 150), ('state', "State", 130), ('frames', "Frames", 70),
+    ('rate', "Frames/s", 70), ('throughput', "KiB/s", 70), ('dropped', "GUI drops", 70), ('soc', "SOC", 50),
+    ('voltage', "Pack V", 70), ('current', "Current", 70), ('min_cell', "Min cell", 120),
+    ('max_cell', "Max cell", 120), ('max_temp', "Max temp", 120), ('age', "Last frame", 80),
+)
+
+
+class OverviewTab:
+    # One row per battery tab with its connection, throughput and the key values of
+    # its newest frame, refreshed once per second on the shared render tick. A row is
+    # only rewritten when one of its values changed.
+
+    def __init__(self, master, scheduler, add_tab_callback=None):
+        self.master = master
+        self.rows = []  # [name, BatteryTab, tree item, frames, bytes and time of the last refresh, shown values]
+        self.visible = False
+        self.frame = ttk.Frame(master)
+        self.frame.pack(fill="both", expand=True)
+
+        self.tree = ttk.Treeview(self.frame, columns=[key for key, _, _ in COLUMNS], show='headings')
+        for key, heading, width in COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor='center')
+        self.tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        bottom_frame = ttk.Frame(self.frame)
+        bottom_frame.pack(fill="x", padx=5, pady=5)
+        if add_tab_callback:
+            ttk.Button(bottom_frame, text="Add Battery Tab", command=add_tab_callback).pack(side="left")
+        self.total_label = ttk.Label(bottom_frame, text="")
+        self.total_label.pack(side="right")
+
+        scheduler.register(self.update_rows, period=1.0)
+
+    def add(self, name, battery_tab):
+        item = self.tree.insert('', 'end', values=[name] + ["-"] * (len(COLUMNS) - 1))
+        self.rows.append([name, battery_tab, item, 0, 0, time.monotonic(), None])
+
+    def set_visible(self, visible):
+        self.visible = visible
+        if visible:
+            self.update_rows()
+
+    def update_rows(self):
+        # The counters are read every second even when hidden, so the rates stay correct
+        now = time.monotonic()
+        total_rate = total_throughput = 0.0
+        connected = 0
+        for row in self.rows:
+            name, tab, item, last_frames, last_bytes, last_time, shown = row
+            interface = tab.serial_interface
+            frames, received = interface.frames_received, interface.bytes_received
+            elapsed = max(now - last_time, 1e-6)
+            rate = (frames - last_frames) / elapsed
+            throughput = (received - last_bytes) / elapsed / 1024
+            row[3:6] = frames, received, now
+            total_rate += rate
+            total_throughput += throughput
+            connected += interface.running
+
+            if not self.visible:
+                continue
+            values = [name, interface.port if interface.running else "-", interface.state, frames,
+                      f"{rate:.1f}", f"{throughput:.1f}", tab.frame_handoff.dropped] + self.frame_values(tab)
+            if values != shown:
+                row[6] = values
+                self.tree.item(item, values=values)
+
+        if self.visible:
+            self.total_label.config(text=f"{connected} of {len(self.rows)} ports open, "
+                                         f"{total_rate:.1f} frames/s, {total_throughput:.1f} KiB/s")
+
+    def frame_values(self, tab):
+        frame = tab.latest_parsed_data
+        if frame.timestamp is None:
+            return ["-"] * 7
+        stats = frame_stats(frame)
+        voltages, temperatures = stats.voltages, stats.temperatures
+
+        def located(series, value, index, unit, digits):
+            if not series.count:
+                return "-"
+            slave, position = series.location(index)
+            return f"{value:.{digits}f} {unit} (S{slave} #{position})"
+
+        return [
+            "-" if frame.soc is None else f"{frame.soc}%",
+            "-" if frame.battery_voltage is None else f"{frame.battery_voltage:.1f}",
+            "-" if frame.battery_current is None else f"{frame.battery_current:.1f}",
+            located(voltages, voltages.minimum, voltages.argmin, "V", 3),
+            located(voltages, voltages.maximum, voltages.argmax, "V", 3),
+            located(temperatures, temperatures.maximum, temperatures.argmax, "°C", 1),
+            f"{time.time() - frame.timestamp:.0f} s ago",
+        ]
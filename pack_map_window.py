@@ -0,0 +1,223 @@
+import tkinter as tk
+from frame_stats import frame_stats
+
+# Colour scale from the lowest (blue) over green to the highest (red) value of a frame
+SCALE_ANCHORS = ((0x30, 0x60, 0xff), (0x30, 0xc0, 0x50), (0xff, 0x30, 0x30))
+SCALE_STEPS = 16
+NO_READING = '#c0c0c0'
+
+
+def build_palette(steps=SCALE_STEPS):
+    palette = []
+    for step in range(steps):
+        position = step / (steps - 1) * (len(SCALE_ANCHORS) - 1)
+        low = min(int(position), len(SCALE_ANCHORS) - 2)
+        fraction = position - low
+        color = [round(a + (b - a) * fraction) for a, b in zip(SCALE_ANCHORS[low], SCALE_ANCHORS[low + 1])]
+        palette.append('#%02x%02x%02x' % tuple(color))
+    return palette
+
+
+PALETTE = build_palette()
+
+
+def open_pack_map_window(master, initial_frame, update_callback=None, on_close_callback=None,
+                         scheduler=None):
+    # All cells and thermistors of the pack drawn on one canvas, one row per slave:
+    # cell voltages on the left, thermistors on the right. Items are created once,
+    # updates only itemconfig the ones whose colour or text changed.
+    map_window = tk.Toplevel(master)
+    map_window.title("Pack Map")
+    # map_window.iconbitmap("formula.ico")
+
+    layout = initial_frame.layout
+    cells = layout.cells_per_slave
+    thermistors = layout.thermistors_per_slave
+
+    # Shrink the boxes to fit larger packs on the screen, below 36 px the values are only in the tooltip
+    box_width = max(16, min(48, (map_window.winfo_screenwidth() - 160) // (cells + thermistors)))
+    box_height = max(10, min(20, (map_window.winfo_screenheight() - 160) // layout.slaves))
+    show_values = box_width >= 36 and box_height >= 14
+    left = 60
+    top = 22
+    gap = 16
+    temperature_left = left + cells * box_width + gap
+    width = temperature_left + thermistors * box_width + 10
+    height = top + layout.slaves * box_height + 40
+
+    canvas = tk.Canvas(map_window, width=width, height=height, background='white', highlightthickness=0)
+    canvas.pack(fill='both', expand=True)
+    small_font = ("Arial", 7)
+
+    canvas.create_text(left + cells * box_width / 2, top - 12, text="Cell voltages", font=("Arial", 8))
+    canvas.create_text(temperature_left + thermistors * box_width / 2, top - 12, text="Thermistors", font=("Arial", 8))
+
+    def create_boxes(x0, per_slave):
+        rectangles = []
+        texts = []
+        for slave in range(layout.slaves):
+            y = top + slave * box_height
+            for index in range(per_slave):
+                x = x0 + index * box_width
+                rectangles.append(canvas.create_rectangle(x, y, x + box_width, y + box_height,
+                                                          fill=NO_READING, outline='#808080'))
+                if show_values:
+                    texts.append(canvas.create_text(x + box_width / 2, y + box_height / 2, text="",
+                                                    font=small_font))
+        return rectangles, texts
+
+    for slave in range(layout.slaves):
+        canvas.create_text(left - 6, top + (slave + 0.5) * box_height, text=f"Slave {slave + 1}",
+                           anchor='e', font=small_font)
+    voltage_boxes = create_boxes(left, cells)
+    temperature_boxes = create_boxes(temperature_left, thermistors)
+    legend = canvas.create_text(left, top + layout.slaves * box_height + 8, anchor='nw', font=small_font, text="")
+
+    tooltip_background = canvas.create_rectangle(0, 0, 0, 0, fill='#ffffe0', outline='black', state='hidden')
+    tooltip_text = canvas.create_text(0, 0, anchor='nw', font=("Arial", 8), state='hidden')
+
+    # What every box currently shows, so unchanged boxes are not touched
+    series = (
+        {'boxes': voltage_boxes, 'per_slave': cells, 'x0': left, 'name': "Cell", 'unit': "V",
+         'format': "%.3f", 'fills': [NO_READING] * len(voltage_boxes[0]), 'texts': [""] * len(voltage_boxes[0]),
+         'marked': ()},
+        {'boxes': temperature_boxes, 'per_slave': thermistors, 'x0': temperature_left, 'name': "Temp", 'unit': "°C",
+         'format': "%.1f", 'fills': [NO_READING] * len(temperature_boxes[0]),
+         'texts': [""] * len(temperature_boxes[0]), 'marked': ()},
+    )
+    state = {'seq': None, 'frame': initial_frame, 'hover': None}
+
+    def render(entry, values, valid, stats):
+        rectangles, texts = entry['boxes']
+        fills = entry['fills']
+        shown_texts = entry['texts']
+        low = stats.minimum
+        span = stats.maximum - low
+        scale = (SCALE_STEPS - 1) / span if span > 0 else 0.0
+        text_format = entry['format']
+        for index, value in enumerate(values):
+            if valid is not None and not valid[index] or value != value:
+                fill = NO_READING
+                text = "NaN"
+            else:
+                fill = PALETTE[int((value - low) * scale) if scale else SCALE_STEPS // 2]
+                text = text_format % value
+            if fill != fills[index]:
+                fills[index] = fill
+                canvas.itemconfig(rectangles[index], fill=fill)
+            if show_values and text != shown_texts[index]:
+                shown_texts[index] = text
+                canvas.itemconfig(texts[index], text=text)
+
+        # Outline the lowest and highest box
+        marked = (stats.argmin, stats.argmax) if stats.count else ()
+        if marked != entry['marked']:
+            for index in entry['marked']:
+                canvas.itemconfig(rectangles[index], outline='#808080', width=1)
+            for index in marked:
+                canvas.itemconfig(rectangles[index], outline='black', width=2)
+                canvas.tag_raise(rectangles[index])
+                if show_values:
+                    canvas.tag_raise(texts[index])
+            entry['marked'] = marked
+
+    def describe(stats, unit, value_format, name):
+        if not stats.count:
+            return f"{name}: no readings"
+        low_slave, low_index = stats.location(stats.argmin)
+        high_slave, high_index = stats.location(stats.argmax)
+        return (f"{name}: min {value_format % stats.minimum} {unit} (S{low_slave} #{low_index}), "
+                f"max {value_format % stats.maximum} {unit} (S{high_slave} #{high_index}), "
+                f"mean {value_format % stats.mean} {unit}")
+
+    def update_map():
+        frame = update_callback() if update_callback else initial_frame
+        if frame.seq == state['seq'] or frame.layout != layout:
+            return  # No new frame since the last pass
+        state['seq'] = frame.seq
+        state['frame'] = frame
+        stats = frame_stats(frame)
+        render(series[0], frame.voltages, None, stats.voltages)
+        render(series[1], frame.temperatures, frame.temperature_valid, stats.temperatures)
+        canvas.itemconfig(legend, text=describe(stats.voltages, "V", "%.4f", "Cells") + "\n"
+                          + describe(stats.temperatures, "°C", "%.2f", "Thermistors")
+                          + "\nColour: lowest (blue) to highest (red) value of the frame")
+        if state['hover'] is not None:
+            show_tooltip(*state['hover'])
+
+    def box_at(x, y):
+        # (series entry, flat index) under the pointer, computed from the grid instead of asking Tk
+        slave = int((y - top) // box_height)
+        if y < top or slave >= layout.slaves:
+            return None
+        for entry in series:
+            column = int((x - entry['x0']) // box_width)
+            if x >= entry['x0'] and column < entry['per_slave']:
+                return entry, slave * entry['per_slave'] + column
+        return None
+
+    def show_tooltip(x, y):
+        hit = box_at(x, y)
+        if hit is None:
+            hide_tooltip()
+            return
+        entry, index = hit
+        frame = state['frame']
+        stats = frame_stats(frame)
+        if entry is series[0]:
+            value, series_stats = frame.voltages[index], stats.voltages
+            valid = value == value
+        else:
+            value, series_stats = frame.temperatures[index], stats.temperatures
+            valid = bool(frame.temperature_valid[index])
+        slave, position = series_stats.location(index)
+        text = f"Slave {slave} {entry['name']} {position}: "
+        if valid:
+            text += f"{entry['format'] % value} {entry['unit']}"
+            if series_stats.count:
+                difference = value - series_stats.mean
+                text += (f"\n{difference * 1000:+.1f} mV from the mean" if entry is series[0]
+                         else f"\n{difference:+.2f} °C from the mean")
+        else:
+            text += "no reading"
+        canvas.itemconfig(tooltip_text, text=text, state='normal')
+        # Keep the tooltip inside the canvas
+        x1, y1, x2, y2 = canvas.bbox(tooltip_text)
+        tip_x = min(x + 12, canvas.winfo_width() - (x2 - x1) - 6)
+        tip_y = y + 16 if y + 16 + (y2 - y1) < canvas.winfo_height() else y - (y2 - y1) - 8
+        canvas.coords(tooltip_text, tip_x, tip_y)
+        canvas.coords(tooltip_background, tip_x - 3, tip_y - 2, tip_x + (x2 - x1) + 3, tip_y + (y2 - y1) + 2)
+        canvas.itemconfig(tooltip_background, state='normal')
+        canvas.tag_raise(tooltip_background)
+        canvas.tag_raise(tooltip_text)
+
+    def hide_tooltip():
+        canvas.itemconfig(tooltip_background, state='hidden')
+        canvas.itemconfig(tooltip_text, state='hidden')
+
+    def on_motion(event):
+        state['hover'] = (event.x, event.y)
+        show_tooltip(event.x, event.y)
+
+    def on_leave(event):
+        state['hover'] = None
+        hide_tooltip()
+
+    canvas.bind("<Motion>", on_motion)
+    canvas.bind("<Leave>", on_leave)
+
+    update_map()
+
+    # The map is cheap to refresh, it follows every render tick
+    update_token = scheduler.register(update_map) if scheduler else None
+
+    def on_close():
+        if update_token is not None:
+            scheduler.unregister(update_token)
+        if on_close_callback:
+            on_close_callback()
+        map_window.destroy()
+
+    map_window.protocol("WM_DELETE_WINDOW", on_close)
+
+    return map_window
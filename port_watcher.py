@@ -0,0 +1,70 @@
+import threading
+
+# PJRC's Teensy boards use the shared VOTI vendor ID 0x16C0 (also used by V-USB gadgets
+# and USBasp programmers), so a Teensy is told apart by its product ID as well. These are
+# the Teensyduino USB types that include a serial port: Serial, Serial + Keyboard + Mouse
+# + Joystick, MIDI + Serial, MIDI + Audio + Serial, Dual / Triple Serial, MTP Disk +
+# Serial and All of the Above
+TEENSY_VID = 0x16C0
+TEENSY_SERIAL_PIDS = frozenset((0x0483, 0x0487, 0x0489, 0x048A, 0x048B, 0x048C, 0x04D5, 0x0476))
+
+
+def is_teensy(port):
+    return port.vid == TEENSY_VID and port.pid in TEENSY_SERIAL_PIDS
+
+
+class PortWatcher:
+    # Enumerates serial ports on a background thread every `interval` seconds and
+    # publishes the list whenever it changes (USB adapter plugged in or removed).
+    # Every port is listed, built-in UARTs and Bluetooth RFCOMM ports included; only
+    # the Teensy auto-select (is_teensy) is limited to USB devices.
+    # The Tk side reads it with latest() from the render tick, the worker never
+    # touches a widget. One watcher can serve several tabs, each remembers the
+    # version it has shown.
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.scan_requested = threading.Event()
+        self.running = False
+        self.thread = None
+        self.ports = None  # Newest list of ListPortInfo
+        self.version = 0  # Incremented with every new list
+        self.claimed = set()  # Devices opened by a tab, not offered to the Teensy auto-select of the others
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.watch, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.scan_requested.set()
+
+    def request_scan(self):
+        # Scan now instead of at the next interval (Refresh button)
+        self.scan_requested.set()
+
+    def watch(self):
+        # Imported here so neither the import nor the first scan delays the GUI startup
+        import serial.tools.list_ports
+        previous = None
+        while self.running:
+            try:
+                ports = sorted(serial.tools.list_ports.comports(), key=lambda port: port.device)
+                key = [(port.device, port.vid, port.pid, port.serial_number) for port in ports]
+                if key != previous:
+                    previous = key
+                    with self.lock:
+                        self.ports = ports
+                        self.version += 1
+            except Exception as e:
+                print(f"Error listing serial ports: {e}")
+            self.scan_requested.wait(self.interval)
+            self.scan_requested.clear()
+
+    def latest(self):
+        # (version, ports) of the newest list, ports is None before the first scan finished
+        with self.lock:
+            return self.version, self.ports
@@ -0,0 +1,59 @@
+class RenderScheduler:
+    # Owns the only periodic after() loop of the GUI. Panels and windows register
+    # a callback instead of rescheduling themselves, so the number of timers stays
+    # at one no matter how many frames arrive or windows are opened and closed.
+
+    def __init__(self, master, refresh_rate=4.0):
+        self.master = master
+        self.callbacks = {}  # token -> [callback, ticks between calls, ticks left, period]
+        self.next_token = 1
+        self.after_id = None
+        self.interval_ms = 250
+        self.refresh_rate = refresh_rate
+        self.set_refresh_rate(refresh_rate)
+
+    def set_refresh_rate(self, refresh_rate):
+        # Target number of ticks per second
+        self.refresh_rate = max(0.1, float(refresh_rate))
+        self.interval_ms = max(1, int(round(1000 / self.refresh_rate)))
+        for entry in self.callbacks.values():
+            entry[1] = self.ticks_for(entry[3])
+
+    def ticks_for(self, period):
+        return max(1, int(round(period * self.refresh_rate))) if period else 1
+
+    def register(self, callback, period=None):
+        # Call callback on every tick, or about every `period` seconds. Returns a token for unregister()
+        token = self.next_token
+        self.next_token += 1
+        self.callbacks[token] = [callback, self.ticks_for(period), 1, period]
+        if self.after_id is None:
+            self.after_id = self.master.after(self.interval_ms, self.tick)
+        return token
+
+    def unregister(self, token):
+        self.callbacks.pop(token, None)
+        if not self.callbacks and self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+
+    def tick(self):
+        for token, entry in list(self.callbacks.items()):
+            if token not in self.callbacks:
+                continue  # Unregistered by an earlier callback of this tick
+            entry[2] -= 1
+            if entry[2] > 0:
+                continue
+            entry[2] = entry[1]
+            try:
+                entry[0]()
+            except Exception as e:
+                # A failing panel must not stop the others from being refreshed
+                print(f"Error in render callback: {e}")
+        self.after_id = self.master.after(self.interval_ms, self.tick) if self.callbacks else None
+
+    def stop(self):
+        self.callbacks.clear()
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
@@ -0,0 +1,232 @@
+import argparse
+import os
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+from bms_parser import format_frame
+
+# Separator written in front of every frame by SerialInterface, optionally wrapped
+# in quotes by Extract Log which stores one console line per CSV row
+SEPARATOR = re.compile(r'^"?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?) -{5,}"?$')
+
+
+def load_frames(path):
+    # Returns [(unix time, frame text)] oldest first from a raw .log, an extracted
+    # console log or a binary .bms session
+    if path.endswith('.bms'):
+        from session_format import SessionReader
+        with SessionReader(path) as reader:
+            return [(frame.timestamp, format_frame(frame)) for frame in reader]
+
+    frames = []
+    timestamp = None
+    lines = []
+    with open(path, encoding='utf-8', errors='replace') as log_file:
+        for line in log_file:
+            line = line.rstrip('\r\n')
+            if len(line) > 1 and line[0] == '"' and line[-1] == '"':
+                line = line[1:-1]
+            match = SEPARATOR.match(line)
+            if match:
+                if lines:
+                    frames.append((timestamp, "\n".join(lines)))
+                timestamp = datetime.fromisoformat(match.group(1)).timestamp()
+                lines = []
+            elif timestamp is not None and line:
+                lines.append(line)
+    if lines:
+        frames.append((timestamp, "\n".join(lines)))
+
+    # The console (and so Extract Log) shows the newest frame first
+    if len(frames) > 1 and frames[0][0] > frames[-1][0]:
+        frames.reverse()
+    return spread_timestamps(frames)
+
+
+def spread_timestamps(frames):
+    # Older logs only have whole seconds; frames sharing a second are spread evenly over it
+    result = []
+    start = 0
+    while start < len(frames):
+        end = start
+        while end < len(frames) and frames[end][0] == frames[start][0]:
+            end += 1
+        count = end - start
+        for i in range(start, end):
+            timestamp, text = frames[i]
+            whole_second = timestamp == int(timestamp)
+            result.append((timestamp + (i - start) / count if whole_second else timestamp, text))
+        start = end
+    return result
+
+
+class ReplayFeeder:
+    # Writes recorded frames to a byte sink (pty or socket) with
+    # their original spacing divided by `speed`. speed=None sends as fast as the
+    # sink accepts the data.
+
+    def __init__(self, frames, write, speed=1.0, repeat=False):
+        self.frames = frames
+        self.write = write
+        self.speed = speed
+        self.repeat = repeat
+        self.sent_at = []  # perf_counter() just before each frame was written
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self):
+        payloads = [(timestamp, (text + "\n").encode('utf-8')) for timestamp, text in self.frames]
+        if not payloads:
+            self.running = False
+            return
+        while self.running:
+            start = time.perf_counter()
+            first_timestamp = payloads[0][0]
+            for timestamp, payload in payloads:
+                if not self.running:
+                    break
+                if self.speed:
+                    delay = start + (timestamp - first_timestamp) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.sent_at.append(time.perf_counter())
+                try:
+                    self.write(payload)
+                except OSError as e:
+                    print(f"Replay stopped: {e}")
+                    self.running = False
+                    break
+                self.frames_sent += 1
+                self.bytes_sent += len(payload)
+            if not self.repeat:
+                break
+        self.running = False
+
+
+def open_pty():
+    # A pseudo terminal the GUI can open like a serial port (POSIX only)
+    import tty
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+def write_all(fd):
+    def write(data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    return write
+
+
+def wait_for_tcp_client(port):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(1)
+    print(f"Waiting for a connection on socket://127.0.0.1:{port}")
+    connection, address = server.accept()
+    server.close()
+    print(f"Replaying to {address[0]}:{address[1]}")
+    return connection
+
+
+def measure(frames, speed):
+    # Runs the frames through SerialInterface's reader thread over a pseudo terminal and
+    # reports throughput and the write -> parsed frame latency. Not over pyserial's
+    # loop://, which queues every byte on its own (a lock and a queue.get per byte): that
+    # topped out at 140 - 180 frames/s with about 20 ms latency, the cost of loop://
+    from serial_interface import SerialInterface
+    latencies = []
+    feeder = None
+
+    def on_frame(frame):
+        index = frame.seq - 1
+        if index < len(feeder.sent_at):
+            latencies.append(time.perf_counter() - feeder.sent_at[index])
+
+    master_fd, slave_fd, device = open_pty()
+    interface = SerialInterface(device, 115200, None, None, frame_callback=on_frame)
+    interface.open_serial_port(device)
+    if interface.serial_connection is None:
+        return
+    feeder = ReplayFeeder(frames, write_all(master_fd), speed)
+    start = time.perf_counter()
+    feeder.start()
+    feeder.join()
+    # Wait until the reader has caught up with everything that was sent
+    deadline = time.perf_counter() + 5
+    while interface.frames_received < feeder.frames_sent and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    interface.close_serial_port()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+    print(f"Frames sent: {feeder.frames_sent}, parsed: {interface.frames_received}, "
+          f"parse errors: {interface.parser.error_count}")
+    print(f"Throughput: {interface.frames_received / elapsed:.1f} frames/s, "
+          f"{interface.bytes_received / elapsed / 1024:.1f} KiB/s")
+    if latencies:
+        latencies.sort()
+        print(f"Latency ms: mean {1000 * sum(latencies) / len(latencies):.2f}, "
+              f"p50 {1000 * latencies[len(latencies) // 2]:.2f}, "
+              f"p99 {1000 * latencies[int(len(latencies) * 0.99)]:.2f}, max {1000 * latencies[-1]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded BMS log through the serial acquisition path")
+    parser.add_argument("log", help="raw .log, extracted console log or .bms session file")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor, 1 = real time")
+    parser.add_argument("--fast", action="store_true", help="send as fast as possible")
+    parser.add_argument("--repeat", action="store_true", help="start over at the end of the log")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--pty", action="store_true", help="replay into a pseudo terminal (default)")
+    target.add_argument("--tcp", type=int, metavar="PORT", help="serve the stream on socket://127.0.0.1:PORT")
+    target.add_argument("--measure", action="store_true",
+                        help="run SerialInterface in-process over a pseudo terminal and report throughput and latency")
+    args = parser.parse_args()
+
+    frames = load_frames(args.log)
+    print(f"Loaded {len(frames)} frames from {args.log}")
+    speed = None if args.fast else args.speed
+
+    if args.measure:
+        measure(frames, speed)
+        return
+
+    if args.tcp:
+        connection = wait_for_tcp_client(args.tcp)
+        feeder = ReplayFeeder(frames, connection.sendall, speed, args.repeat)
+    else:
+        master_fd, slave_fd, device = open_pty()
+        print(f"Open {device} in the GUI to receive the replay")
+        feeder = ReplayFeeder(frames, write_all(master_fd), speed, args.repeat)
+
+    feeder.start()
+    try:
+        while feeder.running:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        feeder.stop()
+    print(f"Sent {feeder.frames_sent} frames")
+
+
+if __name__ == "__main__":
+    main()
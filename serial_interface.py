@@ -2,252 +2,313 @@ import threading
 import serial
 import time
 import datetime
+from bms_frame import DEFAULT_LAYOUT, PackLayout
+from bms_parser import BmsParser, format_frame
+from frame_splitter import FrameSplitter, FRAME_START, FRAME_END
+from frame_stats import StatsEngine
+from session_format import RecordLayout, HEADER, HEADER_SIZE, MAGIC
+from telemetry_server import STREAM_SCHEME
+
+# Connection states, see SerialInterface.supervise
+DISCONNECTED = "disconnected"  # Never opened or closed by the user
+CONNECTED = "connected"
+DETECTING_BAUD = "detecting baud rate"
+RECONNECTING = "reconnecting"  # The port was lost, reopening it with exponential backoff
+
+# Rates tried by the baud rate detection, after the last one that worked
+BAUD_RATES = (115200, 230400, 57600, 38400, 19200, 9600)
 
 
 class SerialInterface:
-    def __init__(self, port, baudrate, update_callback, clear_messages_callback, display_message_callback=None):
+    def __init__(self, port, baudrate, update_callback, clear_messages_callback, display_message_callback=None,
+                 frame_callback=None, display_interval=1.0, layout=DEFAULT_LAYOUT):
         self.port = port
         self.baudrate = baudrate
         self.update_callback = update_callback
         self.clear_messages_callback = clear_messages_callback
         self.display_message_callback = display_message_callback
+        self.frame_callback = frame_callback  # Called with the BmsFrame of every received frame
+        self.display_interval = display_interval  # Minimum seconds between display callbacks
+        self.last_display_time = float('-inf')
+        self.pending_display = None  # Newest frame not yet shown because of the display throttle
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.read_chunk_size = 16384  # Upper bound for a single read() call
+        self.frame_splitter = FrameSplitter()
         self.serial_connection = None  # Initialize the serial connection
-        self.read_thread = None
+        self.read_thread = None  # The one thread that reads, reconnects and detects the baud rate
         self.running = False  # Flag to control the thread
-        self.reading_voltages = False  # Instance attribute for parsing flag
-        self.reading_temperatures = False
-        SerialInterface.change_baudrate = self.change_baudrate
+        self.stop_event = threading.Event()  # Wakes the thread up from a reconnect backoff
+        self.state = DISCONNECTED
+        self.auto_baud = False  # Probe BAUD_RATES for frames on every (re)connect, see change_baudrate(None)
+        self.detect_requested = False
+        self.probe_time = 2.5  # Seconds to wait for a frame marker at each rate (the BMS sends about 1 frame/s)
+        self.reconnect_delay = 0.5  # First retry after a lost connection, doubled up to max_reconnect_delay
+        self.max_reconnect_delay = 10.0
+        self.reconnects = 0
+        self.parser = BmsParser(layout)  # Slaves / cells / thermistors expected in every frame
+        self.stats_engine = StatsEngine()  # Min/max/mean/deltas of every frame, shared by all views
+
+    def connect(self, port):
+        # serial_for_url also accepts pyserial URLs such as socket://host:port or loop://.
+        # bms://host:port attaches to the frames published by a TelemetryServer instead of a serial port
+        if port.startswith(STREAM_SCHEME):
+            return serial.serial_for_url("socket://" + port[len(STREAM_SCHEME):], timeout=1)
+        return serial.serial_for_url(port, baudrate=self.baudrate, timeout=1)
 
     def open_serial_port(self, port):
         if port:
+            if self.read_thread is not None and port == self.port:
+                self.close_serial_port()  # The same device cannot be open twice
             try:
-                self.serial_connection = serial.Serial(port=port, baudrate=self.baudrate, timeout=1)
-                print(f"Opened serial port: {port}")
-                self.running = True  # Set the running flag to True
-                self.read_thread = threading.Thread(target=self.read_from_port, daemon=True)
-                self.read_thread.start()
-            except serial.SerialException as e:
+                # The first open happens right here so a wrong port is reported at once. A new
+                # port is opened before the running one is closed, so a typo keeps the old connection
+                connection = self.connect(port)
+            except (serial.SerialException, ValueError) as e:
+                # ValueError: serial_for_url does not know the URL scheme
                 print(f"Error opening serial port: {e}")
+                return
+            if self.read_thread is not None:
+                self.close_serial_port()  # Never leave a second reader running on the old port
+            self.port = port
+            self.serial_connection = connection
+            print(f"Opened serial port: {port}")
+            self.running = True  # Set the running flag to True
+            self.stop_event.clear()
+            self.detect_requested = self.auto_baud
+            self.read_thread = threading.Thread(target=self.supervise, daemon=True)
+            self.read_thread.start()
+
+    def supervise(self):
+        # Owns the connection until close_serial_port: reads, detects the baud rate when
+        # asked to, and reopens the port with exponential backoff when it is lost (USB glitch,
+        # cable pulled). Only this thread replaces self.serial_connection while running.
+        delay = self.reconnect_delay
+        while self.running:
+            if self.serial_connection is None:
+                self.state = RECONNECTING
+                try:
+                    self.serial_connection = self.connect(self.port)
+                except (serial.SerialException, OSError):
+                    if self.stop_event.wait(delay):
+                        break
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                self.reconnects += 1
+                self.detect_requested = self.auto_baud
+                print(f"Reconnected to {self.port}")
+            delay = self.reconnect_delay
 
-    def read_from_port(self):
-        print("inside read_from_port")
-        message_buffer = []  # Buffer to hold lines of a block
-        last_time_displayed = time.time() - 1  # Initialize to enable immediate first display
-        complete_message_received = False
-
-        while self.serial_connection and self.serial_connection.is_open:
             try:
-                if time.time() - last_time_displayed >= 1 and not complete_message_received:
-                    line = self.serial_connection.readline()
-                    if line:
-                        decoded_line = line.decode('utf-8').rstrip('\r\n')
-
-                        # Check if we're at the start of a new message block
-                        if 'Printing voltages:' in decoded_line:
-                            # Detected the start of a new message, reset buffer and prepend with timestamped separator
-                            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            separator = f"{timestamp} -----------------------------"
-                            message_buffer = [separator, decoded_line]
-                            complete_message_received = False  # Reset flag as we're starting a new message
-                        elif 'Bad_Thermistor:' in decoded_line:
-                            # Detected the end of a complete message
-                            message_buffer.append(decoded_line)
-                            complete_message_received = True
-                        elif message_buffer:
-                            # If we're in the middle of reading a message, continue appending lines
-                            message_buffer.append(decoded_line)
-
-                    if complete_message_received:
-                        self.display_complete_message(message_buffer)
-                        last_time_displayed = time.time()
-                        message_buffer = []  # Clear the buffer for the next message
-                        complete_message_received = False
-                        time.sleep(1)  # Throttle the output to once per second
+                # Nothing received before the gap belongs to the next frame
+                self.frame_splitter.reset()
+                self.stats_engine.reset()
+                if self.port.startswith(STREAM_SCHEME):
+                    self.detect_requested = False  # Nothing to detect on a telemetry stream
+                    self.state = CONNECTED
+                    self.read_records()
+                    continue
+                if self.detect_requested:
+                    self.detect_baudrate()
+                self.state = CONNECTED
+                self.read_from_port()
+            except Exception as e:
+                if self.running:
+                    print(f"Serial connection lost: {e}, reconnecting")
+                self.drop_connection()
 
-                else:
-                    # If not enough time has passed, just sleep for a short duration to prevent busy waiting
-                    time.sleep(0.1)  # Sleep to reduce CPU usage, adjust as needed
+        self.drop_connection()
+        self.state = DISCONNECTED
 
+    def drop_connection(self):
+        connection = self.serial_connection
+        self.serial_connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass  # The device is already gone
+
+    def detect_baudrate(self):
+        # Listens at each rate for the start or end marker of a frame, the last rate that
+        # worked first. The probed bytes are kept, so the frame in flight is not lost.
+        self.state = DETECTING_BAUD
+        self.detect_requested = False
+        connection = self.serial_connection
+        for baudrate in (self.baudrate,) + tuple(rate for rate in BAUD_RATES if rate != self.baudrate):
+            connection.baudrate = baudrate
+            connection.reset_input_buffer()
+            data = bytearray()
+            deadline = time.monotonic() + self.probe_time
+            while self.running and time.monotonic() < deadline:
+                data += connection.read(max(1, min(connection.in_waiting, self.read_chunk_size)))
+                if FRAME_START in data or FRAME_END in data:
+                    self.baudrate = baudrate
+                    print(f"Detected baud rate {baudrate}")
+                    self.handle_chunk(bytes(data))
+                    return True
+            if not self.running:
+                return False
+        connection.baudrate = self.baudrate
+        print(f"No frames found at any baud rate, staying at {self.baudrate}")
+        return False
+
+    def read_from_port(self):
+        # Drain the port continuously; every complete block is parsed and handed on,
+        # only the display callbacks are throttled (see flush_pending_display).
+        # Returns when the interface is closed or a baud rate detection was requested,
+        # a failing port raises to supervise()
+        connection = self.serial_connection
+        while self.running and not self.detect_requested:
+            # Block for the first byte (up to the port timeout), then take everything already buffered
+            chunk = connection.read(max(1, min(connection.in_waiting, self.read_chunk_size)))
+            if not self.running:
+                break
+            try:
+                if chunk:
+                    self.handle_chunk(chunk)
+                self.flush_pending_display()
             except Exception as e:
-                print(f"Error reading from port: {e}")
+                # A bad frame or a failing callback must not take the connection down
+                print(f"Error processing serial data: {e}")
+
+    def read_records(self):
+        # Client side of a TelemetryServer stream: a session header, then fixed size
+        # records (see session_format). A new header may follow when the layout changes
+        connection = self.serial_connection
+        buffer = bytearray()
+        record_layout = None
+        while self.running and not self.detect_requested:
+            # A socket only reports whether data is waiting, not how much, so read up to the
+            # end of the header or record in progress; the server always sends them whole
+            unit = HEADER_SIZE if record_layout is None else record_layout.size
+            chunk = connection.read(max(unit - len(buffer), 1))
+            if not self.running:
+                break
+            if not chunk:
+                self.flush_pending_display()
                 continue
-
-    def display_complete_message(self, message_lines):
-        # Join the message lines into a single string
-        complete_message_str = "\n".join(message_lines)
+            received_at = time.perf_counter()
+            self.bytes_received += len(chunk)
+            buffer += chunk
+            position = 0
+            while True:
+                if record_layout is None or buffer[position:position + len(MAGIC)] == MAGIC:
+                    if len(buffer) - position < HEADER_SIZE:
+                        break
+                    magic, _, _, slaves, cells, thermistors, record_size = HEADER.unpack_from(buffer, position)
+                    if magic != MAGIC:
+                        raise ValueError("telemetry stream does not start with a session header")
+                    record_layout = RecordLayout(PackLayout(slaves, cells, thermistors))
+                    position += HEADER_SIZE
+                elif len(buffer) - position >= record_layout.size:
+                    frame = record_layout.unpack(buffer, position)
+                    position += record_layout.size
+                    try:
+                        self.deliver_frame(frame, datetime.datetime.fromtimestamp(frame.timestamp),
+                                           format_frame(frame), received_at)
+                    except Exception as e:
+                        print(f"Error processing serial data: {e}")
+                else:
+                    break
+            del buffer[:position]
+            self.flush_pending_display()
+
+    def handle_chunk(self, chunk):
+        received_at = time.perf_counter()  # The last byte of any frame completed by this chunk
+        self.bytes_received += len(chunk)
+        for frame_text in self.frame_splitter.feed(chunk):
+            self.process_complete_message(frame_text, received_at)
+
+    def process_complete_message(self, frame_text, received_at=None):
+        # Every frame is parsed and passed to the frame callback (logging, alarms),
+        # regardless of how often the GUI is refreshed
+        now = datetime.datetime.now()
+        frame = self.parse_data(frame_text)
+        self.deliver_frame(frame, now, frame_text, received_at)
+
+    def deliver_frame(self, frame, now, frame_text, received_at=None):
+        # Prepend the timestamped separator the console and logger rely on
+        complete_message_str = f"{now:%Y-%m-%d %H:%M:%S}.{now.microsecond // 1000:03d} -----------------------------\n{frame_text}"
+        self.frames_received += 1
+        frame.seq = self.frames_received
+        frame.timestamp = now.timestamp()
+        frame.received_at = received_at if received_at is not None else time.perf_counter()
+        frame.text = complete_message_str
+        self.stats_engine.process(frame)
+        if self.frame_callback:
+            self.frame_callback(frame)
+
+        # Throttle the display callbacks; the frame shown is always the newest one
+        self.pending_display = frame
+        self.flush_pending_display()
+
+    def flush_pending_display(self):
+        # Called for every frame and after every read, so a frame that arrived inside the
+        # throttle window is still shown at most display_interval (+ read timeout) later
+        if self.pending_display is None:
+            return
+        now = time.monotonic()
+        if now - self.last_display_time >= self.display_interval:
+            self.last_display_time = now
+            frame = self.pending_display
+            self.pending_display = None
+            self.display_complete_message(frame)
+
+    def display_complete_message(self, frame):
         # Display the complete message
-        self.display_message_callback(complete_message_str)
-
-        parsed_data = self.parse_data("\n".join(message_lines))
-        # Update GUI with parsed data
-        if self.update_callback:
-            self.update_callback(parsed_data)
-
-    '''def process_and_reset_block(self, message_block):
-        formatted_message = "\n".join(message_block)
         if self.display_message_callback:
-            self.display_message_callback(formatted_message)
-        # Parse the block into structured data
-        parsed_data = self.parse_data("\n".join(message_block))
+            self.display_message_callback(frame.text)
         # Update GUI with parsed data
         if self.update_callback:
-            self.update_callback(parsed_data)'''
+            self.update_callback(frame)
 
     def parse_data(self, data):
-        # Initial data structure
-        parsed_data = {
-            'voltages': {},
-            'temperatures': {},
-            'max_voltage': None,
-            'min_voltage': None,
-            'battery_voltage': None,
-            'battery_current': None,
-            'ivt_voltage': None,
-            'ivt_current': None,
-            'ivt_current_counter': None,
-            'charging_status': None,
-            'soc': None,
-            'bms_flags': None,
-            'bad_cell': None,
-            'bad_thermistor': None
-        }
-
-        # Split the input data by lines
-        lines = data.split('\n')
-
-        # Parsing flags
-        self.reading_voltages = False
-        self.reading_temperatures = False
-
-        for line in lines:
-            if 'Printing voltages:' in line:
-                self.reading_voltages = True
-                self.reading_temperatures = False
-                continue
-
-            if 'Printing temperatures:' in line:
-                self.reading_voltages = False
-                self.reading_temperatures = True
-                continue
-
-            if self.reading_voltages and line.startswith('IC'):
-                parts = line.split()
-                slave_id = f"Slave {parts[1]}"  # IC number is used to generate the slave ID
-                # Extract the cell voltages from the line, stripping any dashes and converting to float
-                cell_voltages = []
-                for v in parts[2:]:  # Start from the third element to skip 'IC' and its number
-                    v = v.strip('-')  # Remove leading and trailing dashes if present
-                    try:
-                        voltage = float(v)
-                        cell_voltages.append(voltage)
-                    except ValueError:
-                        print(f"Error: Unable to convert value '{v}' to float")
-                parsed_data['voltages'][slave_id] = cell_voltages
-
-            if self.reading_temperatures and line.startswith('IC'):
-                parts = line.split()
-                slave_id = f"Slave {parts[1]}"  # IC number is used to generate the slave ID
-                # Extract the cell temperatures from the line, handling NaN and converting to float where possible
-                cell_temperatures = []
-                for t in parts[2:]:  # Start from the third element to skip 'IC' and its number
-                    if t == 'NaN':  # Check if the temperature value is 'NaN'
-                        cell_temperatures.append(None)  # Append None to indicate no data for this cell
-                    else:
-                        try:
-                            temperature = float(t)
-                            cell_temperatures.append(temperature)
-                        except ValueError:
-                            print(f"Error: Unable to convert value '{t}' to float")
-                parsed_data['temperatures'][slave_id] = cell_temperatures
-
-            elif 'Max Voltage:' in line:
-               # Extract and parse max voltage
-               self.reading_voltages = False
-               self.reading_temperatures = False
-               parsed_data['max_voltage'] = self.parse_float(line.split(':')[1])
-
-            elif 'Min Voltage:' in line:
-                # Extract and parse min voltage
-                parsed_data['min_voltage'] = self.parse_float(line.split(':')[1])
-
-            elif 'Printing voltages:' in line:
-                reading_voltages = True
-
-            elif 'Printing temperatures:' in line:
-                reading_temperatures = True
-
-            elif 'Battery Voltage:' in line:
-                parsed_data['battery_voltage'] = self.parse_float(line.split(':')[1])
-
-            elif 'Battery Current:' in line:
-                parsed_data['battery_current'] = self.parse_float(line.split(':')[1])
-
-            elif 'IVT Voltage:' in line:
-                parsed_data['ivt_voltage'] = self.parse_float(line.split(':')[1])
-
-            elif 'IVT Current:' in line:
-                parsed_data['ivt_current'] = self.parse_float(line.split(':')[1])
-
-            elif 'IVT Current Counter:' in line:
-                parsed_data['ivt_current_counter'] = self.parse_float(line.split('Ah')[0].split(':')[1])
-                parsed_data['charging_status'] = int(line.split('Status:')[1].split()[0])
-
-            elif 'SOC:' in line:
-                parsed_data['soc'] = int(line.split(':')[1].strip().split('%')[0])
-
-            elif 'BMS_Flags:' in line:
-                parsed_data['bms_flags'] = line.split(':')[1].strip()
-
-            elif 'Bad_Cell:' in line:
-                parsed_data['bad_cell'] = int(line.split(':')[1].strip())
-
-            elif 'Bad_Thermistor:' in line:
-                parsed_data['bad_thermistor'] = int(line.split(':')[1].strip())
-
-        return parsed_data
-
-    def parse_float(self, value):
-        try:
-            # Remove any trailing units like 'V' or 'A' before converting to float
-            return float(value.strip('VA'))
-        except ValueError:
-            # Log an error or handle it as appropriate
-            print(f"Error: Unable to convert value '{value}' to float")
-            return None  # Or return a default value if that's preferred
+        # Parse one complete message block into a BmsFrame
+        return self.parser.parse(data)
 
     def change_baudrate(self, new_baudrate):
-        # Check if the connection is open
-        if self.serial_connection and self.serial_connection.is_open:
-            # Close the current connection
-            self.serial_connection.close()
-            # Change the baudrate
-            self.baudrate = new_baudrate
-            # Re-open the serial connection with the new baudrate
-            self.open_serial_port(self.port)
+        # None switches to automatic detection. The rate of an open port is changed in place,
+        # the reader thread keeps running
+        if new_baudrate is None:
+            self.auto_baud = True
+            if self.running:
+                self.detect_requested = True  # The reader returns to supervise(), which runs the detection
+            return
+        self.auto_baud = False
+        self.baudrate = new_baudrate
+        connection = self.serial_connection
+        if connection is not None and connection.is_open:
+            try:
+                connection.baudrate = new_baudrate
+            except (serial.SerialException, ValueError) as e:
+                print(f"Error changing baudrate: {e}")
         else:
             # Just change the baudrate without opening the connection
-            self.baudrate = new_baudrate
             print("Changed baudrate to {}, but the connection is not open.".format(new_baudrate))
 
     def close_serial_port(self):
         # Signal to the reading thread that it should stop
         self.running = False
+        self.stop_event.set()
+        connection = self.serial_connection
 
         # Check if the serial connection was ever established
-        if self.serial_connection:
-            # Close the serial port if it's open
-            if self.serial_connection.is_open:
-                self.serial_connection.close()
-                print("Serial port closed.")
+        if connection is None and self.read_thread is None:
+            print("Serial connection was not established.")
+            return
 
-            # Wait for the reading thread to finish if it's running
-            if self.read_thread and self.read_thread.is_alive():
-                self.read_thread.join(timeout=1)
+        # Closing the port also ends a read that is waiting for data
+        if connection is not None and connection.is_open:
+            connection.close()
+            print("Serial port closed.")
 
+        # Wait for the reading thread to finish if it's running
+        if self.read_thread is not None and self.read_thread is not threading.current_thread():
+            self.read_thread.join(timeout=2)
             # After calling join, check if the thread is still alive
-            if self.read_thread and self.read_thread.is_alive():
+            if self.read_thread.is_alive():
                 print("Read thread did not terminate. It may be stuck in blocking I/O.")
-        else:
-            print("Serial connection was not established.")
-
-
+        self.read_thread = None
+        self.serial_connection = None
+        self.state = DISCONNECTED
@@ -0,0 +1,229 @@
+import mmap
+import struct
+from array import array
+from bms_frame import BmsFrame, PackLayout, NAN
+
+# Binary session file (.bms): a 64 byte header followed by fixed size records,
+# one per frame, all little endian.
+#
+# Header: magic, format version, header size, slaves, cells per slave,
+#         thermistors per slave, record size
+# Record: timestamp (float64, unix time), sequence number (uint32),
+#         cell voltages (uint16, 0.1 mV, 0xFFFF = no reading or out of range),
+#         temperatures (int16, 0.01 degC, -32768 = NaN or out of range),
+#         max/min voltage, battery voltage/current, IVT voltage/current/counter
+#         (float32, NaN = missing, not finite or out of range),
+#         SOC (int16), charging status (int8), bad cell, bad thermistor (int16, -1 = missing),
+#         BMS flags bitmask (uint16, flag i of the printed string in bit i), number of flags printed (uint8),
+#         parse errors (uint16)
+
+MAGIC = b'UOPBMS\r\n'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHHHHI')
+HEADER_SIZE = 64
+
+VOLTAGE_SCALE = 10000  # Units per volt
+TEMPERATURE_SCALE = 100  # Units per degree
+NO_VOLTAGE = 0xFFFF
+NO_TEMPERATURE = -32768
+# Largest voltage and temperature that still round into the field (float32 readings are a little off)
+MAX_VOLTAGE = (NO_VOLTAGE - 1 + 0.4) / VOLTAGE_SCALE
+MAX_TEMPERATURE = (32767 + 0.4) / TEMPERATURE_SCALE
+MAX_FLOAT32 = 3.4028234663852886e38
+
+FLOAT_FIELDS = ('max_voltage', 'min_voltage', 'battery_voltage', 'battery_current',
+                'ivt_voltage', 'ivt_current', 'ivt_current_counter')
+INT_FIELDS = ('soc', 'charging_status', 'bad_cell', 'bad_thermistor')
+INT_LIMITS = ((-1, 32767), (-1, 127), (-1, 32767), (-1, 32767))
+
+
+def stored_int(value, limits):
+    # Missing or out of range values (a corrupted line) are stored as -1
+    if value is None or not limits[0] <= value <= limits[1]:
+        return -1
+    return value
+
+
+def stored_float(value):
+    # Missing, infinite (the parser accepts e.g. "3.8e45") or out of float32 range values are stored as NaN
+    if value is None or not -MAX_FLOAT32 <= value <= MAX_FLOAT32:
+        return NAN
+    return value
+
+
+class RecordLayout:
+    # Struct and field offsets of one record for a given pack layout
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.cells = layout.slaves * layout.cells_per_slave
+        self.thermistors = layout.slaves * layout.thermistors_per_slave
+        self.struct = struct.Struct(f'<dI{self.cells}H{self.thermistors}h7fhbhhHBH')
+        self.size = self.struct.size
+
+        # Offset and format of every scalar column, used to read one column without unpacking whole records
+        self.fields = {'timestamp': (0, 'd'), 'seq': (8, 'I')}
+        self.voltage_offset = 12
+        self.temperature_offset = self.voltage_offset + 2 * self.cells
+        offset = self.temperature_offset + 2 * self.thermistors
+        for name in FLOAT_FIELDS:
+            self.fields[name] = (offset, 'f')
+            offset += 4
+        for name, fmt in zip(INT_FIELDS + ('bms_flags', 'bms_flags_length', 'parse_errors'), 'hbhhHBH'):
+            self.fields[name] = (offset, fmt)
+            offset += struct.calcsize(fmt)
+
+    def pack(self, frame):
+        # Never raises on a parsed frame: a value the record cannot hold is stored as missing,
+        # the comparisons are False for NaN and reject infinities
+        voltages = [round(v * VOLTAGE_SCALE) if 0 <= v <= MAX_VOLTAGE else NO_VOLTAGE for v in frame.voltages]
+        temperatures = [round(t * TEMPERATURE_SCALE) if valid and -MAX_TEMPERATURE <= t <= MAX_TEMPERATURE
+                        else NO_TEMPERATURE for t, valid in zip(frame.temperatures, frame.temperature_valid)]
+        floats = [stored_float(getattr(frame, name)) for name in FLOAT_FIELDS]
+        ints = [stored_int(getattr(frame, name), limits) for name, limits in zip(INT_FIELDS, INT_LIMITS)]
+        flags = frame.bms_flags or ''
+        bits = 0
+        for i, flag in enumerate(flags[:16]):
+            if flag == '1':
+                bits |= 1 << i
+        return self.struct.pack(frame.timestamp or 0.0, frame.seq & 0xFFFFFFFF, *voltages, *temperatures,
+                                *floats, *ints, bits, min(len(flags), 16), min(frame.parse_errors, 0xFFFF))
+
+    def unpack(self, buffer, offset=0):
+        values = self.struct.unpack_from(buffer, offset)
+        frame = BmsFrame(self.layout)
+        frame.timestamp, frame.seq = values[0], values[1]
+        position = 2
+        raw_voltages = values[position:position + self.cells]
+        position += self.cells
+        raw_temperatures = values[position:position + self.thermistors]
+        position += self.thermistors
+        frame.voltages = array('f', [NAN if v == NO_VOLTAGE else v / VOLTAGE_SCALE for v in raw_voltages])
+        frame.temperatures = array('f', [NAN if t == NO_TEMPERATURE else t / TEMPERATURE_SCALE
+                                         for t in raw_temperatures])
+        frame.temperature_valid = bytearray([t != NO_TEMPERATURE for t in raw_temperatures])
+
+        # Which slaves reported is not stored, a slave with any reading counts as present
+        per_slave = self.layout.cells_per_slave
+        for slave in range(self.layout.slaves):
+            if any(v != NO_VOLTAGE for v in raw_voltages[slave * per_slave:(slave + 1) * per_slave]):
+                frame.voltage_slaves[slave] = 1
+        per_slave = self.layout.thermistors_per_slave
+        for slave in range(self.layout.slaves):
+            if any(frame.temperature_valid[slave * per_slave:(slave + 1) * per_slave]):
+                frame.temperature_slaves[slave] = 1
+
+        for name in FLOAT_FIELDS:
+            value = values[position]
+            # Rounding hides the float32 representation error, the BMS prints at most 4 decimals
+            setattr(frame, name, None if value != value else round(value, 4))
+            position += 1
+        for name in INT_FIELDS:
+            value = values[position]
+            setattr(frame, name, None if value == -1 else value)
+            position += 1
+        bits, length, frame.parse_errors = values[position:position + 3]
+        frame.bms_flags = ''.join('1' if bits >> i & 1 else '0' for i in range(length)) if length else None
+        return frame
+
+
+class SessionWriter:
+    # Appends frames to a .bms file
+
+    def __init__(self, path, layout):
+        self.record_layout = RecordLayout(layout)
+        self.file = open(path, 'wb')
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, HEADER_SIZE, layout.slaves, layout.cells_per_slave,
+                             layout.thermistors_per_slave, self.record_layout.size)
+        self.file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def write(self, frames):
+        pack = self.record_layout.pack
+        self.file.write(b''.join(pack(frame) for frame in frames))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SessionReader:
+    # Memory maps a .bms file. Opening only reads the header; records and
+    # columns are decoded straight from the mapping when they are requested.
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        header = self.file.read(HEADER_SIZE)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is not a BMS session file")
+        magic, version, header_size, slaves, cells, thermistors, record_size = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a BMS session file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported session file version {version}")
+        self.layout = PackLayout(slaves, cells, thermistors)
+        self.record_layout = RecordLayout(self.layout)
+        if record_size != self.record_layout.size:
+            raise ValueError(f"Record size {record_size} does not match the pack layout")
+        self.header_size = header_size
+        self.record_size = record_size
+
+        file_size = self.file.seek(0, 2)
+        # A record cut short by a crash is ignored
+        self.count = max(0, (file_size - header_size) // record_size)
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if file_size else b''
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.record_layout.unpack(self.buffer, self.header_size + index * self.record_size)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def column(self, name, start=0, stop=None, step=1):
+        # One scalar field (e.g. 'timestamp', 'soc', 'battery_voltage') for a range of records
+        offset, fmt = self.record_layout.fields[name]
+        values = self.read_column(offset, fmt, start, stop, step)
+        if fmt == 'f':
+            return values
+        if name in INT_FIELDS:
+            return [None if v == -1 else v for v in values]
+        return values
+
+    def voltage_column(self, cell, start=0, stop=None, step=1):
+        # Voltage of one cell (flat index slave * cells_per_slave + cell) in volts, NaN when missing
+        offset = self.record_layout.voltage_offset + 2 * cell
+        return array('d', [NAN if v == NO_VOLTAGE else v / VOLTAGE_SCALE
+                           for v in self.read_column(offset, 'H', start, stop, step)])
+
+    def temperature_column(self, thermistor, start=0, stop=None, step=1):
+        offset = self.record_layout.temperature_offset + 2 * thermistor
+        return array('d', [NAN if t == NO_TEMPERATURE else t / TEMPERATURE_SCALE
+                           for t in self.read_column(offset, 'h', start, stop, step)])
+
+    def read_column(self, offset, fmt, start, stop, step):
+        unpack_from = struct.Struct('<' + fmt).unpack_from
+        buffer = self.buffer
+        first = self.header_size + offset
+        record_size = self.record_size
+        indices = range(*slice(start, stop, step).indices(self.count))
+        return array('d' if fmt in 'df' else 'l', [unpack_from(buffer, first + i * record_size)[0] for i in indices])
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
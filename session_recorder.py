@@ -0,0 +1,169 @@
+import os
+import csv
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class SessionRecorder:
+    # Streams every received frame to disk while the session is running.
+    # record() only puts the frame on a queue, so it is safe to call from the
+    # serial read thread; a writer thread appends the frames in batches to
+    #   logs/log_<start>.csv  one row per frame (vtime, timestamp, cells, thermistors)
+    #   logs/log_<start>.log  the raw frame text as shown in the console
+    #   logs/log_<start>.bms  fixed size binary records, see session_format
+    # and flushes the files every flush_interval seconds, together with the
+    # state files registered with add_state. Files are only
+    # created once the first frame arrives.
+
+    def __init__(self, directory="logs", flush_interval=1.0, batch_size=200, binary=True, name=None):
+        self.directory = directory
+        self.name = name  # Added to the file names, e.g. logs/log_pack2_<start>.csv
+        self.binary = binary
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.writer_thread = None
+        self.base_name = None  # logs/log_<start>, without extension
+        self.csv_file = None
+        self.csv_writer = None
+        self.raw_file = None
+        self.binary_writer = None
+        self.frames_written = 0
+        self.closed = False
+        self.state_files = []  # [path, snapshot callable, last state saved], see add_state
+
+    def start(self):
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+            self.writer_thread.start()
+
+    def state_path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def add_state(self, file_name, snapshot):
+        # Keeps snapshot() (a JSON serialisable dict, e.g. the energy totals) saved in the log
+        # directory: written on every flush when it changed since registration, and on close.
+        # Load the state of an earlier run from state_path() first, then call this before start()
+        self.state_files.append([self.state_path(file_name), snapshot, snapshot()])
+
+    def record(self, frame):
+        # Called from the acquisition thread for every frame
+        if not self.closed:
+            self.queue.put(frame)
+
+    def close(self, timeout=5.0):
+        # Flush whatever is still queued and close the files
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        if self.writer_thread is not None:
+            self.writer_thread.join(timeout=timeout)
+            if self.writer_thread.is_alive():
+                print("Session recorder did not finish writing in time.")
+        if self.frames_written:
+            print(f"Data logged successfully to {self.base_name}.csv")
+        else:
+            print("No data to log, file not created.")
+
+    def write_loop(self):
+        last_flush = time.monotonic()
+        batch = []
+        finished = False
+        while not finished:
+            try:
+                frame = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                frame = False  # Only time to flush
+
+            # Collect everything that is already waiting into one batch
+            while frame is not False:
+                if frame is None:
+                    finished = True
+                    break
+                batch.append(frame)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    frame = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self.write_batch(batch)
+                    batch = []
+                now = time.monotonic()
+                if finished or now - last_flush >= self.flush_interval:
+                    self.flush()
+                    self.save_states()
+                    last_flush = now
+            except Exception as e:
+                # Keep the thread alive, the next batch may succeed (e.g. disk full)
+                print(f"Error writing session log: {e}")
+                batch = []
+
+        self.close_files()
+
+    def open_files(self, frame):
+        # Imported here, on the writer thread, so they do not add to the GUI startup time
+        from logger import csv_headers
+        from session_format import SessionWriter
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        prefix = f"log_{self.name}_" if self.name else "log_"
+        self.base_name = os.path.join(self.directory, prefix + timestamp)
+        self.csv_file = open(self.base_name + ".csv", 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        layout = frame.layout
+        headers = csv_headers(layout.slaves * layout.cells_per_slave, layout.slaves * layout.thermistors_per_slave)
+        self.csv_writer.writerow(headers[:1] + ['timestamp'] + headers[1:])
+        self.raw_file = open(self.base_name + ".log", 'w', encoding='utf-8')
+        if self.binary:
+            self.binary_writer = SessionWriter(self.base_name + ".bms", layout)
+
+    def write_batch(self, frames):
+        if self.csv_file is None:
+            self.open_files(frames[0])
+        rows = []
+        for frame in frames:
+            self.frames_written += 1
+            timestamp = datetime.fromtimestamp(frame.timestamp).isoformat(sep=' ', timespec='milliseconds') \
+                if frame.timestamp is not None else ''
+            rows.append([self.frames_written, timestamp]
+                        + ['%.5g' % v for v in frame.voltages]
+                        + ['%.5g' % t if valid else 'NaN' for t, valid in zip(frame.temperatures, frame.temperature_valid)])
+        self.csv_writer.writerows(rows)
+        self.raw_file.write("".join(frame.text + "\n" for frame in frames))
+        if self.binary_writer is not None:
+            self.binary_writer.write(frames)
+
+    def flush(self):
+        if self.csv_file is not None:
+            self.csv_file.flush()
+            self.raw_file.flush()
+            if self.binary_writer is not None:
+                self.binary_writer.flush()
+
+    def save_states(self):
+        for entry in self.state_files:
+            path, snapshot, saved = entry
+            state = snapshot()
+            if state == saved:
+                continue
+            os.makedirs(self.directory, exist_ok=True)
+            # Written to a temporary file and renamed, so a crash never leaves half a file
+            with open(path + ".tmp", 'w', encoding='utf-8') as state_file:
+                json.dump(state, state_file, indent=1)
+            os.replace(path + ".tmp", path)
+            entry[2] = state
+
+    def close_files(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.raw_file.close()
+            if self.binary_writer is not None:
+                self.binary_writer.close()
@@ -0,0 +1,154 @@
+import argparse
+import random
+import time
+from array import array
+from bms_frame import BmsFrame, PackLayout
+from bms_parser import format_frame
+from replay import open_pty, write_all, wait_for_tcp_client
+
+
+class TelemetrySimulator:
+    # Generates a charging pack in the Teensy's text protocol: cell voltages
+    # follow the SOC with a fixed per-cell offset and some noise, temperatures
+    # rise slowly with the charge. Optional faults: corrupted bytes, dropped
+    # lines and NaN thermistors, each given as a probability.
+
+    def __init__(self, layout, charge_current=20.0, capacity_ah=15.0, start_soc=20.0,
+                 corrupt=0.0, drop_lines=0.0, nan_thermistors=0.0, seed=None):
+        self.layout = layout
+        self.rng = random.Random(seed)
+        self.charge_current = charge_current
+        self.capacity_ah = capacity_ah
+        self.soc = start_soc
+        self.corrupt = corrupt  # Probability that a byte is replaced by a random one
+        self.drop_lines = drop_lines  # Probability that a line (other than the end marker) is lost
+        self.nan_thermistors = nan_thermistors  # Probability that a thermistor reads NaN
+        self.ivt_counter = 0.0
+        self.last_time = None
+        self.seq = 0
+        cells = layout.slaves * layout.cells_per_slave
+        thermistors = layout.slaves * layout.thermistors_per_slave
+        self.cell_offsets = [self.rng.gauss(0, 0.008) for _ in range(cells)]
+        self.thermistor_offsets = [self.rng.gauss(0, 0.8) for _ in range(thermistors)]
+
+    def next_frame(self, now=None):
+        now = time.time() if now is None else now
+        if self.last_time is not None:
+            hours = (now - self.last_time) / 3600
+            self.ivt_counter += self.charge_current * hours
+            self.soc = min(100.0, self.soc + 100 * self.charge_current * hours / self.capacity_ah)
+        self.last_time = now
+        self.seq += 1
+
+        rng = self.rng
+        frame = BmsFrame(self.layout)
+        frame.seq = self.seq
+        frame.timestamp = now
+        cell_base = 3.3 + 0.9 * self.soc / 100
+        frame.voltages = array('f', [cell_base + offset + rng.gauss(0, 0.001) for offset in self.cell_offsets])
+        temperature_base = 24.0 + 10 * self.soc / 100
+        temperatures = [temperature_base + offset + rng.gauss(0, 0.05) for offset in self.thermistor_offsets]
+        valid = [rng.random() >= self.nan_thermistors for _ in temperatures]
+        frame.temperatures = array('f', [t if ok else float('nan') for t, ok in zip(temperatures, valid)])
+        frame.temperature_valid = bytearray(valid)
+        frame.voltage_slaves = bytearray([1]) * self.layout.slaves
+        frame.temperature_slaves = bytearray([1]) * self.layout.slaves
+
+        voltages = frame.voltages
+        frame.max_voltage = round(max(voltages), 4)
+        frame.min_voltage = round(min(voltages), 4)
+        frame.battery_voltage = round(sum(voltages), 2)
+        frame.battery_current = round(self.charge_current + rng.gauss(0, 0.05), 2)
+        frame.ivt_voltage = round(frame.battery_voltage + rng.gauss(0, 0.2), 2)
+        frame.ivt_current = round(frame.battery_current + rng.gauss(0, 0.05), 2)
+        frame.ivt_current_counter = round(self.ivt_counter, 2)
+        frame.charging_status = 1 if self.soc < 100 else 0
+        frame.soc = int(self.soc)
+        frame.bms_flags = "1000000000000001"
+        frame.bad_cell = 0
+        frame.bad_thermistor = len(valid) - sum(valid)
+        return frame
+
+    def render(self, frame):
+        # Protocol text of a frame with the configured faults applied
+        lines = format_frame(frame).split("\n")
+        if self.drop_lines:
+            lines = [line for line in lines[:-1] if self.rng.random() >= self.drop_lines] + lines[-1:]
+        data = bytearray(("\r\n".join(lines) + "\r\n").encode('ascii'))
+        if self.corrupt:
+            # Jump straight to the next corrupted position instead of drawing a number per byte
+            position = int(self.rng.expovariate(self.corrupt))
+            while position < len(data):
+                data[position] = self.rng.randrange(256)
+                position += 1 + int(self.rng.expovariate(self.corrupt))
+        return bytes(data)
+
+    def run(self, write, rate, baudrate=None, duration=None, report_interval=10.0):
+        # Emit frames at `rate` per second, never faster than the serial line (10 bits per byte) allows
+        bytes_per_second = baudrate / 10 if baudrate else None
+        start = time.perf_counter()
+        next_frame_at = start
+        line_free_at = start
+        frames_sent = bytes_sent = 0
+        next_report = start + report_interval
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                now = time.perf_counter()
+                wait = max(next_frame_at, line_free_at) - now
+                if wait > 0:
+                    time.sleep(wait)
+                data = self.render(self.next_frame())
+                write(data)
+                frames_sent += 1
+                bytes_sent += len(data)
+                now = time.perf_counter()
+                next_frame_at += 1 / rate
+                if next_frame_at < now - 1:
+                    next_frame_at = now  # The sink cannot keep up, do not try to catch up with a burst
+                if bytes_per_second:
+                    line_free_at = max(line_free_at, now) + len(data) / bytes_per_second
+                if now >= next_report:
+                    elapsed = now - start
+                    print(f"{frames_sent} frames, {frames_sent / elapsed:.1f} frames/s, "
+                          f"{bytes_sent / elapsed / 1024:.1f} KiB/s")
+                    next_report += report_interval
+        except KeyboardInterrupt:
+            pass
+        return frames_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the BMS telemetry stream of the Teensy")
+    parser.add_argument("--rate", type=float, default=1.0, help="frames per second")
+    parser.add_argument("--baud", type=int, default=115200, help="serial line speed to emulate, 0 = unlimited")
+    parser.add_argument("--slaves", type=int, default=12)
+    parser.add_argument("--cells", type=int, default=12, help="cells per slave")
+    parser.add_argument("--thermistors", type=int, default=5, help="thermistors per slave")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability of a corrupted byte")
+    parser.add_argument("--drop-lines", type=float, default=0.0, help="probability of a dropped line")
+    parser.add_argument("--nan", type=float, default=0.0, help="probability of a NaN thermistor reading")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (soak tests)")
+    parser.add_argument("--seed", type=int, help="random seed for a reproducible stream")
+    parser.add_argument("--tcp", type=int, metavar="PORT", help="serve on socket://127.0.0.1:PORT instead of a pty")
+    args = parser.parse_args()
+
+    layout = PackLayout(args.slaves, args.cells, args.thermistors)
+    simulator = TelemetrySimulator(layout, corrupt=args.corrupt, drop_lines=args.drop_lines,
+                                   nan_thermistors=args.nan, seed=args.seed)
+    frame_bytes = len(simulator.render(simulator.next_frame()))
+    if args.baud:
+        print(f"{frame_bytes} bytes per frame, {args.baud} baud allows at most "
+              f"{args.baud / 10 / frame_bytes:.1f} frames/s")
+
+    if args.tcp:
+        write = wait_for_tcp_client(args.tcp).sendall
+    else:
+        master_fd, slave_fd, device = open_pty()
+        print(f"Open {device} in the GUI to receive the simulated stream")
+        write = write_all(master_fd)
+    frames_sent = simulator.run(write, args.rate, args.baud or None, args.duration)
+    print(f"Sent {frames_sent} frames")
+
+
+if __name__ == "__main__":
+    main()
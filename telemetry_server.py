@@ -0,0 +1,152 @@
+import socket
+import struct
+import threading
+from collections import deque
+from session_format import RecordLayout, HEADER, MAGIC, FORMAT_VERSION, HEADER_SIZE
+
+# Stream format, the same encoding as a .bms session file: on connect the server
+# sends the 64 byte session header (pack layout and record size), then one fixed
+# size record per frame. A client can therefore also save the stream straight to
+# a file that SessionReader opens. BatteryTab attaches as a client with a device
+# entry of the form bms://host:port, see SerialInterface.read_records.
+
+STREAM_SCHEME = "bms://"
+
+
+def stream_header(layout, record_size):
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, HEADER_SIZE, layout.slaves, layout.cells_per_slave,
+                         layout.thermistors_per_slave, record_size)
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+class Subscriber:
+    # One connected viewer. publish() only appends to its bounded deque, a sender
+    # thread per subscriber does the (possibly blocking) socket writes. When the
+    # viewer falls behind, the oldest records are dropped.
+
+    def __init__(self, connection, address, max_pending):
+        self.connection = connection
+        self.address = address
+        self.pending = deque(maxlen=max_pending)
+        self.condition = threading.Condition()
+        self.header = None  # Sent before the first record, set by the server
+        self.sent = 0
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.send_loop, daemon=True)
+
+    def push(self, layout, record):
+        with self.condition:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append((layout, record))
+            self.condition.notify()
+
+    def send_loop(self):
+        layout = None
+        try:
+            while self.running:
+                with self.condition:
+                    while self.running and not self.pending:
+                        self.condition.wait()
+                    batch = list(self.pending)
+                    self.pending.clear()
+                chunks = []
+                for record_layout, record in batch:
+                    if record_layout is not layout:
+                        # First record, or the pack layout changed: (re)send the header
+                        layout = record_layout
+                        chunks.append(stream_header(layout.layout, layout.size))
+                    chunks.append(record)
+                self.connection.sendall(b''.join(chunks))
+                self.sent += len(batch)
+        except OSError:
+            pass  # The viewer went away
+        self.close()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)  # Also ends a sendall blocked on a stalled viewer
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class TelemetryServer:
+    # Publishes every parsed frame to any number of TCP viewers. Call publish()
+    # from the acquisition thread (frame_callback); it encodes the frame once and
+    # never waits for a viewer.
+
+    def __init__(self, host="127.0.0.1", port=7800, max_pending=100):
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending  # Records queued per viewer before the oldest are dropped
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.record_layouts = {}  # PackLayout -> RecordLayout
+        self.server_socket = None
+        self.accept_thread = None
+        self.running = False
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        self.port = self.server_socket.getsockname()[1]  # The actual port when 0 was given
+        self.running = True
+        self.accept_thread = threading.Thread(target=self.accept_loop, daemon=True)
+        self.accept_thread.start()
+        print(f"Serving telemetry on {STREAM_SCHEME}{self.host}:{self.port}")
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                connection, address = self.server_socket.accept()
+            except OSError:
+                break  # Server socket closed by stop()
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = Subscriber(connection, address, self.max_pending)
+            with self.lock:
+                self.subscribers = self.subscribers + [subscriber]
+            subscriber.thread.start()
+            print(f"Telemetry viewer connected from {address[0]}:{address[1]}")
+
+    def publish(self, frame):
+        subscribers = self.subscribers  # Replaced, never modified, so no lock is needed to read it
+        if not subscribers:
+            return
+        record_layout = self.record_layouts.get(frame.layout)
+        if record_layout is None:
+            record_layout = self.record_layouts[frame.layout] = RecordLayout(frame.layout)
+        try:
+            record = record_layout.pack(frame)
+        except (struct.error, ValueError, TypeError, OverflowError) as e:
+            # Only the viewers miss this frame, the caller goes on with its own work
+            print(f"Error encoding frame {frame.seq} for the telemetry viewers: {e}")
+            return
+        gone = False
+        for subscriber in subscribers:
+            if subscriber.running:
+                subscriber.push(record_layout, record)
+            else:
+                gone = True
+        if gone:
+            with self.lock:
+                self.subscribers = [subscriber for subscriber in self.subscribers if subscriber.running]
+
+    def stop(self):
+        self.running = False
+        if self.server_socket is not None:
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)  # Wakes the accept() of accept_loop
+            except OSError:
+                pass
+            self.server_socket.close()
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from alarm_engine import AlarmEngine
+from bms_frame import BmsFrame, PackLayout
+
+LAYOUT = PackLayout(2, 3, 2)
+NAN = float('nan')
+
+
+def make_frame(timestamp, cell=3.7, temperatures=(25.0, 25.0, 25.0, 25.0), temperature_slaves=(1, 1)):
+    # A frame of LAYOUT with every cell at `cell`; NaN in `temperatures` is a disconnected thermistor
+    frame = BmsFrame(LAYOUT)
+    frame.timestamp = timestamp
+    frame.voltages[:] = array('f', [cell]) * len(frame.voltages)
+    frame.voltage_slaves[:] = bytes([1] * LAYOUT.slaves)
+    frame.temperature_slaves[:] = bytes(temperature_slaves)
+    per_slave = LAYOUT.thermistors_per_slave
+    for index, temperature in enumerate(temperatures):
+        if temperature_slaves[index // per_slave]:
+            frame.temperatures[index] = temperature
+            frame.temperature_valid[index] = temperature == temperature
+    return frame
+
+
+class AlarmEngineTest(unittest.TestCase):
+
+    def run_frames(self, engine, frames):
+        # Index of each frame that changed an alarm, with the event's raised state
+        return [(index, event.raised) for index, frame in enumerate(frames) for event in engine.process(frame)]
+
+    def test_debounce(self):
+        engine = AlarmEngine([{'name': "Over", 'measure': 'cell_max', 'limit': 4.2, 'debounce': 3}])
+        cells = [4.3, 4.3, 3.7, 4.3, 4.3, 4.3, 4.3, 3.7, 3.7, 4.3, 3.7, 3.7, 3.7]
+        changes = self.run_frames(engine, [make_frame(i, cell) for i, cell in enumerate(cells)])
+        # Two frames over the limit are not enough, the third in a row raises; clearing needs three in a row too
+        self.assertEqual(changes, [(5, True), (12, False)])
+        self.assertEqual(engine.active(), (2, []))
+
+    def test_hysteresis(self):
+        events = []
+        engine = AlarmEngine([{'name': "Under", 'measure': 'cell_min', 'limit': 3.0, 'below': True,
+                               'hysteresis': 0.05}], callback=events.append)
+        cells = [3.1, 2.9, 3.02, 3.04, 2.95, 3.06, 3.06]
+        changes = self.run_frames(engine, [make_frame(i, cell) for i, cell in enumerate(cells)])
+        # Back above the limit but within the hysteresis keeps the alarm raised
+        self.assertEqual(changes, [(1, True), (5, False)])
+        self.assertEqual([event.raised for event in events], [True, False])
+        self.assertAlmostEqual(events[0].value, 2.9, places=5)
+        self.assertEqual(events[0].where, "S1 #1")
+
+    def test_active_alarm(self):
+        engine = AlarmEngine([{'name': "Hot", 'measure': 'temp_max', 'limit': 60.0}])
+        engine.process(make_frame(0.0, temperatures=(25.0, 25.0, 61.0, 25.0)))
+        version, active = engine.active()
+        self.assertEqual(version, 1)
+        self.assertEqual([(event.name, event.where) for event in active], [("Hot", "S2 #1")])
+
+    def test_missing_thermistors_only_on_reporting_slaves(self):
+        engine = AlarmEngine([{'name': "Missing", 'measure': 'nan_thermistors', 'limit': 1}])
+        # Slave 2 sent no temperature row: its thermistors are not counted as missing
+        frame = make_frame(0.0, temperatures=(25.0, NAN, 25.0, 25.0), temperature_slaves=(1, 0))
+        self.assertEqual(frame.nan_thermistor_count(), 1)
+        self.assertEqual(engine.process(frame), [])
+        frame = make_frame(1.0, temperatures=(25.0, NAN, NAN, 25.0))
+        self.assertEqual(frame.nan_thermistor_count(), 2)
+        self.assertEqual(self.run_frames(engine, [frame]), [(0, True)])
+
+    def test_flag(self):
+        engine = AlarmEngine([{'name': "Not safe", 'measure': 'flag', 'bit': 0, 'state': '0'}])
+        frames = [make_frame(i) for i in range(3)]
+        frames[0].bms_flags, frames[1].bms_flags, frames[2].bms_flags = '1000', '0000', '1000'
+        self.assertEqual(self.run_frames(engine, frames), [(1, True), (2, False)])
+
+    def test_no_reading_keeps_the_state(self):
+        engine = AlarmEngine([{'name': "Over", 'measure': 'cell_max', 'limit': 4.2, 'debounce': 2}])
+        frames = [make_frame(0, 4.3), make_frame(1, NAN), make_frame(2, 4.3)]
+        self.assertEqual(self.run_frames(engine, frames), [(2, True)])
+
+    def test_frame_without_timestamp_is_skipped(self):
+        engine = AlarmEngine([{'name': "Over", 'measure': 'cell_max', 'limit': 4.2}])
+        self.assertEqual(engine.process(make_frame(None, 4.3)), [])
+        self.assertEqual(engine.frames, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
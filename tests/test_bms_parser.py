@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from bench_parser import legacy_parse_data, make_frame
+from bms_frame import DEFAULT_LAYOUT, PackLayout, SCALAR_FIELDS
+from bms_parser import BmsParser
+
+LAYOUT = PackLayout(3, 4, 3)
+
+# Slave 2 has a NaN thermistor, slave 3 a short voltage row and a short temperature
+# row, and the block has no "IVT Voltage:" line
+IRREGULAR_BLOCK = """Printing voltages:
+IC 1 3.601- 3.602- 3.603- 3.604-
+IC 2 3.611- 3.612- 3.613- 3.614-
+IC 3 3.621- 3.622-
+Printing temperatures:
+IC 1 24.0 24.1 24.2
+IC 2 25.0 NaN 25.2
+IC 3 26.0
+Max Voltage: 3.622V
+Min Voltage: 3.601V
+Battery Voltage: 36.12V
+Battery Current: -2.50A
+IVT Current: -2.40A
+IVT Current Counter: 1.5Ah Charging Status: 0
+SOC: 55%
+BMS_Flags: 1000000000000000
+Bad_Cell: 0
+Bad_Thermistor: 2"""
+
+
+class BmsParserLegacyTest(unittest.TestCase):
+
+    def assertSameRows(self, rows, legacy_rows, per_slave):
+        # BmsParser keeps a fixed number of values per slave, the ones a short row lacks are None
+        self.assertEqual(list(rows), list(legacy_rows))
+        for name, legacy_values in legacy_rows.items():
+            self.assertEqual(len(rows[name]), per_slave, name)
+            for value, legacy_value in zip(rows[name], legacy_values + [None] * per_slave):
+                if legacy_value is None:
+                    self.assertIsNone(value, name)
+                else:
+                    self.assertAlmostEqual(value, legacy_value, places=4, msg=name)
+
+    def assertSameAsLegacy(self, text, layout):
+        frame = BmsParser(layout).parse(text)
+        legacy = legacy_parse_data(text)
+        self.assertSameRows(frame['voltages'], legacy['voltages'], layout.cells_per_slave)
+        self.assertSameRows(frame['temperatures'], legacy['temperatures'], layout.thermistors_per_slave)
+        for name in SCALAR_FIELDS:
+            self.assertEqual(frame[name], legacy.get(name), name)
+        return frame
+
+    def test_standard_frame(self):
+        frame = self.assertSameAsLegacy(make_frame(), DEFAULT_LAYOUT)
+        self.assertEqual(frame.parse_errors, 0)
+        self.assertEqual(sum(frame.voltage_slaves), DEFAULT_LAYOUT.slaves)
+        self.assertEqual(frame.nan_thermistor_count(), 0)
+
+    def test_nan_thermistors_short_rows_and_missing_field(self):
+        frame = self.assertSameAsLegacy(IRREGULAR_BLOCK, LAYOUT)
+        self.assertIsNone(frame.ivt_voltage)
+        self.assertEqual(list(frame.voltage_slaves), [1, 1, 1])
+        self.assertEqual(list(frame.temperature_valid), [1, 1, 1, 1, 0, 1, 1, 0, 0])
+        self.assertEqual(frame.nan_thermistor_count(), 3)
+
+    def test_streaming_matches_parse(self):
+        parser = BmsParser(LAYOUT)
+        frames = [parser.feed_line(line) for line in IRREGULAR_BLOCK.split('\n')]
+        self.assertEqual(frames[:-1], [None] * (len(frames) - 1))
+        self.assertEqual(dict(frames[-1]), dict(BmsParser(LAYOUT).parse(IRREGULAR_BLOCK)))
+
+    def test_malformed_token_is_counted(self):
+        parser = BmsParser(LAYOUT)
+        frame = parser.parse(IRREGULAR_BLOCK.replace('3.612-', '3.6x2-'))
+        self.assertEqual(frame['voltages']['Slave 2'][1], None)
+        self.assertEqual(parser.error_count, 1)
+        self.assertEqual(len(parser.errors), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
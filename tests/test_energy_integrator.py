@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bms_frame import BmsFrame
+from energy_integrator import EnergyIntegrator, STATE_VERSION, average_power
+
+
+def make_frame(timestamp, voltage=400.0, current=10.0):
+    frame = BmsFrame()
+    frame.timestamp = timestamp
+    frame.battery_voltage = voltage
+    frame.battery_current = current
+    return frame
+
+
+class EnergyIntegratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.integrator = EnergyIntegrator(max_gap=5.0)
+
+    def feed(self, timestamps, voltage=400.0, current=10.0):
+        for timestamp in timestamps:
+            self.integrator.process(make_frame(timestamp, voltage, current))
+
+    def test_constant_charging_current(self):
+        # 10 A at 400 V for one hour, one frame per second
+        self.feed(range(3601))
+        state = self.integrator.snapshot()
+        self.assertAlmostEqual(state['charge_in_ah'], 10.0, places=9)
+        self.assertAlmostEqual(state['energy_in_wh'], 4000.0, places=6)
+        self.assertEqual((state['charge_out_ah'], state['energy_out_wh']), (0.0, 0.0))
+        self.assertEqual(state['integrated_time'], 3600.0)
+        self.assertEqual((state['gaps'], state['frames']), (0, 3601))
+        self.assertAlmostEqual(average_power(state), 4000.0, places=6)
+
+    def test_discharge_and_trapezoid(self):
+        # The current ramps from -20 A to -40 A over 3.6 s: the mean of the two ends
+        self.integrator.process(make_frame(0.0, 400.0, -20.0))
+        self.integrator.process(make_frame(3.6, 400.0, -40.0))
+        state = self.integrator.snapshot()
+        self.assertAlmostEqual(state['charge_out_ah'], 30.0 * 3.6 / 3600, places=12)
+        self.assertAlmostEqual(state['energy_out_wh'], 12000.0 * 3.6 / 3600, places=9)
+        self.assertEqual(state['charge_in_ah'], 0.0)
+
+    def test_gap_limit_rejects_dropouts(self):
+        self.feed([0.0, 1.0, 2.0])
+        self.feed([62.0, 63.0])  # A 60 s dropout
+        self.feed([68.0])  # Exactly max_gap is still integrated
+        state = self.integrator.snapshot()
+        self.assertEqual(state['gaps'], 1)
+        self.assertEqual(state['gap_time'], 60.0)
+        self.assertEqual(state['integrated_time'], 8.0)
+        self.assertAlmostEqual(state['charge_in_ah'], 10.0 * 8.0 / 3600, places=12)
+
+    def test_clock_stepping_back_is_a_gap(self):
+        self.feed([10.0, 11.0, 5.0, 6.0])
+        state = self.integrator.snapshot()
+        self.assertEqual((state['gaps'], state['gap_time'], state['integrated_time']), (1, 0.0, 2.0))
+
+    def test_frames_without_readings_are_skipped(self):
+        self.integrator.process(make_frame(0.0))
+        self.integrator.process(make_frame(1.0, current=None))
+        self.integrator.process(make_frame(2.0))
+        state = self.integrator.snapshot()
+        self.assertEqual((state['frames'], state['integrated_time']), (2, 2.0))
+
+    def test_state_round_trip(self):
+        self.feed(range(11))
+        self.feed(range(100, 106), current=-5.0)
+        saved = self.integrator.snapshot()
+        self.assertEqual(saved['version'], STATE_VERSION)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'energy.json')
+            with open(path, 'w', encoding='utf-8') as state_file:
+                json.dump(saved, state_file)
+            restored = EnergyIntegrator()
+            restored.load(path)
+        self.assertEqual(restored.snapshot(), saved)
+        # The restored integrator carries on from the last frame as if it had never stopped
+        self.integrator.process(make_frame(107.0, current=-5.0))
+        restored.process(make_frame(107.0, current=-5.0))
+        self.assertEqual(restored.snapshot(), self.integrator.snapshot())
+
+    def test_other_state_version_is_ignored(self):
+        state = self.integrator.snapshot()
+        self.feed(range(3))
+        self.integrator.restore(dict(state, version=STATE_VERSION + 1, frames=99))
+        self.assertEqual(self.integrator.snapshot()['frames'], 3)
+
+    def test_missing_or_broken_state_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.integrator.load(os.path.join(directory, 'missing.json'))
+            path = os.path.join(directory, 'broken.json')
+            with open(path, 'w', encoding='utf-8') as state_file:
+                state_file.write('{"version": 1')
+            self.integrator.load(path)
+        self.assertEqual(self.integrator.snapshot()['frames'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
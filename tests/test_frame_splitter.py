@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from frame_splitter import FrameSplitter
+
+BLOCK = b"""Printing voltages:\r
+IC 1 3.601- 3.602-\r
+Printing temperatures:\r
+IC 1 24.0 NaN\r
+SOC: 80%\r
+Bad_Cell: 0\r
+Bad_Thermistor: 0\r
+"""
+TEXT = BLOCK.decode().replace('\r', '').rstrip('\n')
+
+
+class FrameSplitterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.splitter = FrameSplitter()
+
+    def test_single_frame(self):
+        self.assertEqual(self.splitter.feed(BLOCK), [TEXT])
+        self.assertEqual(self.splitter.frames_split, 1)
+        self.assertEqual(self.splitter.bytes_discarded, 0)
+
+    def test_markers_split_across_chunks(self):
+        # Every split point, including inside both markers and before the final newline
+        for cut in range(1, len(BLOCK)):
+            splitter = FrameSplitter()
+            frames = splitter.feed(BLOCK[:cut]) + splitter.feed(BLOCK[cut:])
+            self.assertEqual(frames, [TEXT], cut)
+
+    def test_one_byte_at_a_time(self):
+        frames = []
+        for i in range(len(BLOCK) * 2):
+            frames += self.splitter.feed((BLOCK * 2)[i:i + 1])
+        self.assertEqual(frames, [TEXT, TEXT])
+        self.assertEqual(self.splitter.bytes_discarded, 0)
+
+    def test_several_frames_in_one_chunk(self):
+        self.assertEqual(self.splitter.feed(BLOCK * 3 + BLOCK[:40]), [TEXT] * 3)
+        self.assertEqual(self.splitter.feed(BLOCK[40:]), [TEXT])
+        self.assertEqual(self.splitter.frames_split, 4)
+
+    def test_garbage_before_start_is_discarded(self):
+        garbage = b"\x00\xffboot banner\r\nBad_Thermistor: 3\r\n"
+        # The chunk ends inside the start marker, that part must be kept
+        self.assertEqual(self.splitter.feed(garbage + BLOCK[:13]), [])
+        self.assertEqual(self.splitter.feed(BLOCK[13:]), [TEXT])
+        self.assertEqual(self.splitter.bytes_discarded, len(garbage))
+
+    def test_cut_off_frame_is_dropped_at_the_next_start(self):
+        cut_off = BLOCK[:BLOCK.index(b'SOC')]
+        self.assertEqual(self.splitter.feed(cut_off + BLOCK), [TEXT])
+        self.assertEqual(self.splitter.bytes_discarded, len(cut_off))
+
+    def test_frame_without_end_marker_is_dropped_at_the_size_limit(self):
+        splitter = FrameSplitter(max_frame_bytes=100)
+        self.assertEqual(splitter.feed(b"Printing voltages:\n" + b"IC 1 3.6-\n" * 20), [])
+        self.assertEqual(splitter.feed(BLOCK), [TEXT])
+
+    def test_invalid_utf8_is_replaced(self):
+        frames = self.splitter.feed(BLOCK.replace(b'3.602', b'3.\xff02'))
+        self.assertIn('3.�02', frames[0])
+
+    def test_reset(self):
+        self.assertEqual(self.splitter.feed(BLOCK[:60]), [])
+        self.splitter.reset()
+        # The rest of the old frame has no start marker and is dropped
+        self.assertEqual(self.splitter.feed(BLOCK[60:]), [])
+        self.assertEqual(self.splitter.feed(BLOCK), [TEXT])
+        self.assertEqual(self.splitter.frames_split, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history_store import HistoryStore, SERIES
+
+START = 1000.0
+STEP = 0.25  # 4 frames per second
+SAMPLES = 240  # 60 s
+
+
+def values(index):
+    # pack_voltage counts the frames, current is 0 apart from one spike up and one down
+    current = 100.0 if index == 50 else -50.0 if index == 133 else 0.0
+    return (float(index), current, 50.0, 3.5, 3.75, 25.0)
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        # The full resolution ring holds 12.5 s and the 1 s ring 30 s, only the 10 s ring the whole minute
+        self.store = HistoryStore(raw_samples=50, levels=((1.0, 30), (10.0, 100)))
+        for index in range(SAMPLES):
+            self.store.add(START + index * STEP, values(index))
+        self.raw, self.seconds, self.tens = self.store.levels
+
+    def buckets(self, level, name):
+        series = SERIES.index(name)
+        return [(level.time_at(i), level.minimum[series][level.slot(i)], level.maximum[series][level.slot(i)])
+                for i in range(level.length)]
+
+    def test_bucket_boundaries(self):
+        # A frame exactly on a boundary opens the next bucket
+        self.assertEqual([start for start, _, _ in self.buckets(self.tens, 'pack_voltage')],
+                         [START + 10 * i for i in range(6)])
+        self.assertEqual(self.buckets(self.tens, 'pack_voltage')[:2], [(1000.0, 0.0, 39.0), (1010.0, 40.0, 79.0)])
+        seconds = self.buckets(self.seconds, 'pack_voltage')
+        self.assertEqual(len(seconds), 30)
+        self.assertEqual(seconds[0], (1030.0, 120.0, 123.0))
+        self.assertEqual(seconds[-1], (1059.0, 236.0, 239.0))
+
+    def test_min_max_kept_per_bucket(self):
+        self.assertEqual(self.buckets(self.tens, 'current')[1], (1010.0, 0.0, 100.0))
+        self.assertEqual(self.buckets(self.tens, 'current')[3], (1030.0, -50.0, 0.0))
+        self.assertEqual(self.buckets(self.seconds, 'current')[3], (1033.0, -50.0, 0.0))
+        series = SERIES.index('current')
+        slot = self.tens.slot(1)
+        self.assertAlmostEqual(self.tens.mean[series][slot], 100.0 / 40, places=5)
+
+    def test_spikes_survive_after_the_fine_rings_dropped_them(self):
+        bins = self.store.query('current', START, START + 60, 6)
+        self.assertEqual([bin_start for bin_start, _, _, _ in bins], [START + 10 * i for i in range(6)])
+        self.assertEqual([(low, high) for _, low, high, _ in bins],
+                         [(0.0, 0.0), (0.0, 100.0), (0.0, 0.0), (-50.0, 0.0), (0.0, 0.0), (0.0, 0.0)])
+
+    def test_recent_window_uses_full_resolution(self):
+        level, first, last = self.store.choose_level(START + 50, START + 60, 10)
+        self.assertIs(level, self.raw)
+        bins = self.store.query('pack_voltage', START + 50, START + 60, 10)
+        self.assertEqual(len(bins), 10)
+        self.assertEqual(bins[0], (1050.0, 200.0, 203.0, 201.5))
+        self.assertEqual(bins[-1], (1059.0, 236.0, 239.0, 237.5))
+
+    def test_window_in_the_second_ring(self):
+        level, _, _ = self.store.choose_level(START + 35, START + 45, 10)
+        self.assertIs(level, self.seconds)
+        bins = self.store.query('current', START + 30, START + 40, 10)
+        self.assertEqual(bins[3][:3], (1033.0, -50.0, 0.0))
+
+    def test_clock_stepping_back_is_ignored(self):
+        version = self.store.version
+        self.store.add(START, values(0))
+        self.assertEqual(self.store.version, version)
+        self.assertEqual(self.store.time_range(), (START, START + (SAMPLES - 1) * STEP))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from port_watcher import is_teensy
+
+
+def make_port(device, vid=None, pid=None):
+    # The fields of a pyserial ListPortInfo that is_teensy reads
+    return SimpleNamespace(device=device, vid=vid, pid=pid)
+
+
+class IsTeensyTest(unittest.TestCase):
+
+    def test_teensy_serial_types(self):
+        self.assertTrue(is_teensy(make_port('/dev/ttyACM0', 0x16C0, 0x0483)))  # Serial
+        self.assertTrue(is_teensy(make_port('/dev/ttyACM1', 0x16C0, 0x048B)))  # Dual Serial
+
+    def test_other_devices_on_the_shared_vendor_id(self):
+        self.assertFalse(is_teensy(make_port('/dev/ttyACM0', 0x16C0, 0x27DD)))  # V-USB CDC-ACM
+        self.assertFalse(is_teensy(make_port('/dev/ttyACM0', 0x16C0, 0x05DC)))  # USBasp
+
+    def test_other_ports(self):
+        self.assertFalse(is_teensy(make_port('/dev/ttyUSB0', 0x0403, 0x0483)))  # FTDI adapter
+        self.assertFalse(is_teensy(make_port('/dev/ttyS0')))
+        self.assertFalse(is_teensy(make_port('/dev/rfcomm0')))
+
+
+if __name__ == '__main__':
+    unittest.main()
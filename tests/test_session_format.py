@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bms_frame import PackLayout
+from bms_parser import BmsParser
+from session_format import RecordLayout, NO_TEMPERATURE, NO_VOLTAGE
+
+LAYOUT = PackLayout(2, 3, 2)
+
+# Every value is accepted by the parser but cannot be held by a record as it is
+OUT_OF_RANGE_BLOCK = """Printing voltages:
+IC 1 3.8e45- inf- 7.5-
+IC 2 70000- 3.7000- nan-
+Printing temperatures:
+IC 1 400.0 -inf
+IC 2 -327.68 25.50
+Max Voltage: 1e39V
+Min Voltage: -infV
+Battery Voltage: 3.8e45V
+Battery Current: nanA
+IVT Voltage: 1e400V
+IVT Current: -12.5A
+IVT Current Counter: 1e39Ah Charging Status: 300
+SOC: 40000%
+BMS_Flags: 10000000000000000001
+Bad_Cell: -5
+Bad_Thermistor: 99999"""
+
+
+class RecordLayoutPackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.record_layout = RecordLayout(LAYOUT)
+        self.frame = BmsParser(LAYOUT).parse(OUT_OF_RANGE_BLOCK)
+        self.frame.timestamp = 1700000000.0
+        self.frame.seq = 2 ** 40
+
+    def test_pack_stores_unrepresentable_values_as_missing(self):
+        record = self.record_layout.pack(self.frame)
+        self.assertEqual(len(record), self.record_layout.size)
+        values = self.record_layout.struct.unpack(record)
+        cells, thermistors = 6, 4
+        voltages = values[2:2 + cells]
+        temperatures = values[2 + cells:2 + cells + thermistors]
+        self.assertEqual(voltages, (NO_VOLTAGE, NO_VOLTAGE, NO_VOLTAGE, NO_VOLTAGE, 37000, NO_VOLTAGE))
+        self.assertEqual(temperatures, (NO_TEMPERATURE, NO_TEMPERATURE, NO_TEMPERATURE, 2550))
+
+    def test_round_trip(self):
+        frame = self.record_layout.unpack(self.record_layout.pack(self.frame))
+        self.assertEqual(frame.seq, 0)
+        for name in ('max_voltage', 'min_voltage', 'battery_voltage', 'battery_current', 'ivt_voltage',
+                     'ivt_current_counter'):
+            self.assertIsNone(getattr(frame, name), name)
+        self.assertEqual(frame.ivt_current, -12.5)
+        for name in ('soc', 'charging_status', 'bad_cell', 'bad_thermistor'):
+            self.assertIsNone(getattr(frame, name), name)
+        self.assertEqual(frame.bms_flags, '1000000000000000')
+        self.assertEqual(list(frame.temperature_valid), [0, 0, 0, 1])
+        self.assertAlmostEqual(frame.voltages[4], 3.7, places=4)
+
+    def test_limits(self):
+        frame = BmsParser(LAYOUT).parse(OUT_OF_RANGE_BLOCK)
+        frame.voltages[0], frame.voltages[1] = 6.5534, 0.0
+        frame.temperatures[0], frame.temperatures[1] = 327.67, -327.67
+        values = self.record_layout.struct.unpack(self.record_layout.pack(frame))
+        self.assertEqual(values[2:4], (NO_VOLTAGE - 1, 0))
+        self.assertEqual(values[8:10], (32767, -32767))
+
+
+if __name__ == '__main__':
+    unittest.main()
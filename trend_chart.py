@@ -0,0 +1,264 @@
+import math
+import time
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+# Lane title, unit, value format and the (history series, colour) drawn in it
+LANES = (
+    ("Pack", "V", "%.1f", (('pack_voltage', '#1f5fbf'),)),
+    ("Current", "A", "%.1f", (('current', '#c06010'),)),
+    ("SOC", "%", "%.0f", (('soc', '#2f9f3f'),)),
+    ("Cells", "V", "%.3f", (('min_cell', '#3060ff'), ('max_cell', '#e03030'))),
+    ("Max temp", "°C", "%.1f", (('max_temp', '#b03090'),)),
+)
+# Name shown in the selector and the time span in seconds, None for the whole session
+WINDOWS = (("1 min", 60), ("10 min", 600), ("1 h", 3600), ("12 h", 43200), ("Session", None))
+LANE_HEIGHT = 44
+PLOT_LEFT = 130
+PLOT_RIGHT = 60
+
+
+def session_bin_width(span, pixels):
+    # A round bin width (1, 2, 5 x 10^n seconds) that fits the session with room to grow,
+    # so the plot only has to be rebuilt when the session outgrows it
+    target = max(span, 1.0) / (0.8 * pixels)
+    exponent = math.floor(math.log10(target))
+    for base in (1, 2, 5, 10):
+        width = base * 10 ** exponent
+        if width >= target:
+            return width
+    return 10 * 10 ** exponent
+
+
+class TrendChart:
+    # Pack voltage, current, SOC, min/max cell voltage and max temperature from the
+    # HistoryStore, one lane each on a single canvas. Every pixel column is one time
+    # bin drawn as a vertical stroke from its min to its max. Bins are aligned to
+    # absolute time, so a tick only queries the bins since the last one: the lines are
+    # moved left, the bins that left the window are cut off the front and the new ones
+    # appended. A lane is only redrawn as a whole when its scale has to grow, and the
+    # whole chart when the window or the canvas width changes.
+
+    def __init__(self, master, history, scheduler, period=1.0):
+        self.history = history
+        self.visible = True
+        self.frame = ttk.LabelFrame(master, text='Trends')
+
+        controls = ttk.Frame(self.frame)
+        controls.pack(fill='x')
+        ttk.Label(controls, text="Window:").pack(side='left', padx=5)
+        self.window_combobox = ttk.Combobox(controls, values=[name for name, _ in WINDOWS], state="readonly",
+                                            width=10)
+        self.window_combobox.set("10 min")
+        self.window_combobox.pack(side='left', padx=5, pady=2)
+        self.window_combobox.bind("<<ComboboxSelected>>", lambda event: self.reset())
+
+        self.canvas = tk.Canvas(self.frame, height=len(LANES) * LANE_HEIGHT + 16, background='white',
+                                highlightthickness=0)
+        self.canvas.pack(fill='x', expand=True, padx=5, pady=2)
+        self.canvas_width = 0
+        self.canvas.bind("<Configure>", self.on_resize)
+
+        small_font = ("Arial", 8)
+        self.value_texts = []
+        self.scale_texts = []  # (high, low) per lane
+        self.lines = {}
+        for lane, (title, unit, value_format, series) in enumerate(LANES):
+            top, bottom = self.lane_bounds(lane)
+            self.canvas.create_text(5, (top + bottom) / 2 - 7, text=title, anchor='w', font=("Arial", 8, "bold"))
+            self.value_texts.append(self.canvas.create_text(5, (top + bottom) / 2 + 7, text="-", anchor='w',
+                                                            font=small_font))
+            self.scale_texts.append((self.canvas.create_text(0, top, text="", anchor='nw', font=small_font),
+                                     self.canvas.create_text(0, bottom, text="", anchor='sw', font=small_font)))
+            self.canvas.create_line(0, bottom + 4, 0, bottom + 4, fill='#e0e0e0', tags='separator')
+            for name, colour in series:
+                self.lines[name] = self.canvas.create_line(0, 0, 0, 0, fill=colour, state='hidden', tags='trend')
+        bottom = len(LANES) * LANE_HEIGHT + 14
+        self.start_text = self.canvas.create_text(PLOT_LEFT, bottom, text="", anchor='sw', font=small_font)
+        self.end_text = self.canvas.create_text(0, bottom, text="", anchor='se', font=small_font)
+
+        self.bins = {name: deque() for name in self.lines}  # (bin number, min, max) on screen, oldest first
+        self.ranges = [None] * len(LANES)  # (low, high) of each lane's y scale
+        self.shown_values = [None] * len(LANES)
+        self.bin_width = None
+        self.first_bin = None
+        self.version = None
+
+        scheduler.register(self.update, period=period)
+
+    def lane_bounds(self, lane):
+        top = 6 + lane * LANE_HEIGHT
+        return top, top + LANE_HEIGHT - 10
+
+    def plot_width(self):
+        return self.canvas_width - PLOT_LEFT - PLOT_RIGHT
+
+    def on_resize(self, event):
+        if event.width == self.canvas_width:
+            return
+        self.canvas_width = event.width
+        right = event.width - PLOT_RIGHT
+        for high_text, low_text in self.scale_texts:
+            self.canvas.coords(high_text, right + 4, self.canvas.coords(high_text)[1])
+            self.canvas.coords(low_text, right + 4, self.canvas.coords(low_text)[1])
+        for item in self.canvas.find_withtag('separator'):
+            y = self.canvas.coords(item)[1]
+            self.canvas.coords(item, PLOT_LEFT, y, right, y)
+        self.canvas.coords(self.end_text, right, self.canvas.coords(self.end_text)[1])
+        self.reset()
+
+    def set_visible(self, visible):
+        self.visible = visible
+        if visible:
+            self.update()
+
+    def window_span(self):
+        return dict(WINDOWS).get(self.window_combobox.get())
+
+    def reset(self):
+        # Window or width changed: everything is queried and drawn again on the next update
+        for name, line in self.lines.items():
+            self.bins[name].clear()
+            self.canvas.itemconfig(line, state='hidden')
+        self.ranges = [None] * len(LANES)
+        self.bin_width = None
+        self.first_bin = None
+        self.version = None
+        self.update()
+
+    def update(self):
+        if not self.visible:
+            return
+        pixels = self.plot_width()
+        time_range = self.history.time_range()
+        if pixels < 10 or time_range is None:
+            return
+        oldest, newest = time_range
+        span = self.window_span()
+        if span is None:
+            bin_width = self.bin_width
+            if bin_width is None or (newest - oldest) / bin_width >= pixels:
+                bin_width = session_bin_width(newest - oldest, pixels)
+            first_bin = math.floor(oldest / bin_width)
+        else:
+            bin_width = span / pixels
+            first_bin = math.floor(newest / bin_width) - pixels + 1
+        if bin_width != self.bin_width:
+            if self.bin_width is not None:
+                self.reset()  # The session outgrew the plot, draw it again at the wider bins
+                return
+            self.bin_width = bin_width
+        elif self.history.version == self.version and first_bin == self.first_bin:
+            return  # No new frame and nothing to scroll
+        self.version = self.history.version
+        last_bin = math.floor(newest / bin_width)
+
+        if self.first_bin is not None and first_bin != self.first_bin:
+            self.canvas.move('trend', self.first_bin - first_bin, 0)
+        self.first_bin = first_bin
+
+        for lane, (title, unit, value_format, series) in enumerate(LANES):
+            changes = [self.update_bins(name, first_bin, last_bin) for name, _ in series]
+            low, high = self.lane_extent(series)
+            if low is None:
+                continue
+            current = self.ranges[lane]
+            if current is None or low < current[0] or high > current[1]:
+                self.rescale(lane, low, high)
+                for name, _ in series:
+                    self.redraw(lane, name)
+            else:
+                for (name, _), change in zip(series, changes):
+                    self.append(lane, name, *change)
+            self.show_value(lane, series, unit, value_format)
+
+        start = oldest if span is None else newest - span
+        self.canvas.itemconfig(self.start_text, text=time.strftime("%H:%M:%S", time.localtime(start)))
+        self.canvas.itemconfig(self.end_text, text=time.strftime("%H:%M:%S", time.localtime(newest)))
+
+    def update_bins(self, name, first_bin, last_bin):
+        # Queries the bins from the newest one on screen (it may have been incomplete) up to
+        # last_bin and returns (bins dropped at the front, newest bin replaced, new bins)
+        bins = self.bins[name]
+        removed = 0
+        while bins and bins[0][0] < first_bin:
+            bins.popleft()
+            removed += 1
+        start_bin = max(bins[-1][0] if bins else first_bin, first_bin)
+        start = start_bin * self.bin_width
+        new = [(start_bin + round((bin_start - start) / self.bin_width), low, high)
+               for bin_start, low, high, _ in self.history.query(name, start, (last_bin + 1) * self.bin_width,
+                                                                 last_bin - start_bin + 1)]
+        replaced = bool(bins) and bins[-1][0] == start_bin
+        if replaced:
+            bins.pop()
+        bins.extend(new)
+        return removed, replaced, new
+
+    def lane_extent(self, series):
+        low = high = None
+        for name, _ in series:
+            bins = self.bins[name]
+            if bins:
+                series_low = min(entry[1] for entry in bins)
+                series_high = max(entry[2] for entry in bins)
+                low = series_low if low is None else min(low, series_low)
+                high = series_high if high is None else max(high, series_high)
+        return low, high
+
+    def rescale(self, lane, low, high):
+        # Leave some room above and below, so the next values do not force another rescale at once
+        margin = (high - low) * 0.1 or max(abs(high) * 0.01, 0.01)
+        self.ranges[lane] = (low - margin, high + margin)
+        value_format = LANES[lane][2]
+        high_text, low_text = self.scale_texts[lane]
+        self.canvas.itemconfig(high_text, text=value_format % (high + margin))
+        self.canvas.itemconfig(low_text, text=value_format % (low - margin))
+
+    def coordinates(self, lane, bins):
+        # Two points per bin, a vertical stroke from min to max at the bin's pixel column
+        top, bottom = self.lane_bounds(lane)
+        low, high = self.ranges[lane]
+        scale = (bottom - top) / (high - low)
+        x0 = PLOT_LEFT - self.first_bin
+        points = []
+        for number, minimum, maximum in bins:
+            x = x0 + number
+            points += (x, bottom - (minimum - low) * scale, x, bottom - (maximum - low) * scale)
+        return points
+
+    def redraw(self, lane, name):
+        line = self.lines[name]
+        bins = self.bins[name]
+        if bins:
+            self.canvas.coords(line, *self.coordinates(lane, bins))
+            self.canvas.itemconfig(line, state='normal')
+        else:
+            self.canvas.itemconfig(line, state='hidden')
+
+    def append(self, lane, name, removed, replaced, new):
+        # Line coordinates are indexed by value (x and y count separately), four per bin
+        line = self.lines[name]
+        bins = self.bins[name]
+        kept = len(bins) - len(new)  # Bins on screen before this update that stay unchanged
+        if self.canvas.itemcget(line, 'state') == 'hidden' or kept < 1:
+            self.redraw(lane, name)  # Too little left to edit in place
+            return
+        if removed:
+            self.canvas.dchars(line, 0, 4 * removed - 2)
+        if replaced:
+            self.canvas.dchars(line, 4 * kept, 4 * kept + 2)
+        if new:
+            self.canvas.insert(line, 'end', self.coordinates(lane, new))
+
+    def show_value(self, lane, series, unit, value_format):
+        # The newest bin of each series of the lane
+        values = [self.bins[name][-1] for name, _ in series if self.bins[name]]
+        if len(series) == 1:
+            text = f"{value_format % values[0][2]} {unit}" if values else "-"
+        else:
+            text = " - ".join(value_format % value[1 + index] for index, value in enumerate(values)) + f" {unit}"
+        if text != self.shown_values[lane]:
+            self.shown_values[lane] = text
+            self.canvas.itemconfig(self.value_texts[lane], text=text)